@@ -0,0 +1,91 @@
+# benchmarks/bench_extract.py
+"""
+Extract throughput against the local fake Woo server (no network needed).
+
+    python -m benchmarks.bench_extract --orders 5000 --latency-ms 30
+
+The pipeline_* rows time the functions the ETL actually runs (iter_orders_since,
+fetch_refund_payloads, fetch_products_by_ids, all on WooClient), once on the shared
+keep-alive session and once opening a connection per request, as WooClient did
+through the woocommerce lib. `connections` is how many TCP connections the server
+accepted. The async_* rows are the AsyncWooClient alternative.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import requests
+
+from .fake_woo import serve
+from .synthetic import generate
+
+
+class _PerRequestConnection:
+    """Stand-in for the shared session: a new connection per GET (requests.request)."""
+
+    def get(self, url, **kwargs):
+        return requests.get(url, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=5000)
+    ap.add_argument("--latency-ms", type=float, default=30.0)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+
+    ds = generate(n_orders=args.orders)
+    with serve(ds, latency_ms=args.latency_ms) as srv:
+        os.environ.update(
+            WC_BASE_URL=srv.base_url, WC_CONSUMER_KEY="ck_bench", WC_CONSUMER_SECRET="cs_bench", WC_RATE_LIMIT="0",
+        )
+        from src.etl.extract import wc_client
+        from src.etl.extract.async_wc_client import AsyncWooClient
+        from src.etl.extract.orders import iter_orders_since
+        from src.etl.extract.products import fetch_products_by_ids
+        from src.etl.extract.refunds import fetch_refund_payloads
+
+        since = "2000-01-01T00:00:00"
+        params = {"after": since, "orderby": "date", "order": "asc", "per_page": 100}
+        orders = ds.orders[:500]
+        order_ids = [o["id"] for o in orders]
+        product_ids = sorted(ds.products)
+        results = {}
+
+        def timed(name, fn):
+            req0, conn0 = srv.requests, srv.connections
+            t = time.perf_counter()
+            n = fn()
+            results[name] = {
+                "rows": n, "seconds": time.perf_counter() - t,
+                "requests": srv.requests - req0, "connections": srv.connections - conn0,
+            }
+
+        for label in ("pooled", "per_request"):
+            if label == "per_request":
+                wc_client._session = _PerRequestConnection()
+            timed(f"pipeline_orders_{label}", lambda: sum(len(c) for c in iter_orders_since(since)))
+            timed(f"pipeline_refunds_{label}", lambda: len(fetch_refund_payloads(order_ids, orders=orders)))
+            timed(f"pipeline_products_{label}", lambda: len(fetch_products_by_ids(product_ids, use_memo=False)))
+        wc_client._session = None
+
+        async def async_paged():
+            async with AsyncWooClient(concurrency=args.concurrency) as awc:
+                return len(await awc.paged("orders", params))
+
+        async def async_refunds():
+            async with AsyncWooClient(concurrency=args.concurrency) as awc:
+                return len(await awc.get_many((f"orders/{oid}/refunds", {}) for oid in order_ids))
+
+        timed("async_paged", lambda: asyncio.run(async_paged()))
+        timed("async_refunds_gather", lambda: asyncio.run(async_refunds()))
+
+    for r in results.values():
+        r["rows_per_sec"] = round(r["rows"] / r["seconds"], 1) if r["seconds"] else None
+    print(json.dumps({"benchmark": "extract", "params": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
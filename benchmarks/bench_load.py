@@ -0,0 +1,112 @@
+# benchmarks/bench_load.py
+"""
+DuckDB load throughput: original DELETE+INSERT via pandas vs Arrow staging + upsert.
+Each path loads into a fresh warehouse file (insert), re-loads the same ids in one
+go (upsert), then re-loads them chunk by chunk like the streaming pipeline does.
+
+    python -m benchmarks.bench_load --items 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def make_frames(n_items: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    n_orders = max(1, n_items // 3)
+    order_ids = np.arange(1, n_orders + 1)
+    dates = pd.Timestamp("2022-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365 * 86400, n_orders)), unit="s")
+    money = lambda n: rng.uniform(0, 300, n).round(2)
+    df_orders = pd.DataFrame({
+        "order_id": order_ids,
+        "order_date": dates.strftime("%Y-%m-%d %H:%M:%S"),
+        "status": rng.choice(["completed", "processing", "cancelled"], n_orders),
+        "currency": "EUR",
+        "customer_id": rng.integers(0, n_orders // 3 + 1, n_orders),
+        **{c: money(n_orders) for c in [
+            "discount_total", "discount_tax", "shipping_total", "shipping_tax",
+            "cart_tax", "total_tax", "gross_total", "net_total", "refund_total", "net_after_refunds",
+        ]},
+        "billing_country": rng.choice(["GR", "CY", "DE"], n_orders),
+        "billing_city": rng.choice(["Athens", "Nicosia", "Berlin"], n_orders),
+    })
+    items_order = np.sort(rng.choice(order_ids, n_items))
+    pid = rng.integers(1, 5000, n_items)
+    df_items = pd.DataFrame({
+        "order_id": items_order,
+        "product_id": pid,
+        "variation_id": 0,
+        "sku": pd.Series(pid).map("SKU-{:06d}".format),
+        "name": pd.Series(pid).map("Product {}".format),
+        "quantity": rng.integers(1, 5, n_items),
+        "price": money(n_items),
+        "total": money(n_items),
+        "subtotal": money(n_items),
+        "tax_class": "",
+        "category_snapshot": rng.choice(["Apparel", "Home | Kitchen", None], n_items),
+        "refunded_quantity": 0,
+        "refunded_total": 0.0,
+    })
+    return df_orders, df_items
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--chunk-orders", type=int, default=1000)
+    ap.add_argument("--chunks", type=int, default=50)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ["DUCKDB_PATH"] = os.path.join(tmp, "warehouse.duckdb")
+    from src.etl.load import duckdb_client
+    from src.etl.load.duckdb_client import DuckDBClient
+
+    df_orders, df_items = make_frames(args.items)
+    results = {}
+    for mode in ["pandas", "arrow"]:
+        duckdb_client.DB_PATH = os.path.join(tmp, f"{mode}.duckdb")
+        duckdb_client.DUCKDB_LOAD_MODE = mode
+        db = DuckDBClient()
+        db.init_schema()
+        for phase in ["insert", "upsert"]:
+            t = time.perf_counter()
+            db.load_orders(df_orders)
+            t_orders = time.perf_counter() - t
+            t = time.perf_counter()
+            db.load_order_items(df_items)
+            t_items = time.perf_counter() - t
+            results[f"{mode}_{phase}"] = {
+                "orders_s": t_orders,
+                "items_s": t_items,
+                "rows_per_sec": round((len(df_orders) + len(df_items)) / (t_orders + t_items)),
+            }
+        t = time.perf_counter()
+        rows = 0
+        for k in range(args.chunks):
+            lo, hi = k * args.chunk_orders + 1, (k + 1) * args.chunk_orders
+            o = df_orders[df_orders["order_id"].between(lo, hi)]
+            i = df_items[df_items["order_id"].between(lo, hi)]
+            db.load_orders(o)
+            db.load_order_items(i)
+            rows += len(o) + len(i)
+        s = time.perf_counter() - t
+        results[f"{mode}_chunked_upsert"] = {"chunks": args.chunks, "seconds": s, "rows_per_sec": round(rows / s)}
+        counts = db.con.execute("SELECT (SELECT COUNT(*) FROM fct_orders), (SELECT COUNT(*) FROM fct_order_items)").fetchone()
+        assert counts == (len(df_orders), len(df_items)), counts
+        db.con.close()
+
+    print(json.dumps({
+        "benchmark": "duckdb_load",
+        "params": {"orders": len(df_orders), "items": len(df_items)},
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
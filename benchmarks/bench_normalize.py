@@ -0,0 +1,109 @@
+# benchmarks/bench_normalize.py
+"""
+Orders/sec of normalize_orders over synthetic Woo order JSON, per-row baseline vs columnar.
+
+    python -m benchmarks.bench_normalize --sizes 10000 100000
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import pandas as pd
+import pendulum as p
+
+from src.etl.transform.normalize_orders import normalize_orders
+
+from .synthetic import generate
+
+
+def _f(v) -> float:
+    try:
+        return float(v or 0)
+    except Exception:
+        return 0.0
+
+
+def legacy_normalize_orders(raw_orders: List[Dict]):
+    """The original dict-per-row implementation with pendulum.parse per order."""
+    orders_rows = []
+    items_rows = []
+    for o in raw_orders or []:
+        order_id = o.get("id")
+        created = o.get("date_created_gmt") or o.get("date_created")
+        orders_rows.append({
+            "order_id": order_id,
+            "order_date": p.parse(created).to_datetime_string() if created else None,
+            "status": o.get("status"),
+            "currency": o.get("currency"),
+            "customer_id": o.get("customer_id"),
+            "discount_total": _f(o.get("discount_total")),
+            "discount_tax": _f(o.get("discount_tax")),
+            "shipping_total": _f(o.get("shipping_total")),
+            "shipping_tax": _f(o.get("shipping_tax")),
+            "cart_tax": _f(o.get("cart_tax")),
+            "total_tax": _f(o.get("total_tax")),
+            "gross_total": _f(o.get("total")),
+            "net_total": _f(o.get("total")) - _f(o.get("total_tax")),
+            "refund_total": 0.0,
+            "net_after_refunds": None,
+            "billing_country": (o.get("billing") or {}).get("country"),
+            "billing_city": (o.get("billing") or {}).get("city"),
+        })
+        for li in o.get("line_items", []) or []:
+            items_rows.append({
+                "order_id": order_id,
+                "product_id": li.get("product_id"),
+                "variation_id": li.get("variation_id"),
+                "sku": li.get("sku"),
+                "name": li.get("name"),
+                "quantity": int(li.get("quantity") or 0),
+                "price": _f(li.get("price")),
+                "total": _f(li.get("total")),
+                "subtotal": _f(li.get("subtotal")),
+                "tax_class": li.get("tax_class"),
+                "category_snapshot": None,
+                "refunded_quantity": 0,
+                "refunded_total": 0.0,
+            })
+    df_orders = pd.DataFrame(orders_rows)
+    df_items = pd.DataFrame(items_rows)
+    if not df_orders.empty and "order_date" in df_orders.columns:
+        df_orders.sort_values("order_date", inplace=True)
+    return df_orders, df_items
+
+
+def _timed(fn, raw):
+    t = time.perf_counter()
+    out = fn(raw)
+    return out, time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--items-per-order", type=int, default=3)
+    args = ap.parse_args()
+
+    results = []
+    for n in args.sizes:
+        raw = generate(n_orders=n, items_per_order=args.items_per_order).orders
+        (o_new, i_new), s_new = _timed(normalize_orders, raw)
+        (o_old, i_old), s_old = _timed(legacy_normalize_orders, raw)
+        # Schema-identical output: same columns, dtypes and values
+        pd.testing.assert_frame_equal(o_new, o_old)
+        pd.testing.assert_frame_equal(i_new, i_old)
+        results.append({
+            "orders": n,
+            "items": len(i_new),
+            "columnar_s": s_new,
+            "columnar_orders_per_sec": round(n / s_new),
+            "rowwise_s": s_old,
+            "rowwise_orders_per_sec": round(n / s_old),
+            "speedup": round(s_old / s_new, 1),
+        })
+    print(json.dumps({"benchmark": "normalize_orders", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# benchmarks/bench_transform.py
+"""
+Rows/sec of enrich_items_with_categories + apply_refunds, row-wise baseline vs vectorized.
+
+    python -m benchmarks.bench_transform --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.etl.transform.enrich import apply_refunds, enrich_items_with_categories
+
+from .synthetic import CATEGORY_NAMES
+
+
+# ---------- Baseline: the original row-wise implementations ----------
+
+def legacy_enrich_items_with_categories(df_items: pd.DataFrame, products: Dict[int, dict]) -> pd.DataFrame:
+    if df_items.empty or not products:
+        return df_items
+
+    def cat_str(pid):
+        try:
+            p = products.get(int(pid)) if pid is not None else None
+        except Exception:
+            p = None
+        cats = (p or {}).get("categories") or []
+        names = [c.get("name") for c in cats if c.get("name")]
+        return " | ".join(names) if names else None
+
+    df = df_items.copy()
+    df["category_snapshot"] = df["product_id"].apply(cat_str)
+    return df
+
+
+def legacy_apply_refunds(df_orders, df_items, refunds_map):
+    if df_orders.empty:
+        return df_orders, df_items
+    dfo = df_orders.copy()
+    dfi = df_items.copy()
+
+    def order_refund_total(oid):
+        m = refunds_map.get(int(oid), {})
+        try:
+            return float(m.get("refund_total", 0.0))
+        except Exception:
+            return 0.0
+
+    dfo["refund_total"] = dfo["order_id"].apply(order_refund_total)
+    dfo["net_after_refunds"] = dfo["net_total"] - dfo["refund_total"]
+
+    if not dfi.empty:
+        def ref_qty(row):
+            m = refunds_map.get(int(row["order_id"])) or {}
+            key = (int(row.get("product_id") or 0), int(row.get("variation_id") or 0))
+            return int((m.get("items", {}).get(key) or {}).get("qty", 0))
+
+        def ref_total(row):
+            m = refunds_map.get(int(row["order_id"])) or {}
+            key = (int(row.get("product_id") or 0), int(row.get("variation_id") or 0))
+            try:
+                return float((m.get("items", {}).get(key) or {}).get("total", 0.0))
+            except Exception:
+                return 0.0
+
+        dfi["refunded_quantity"] = dfi.apply(ref_qty, axis=1)
+        dfi["refunded_total"] = dfi.apply(ref_total, axis=1)
+    return dfo, dfi
+
+
+# ---------- Synthetic frames (shaped like normalize_orders output) ----------
+
+def make_frames(n_items: int, catalog: int = 5000, refund_rate: float = 0.05, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    n_orders = max(1, n_items // 3)
+    order_ids = np.arange(1, n_orders + 1)
+    df_orders = pd.DataFrame({
+        "order_id": order_ids,
+        "net_total": rng.uniform(10, 500, n_orders).round(2),
+        "refund_total": 0.0,
+        "net_after_refunds": None,
+    })
+    df_items = pd.DataFrame({
+        "order_id": rng.choice(order_ids, n_items),
+        "product_id": rng.integers(1, catalog + 1, n_items),
+        "variation_id": np.where(rng.random(n_items) < 0.2, rng.integers(1, 50, n_items), 0),
+        "quantity": rng.integers(1, 5, n_items),
+        "total": rng.uniform(1, 200, n_items).round(2),
+        "category_snapshot": None,
+        "refunded_quantity": 0,
+        "refunded_total": 0.0,
+    })
+    products = {
+        pid: {"id": pid, "categories": [{"name": CATEGORY_NAMES[(pid + k) % len(CATEGORY_NAMES)]} for k in range(pid % 3)]}
+        for pid in range(1, catalog + 1)
+    }
+    refunds_map = {}
+    refunded = df_items[df_items["order_id"].isin(rng.choice(order_ids, int(n_orders * refund_rate)))]
+    for oid, g in refunded.groupby("order_id"):
+        items = {(int(r.product_id), int(r.variation_id)): {"qty": 1, "total": float(r.total)} for r in g.itertuples()}
+        refunds_map[int(oid)] = {"refund_total": sum(v["total"] for v in items.values()), "items": items}
+    return df_orders, df_items, products, refunds_map
+
+
+def run(enrich, refunds, frames):
+    df_orders, df_items, products, refunds_map = frames
+    t = time.perf_counter()
+    items = enrich(df_items, products)
+    orders, items = refunds(df_orders, items, refunds_map)
+    return orders, items, time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-legacy-above", type=int, default=1_000_000,
+                    help="don't time the row-wise baseline for sizes above this")
+    args = ap.parse_args()
+
+    results = []
+    for n in args.sizes:
+        frames = make_frames(n)
+        o_new, i_new, s_new = run(enrich_items_with_categories, apply_refunds, frames)
+        row = {"items": n, "vectorized_s": s_new, "vectorized_rows_per_sec": round(n / s_new)}
+        if n <= args.skip_legacy_above:
+            o_old, i_old, s_old = run(legacy_enrich_items_with_categories, legacy_apply_refunds, frames)
+            pd.testing.assert_frame_equal(o_new, o_old, check_dtype=False)
+            pd.testing.assert_frame_equal(i_new, i_old, check_dtype=False)
+            row.update({"rowwise_s": s_old, "rowwise_rows_per_sec": round(n / s_old), "speedup": round(s_old / s_new, 1)})
+        results.append(row)
+    print(json.dumps({"benchmark": "transform_enrich_refunds", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/fake_woo.py
+"""
+Local stub of the WooCommerce REST API (wc/v3), backed by a synthetic dataset.
+Serves just what the ETL uses: orders (paged, after/before/modified_after/modified_before),
+orders/{id}/refunds, products (include/modified_after) and products/{id}.
+
+    python -m benchmarks.fake_woo --orders 20000 --port 8765 --latency-ms 40
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List
+from urllib.parse import parse_qs, urlparse
+
+from .synthetic import WooDataset, generate
+
+API_PREFIX = "/wp-json/wc/v3/"
+
+
+def _ts(v: str | None) -> str | None:
+    # Compare ISO timestamps as naive 'YYYY-MM-DDTHH:MM:SS' strings
+    return v.replace(" ", "T")[:19] if v else None
+
+
+class FakeWooServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, dataset: WooDataset, latency_ms: float = 0.0, throttle_rate: float = 0.0):
+        super().__init__(addr, _Handler)
+        self.dataset = dataset
+        self.latency = latency_ms / 1000.0
+        # Share of requests answered with 429 + Retry-After, to exercise the scheduler
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(0)
+        self.requests = 0
+        self.connections = 0  # TCP connections accepted: shows keep-alive reuse
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address) -> None:
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def count(self) -> bool:
+        """Count a request; return True if it should be throttled."""
+        with self._lock:
+            self.requests += 1
+            return self._rng.random() < self.throttle_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body go out in separate writes; without TCP_NODELAY (as real servers
+    # set it) every reused connection waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    server: FakeWooServer
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, payload, status: int = 200, headers: dict | None = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, rows: List[dict], q: dict) -> None:
+        per_page = int(q.get("per_page", 10))
+        page = int(q.get("page", 1))
+        total = len(rows)
+        pages = math.ceil(total / per_page) if per_page else 0
+        chunk = rows[(page - 1) * per_page: page * per_page]
+        self._send(chunk, headers={"X-WP-Total": total, "X-WP-TotalPages": pages})
+
+    def do_GET(self) -> None:
+        throttle = self.server.count()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if throttle:
+            return self._send({"code": "too_many_requests"}, status=429, headers={"Retry-After": 1})
+
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else None
+        parts = (path or "").strip("/").split("/")
+        ds = self.server.dataset
+
+        if parts == ["orders"]:
+            after, before = _ts(q.get("after")), _ts(q.get("before"))
+            mod_after, mod_before = _ts(q.get("modified_after")), _ts(q.get("modified_before"))
+            rows = [
+                o for o in ds.orders
+                if (not after or o["date_created_gmt"] > after)
+                and (not before or o["date_created_gmt"] < before)
+                and (not mod_after or o["date_modified_gmt"] > mod_after)
+                and (not mod_before or o["date_modified_gmt"] < mod_before)
+            ]
+            if q.get("orderby") == "modified":
+                rows = sorted(rows, key=lambda o: o["date_modified_gmt"])
+            return self._page(rows, q)
+
+        if len(parts) == 3 and parts[0] == "orders" and parts[2] == "refunds":
+            return self._send(ds.refunds.get(int(parts[1]), []))
+
+        if parts == ["products"]:
+            rows = list(ds.products.values())
+            if q.get("include"):
+                ids = {int(x) for x in q["include"].split(",") if x}
+                rows = [p for p in rows if p["id"] in ids]
+            mod_after = _ts(q.get("modified_after"))
+            if mod_after:
+                rows = [p for p in rows if p["date_modified_gmt"] > mod_after]
+            return self._page(rows, q)
+
+        if len(parts) == 2 and parts[0] == "products":
+            p = ds.products.get(int(parts[1]))
+            if p is None:
+                return self._send({"code": "woocommerce_rest_product_invalid_id"}, status=404)
+            return self._send(p)
+
+        self._send({"code": "rest_no_route"}, status=404)
+
+
+@contextmanager
+def serve(dataset: WooDataset, latency_ms: float = 0.0, port: int = 0, throttle_rate: float = 0.0) -> Iterator[FakeWooServer]:
+    """Run a FakeWooServer on a background thread for the duration of the block."""
+    srv = FakeWooServer(("127.0.0.1", port), dataset, latency_ms=latency_ms, throttle_rate=throttle_rate)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    try:
+        yield srv
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve a fake WooCommerce REST API")
+    ap.add_argument("--orders", type=int, default=5000)
+    ap.add_argument("--refund-rate", type=float, default=0.05)
+    ap.add_argument("--catalog", type=int, default=500)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    ds = generate(n_orders=args.orders, refund_rate=args.refund_rate, catalog_size=args.catalog, seed=args.seed)
+    srv = FakeWooServer(("127.0.0.1", args.port), ds, latency_ms=args.latency_ms, throttle_rate=args.throttle_rate)
+    print(f"Fake Woo on {srv.base_url} (orders={len(ds.orders)}); set WC_BASE_URL to this")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# benchmarks/suite.py
+"""
+End-to-end benchmark suite over seeded synthetic Woo data and the local fake Woo
+server: extract, transform (pandas / SQL engine), load, the full process_batch and
+the dashboard queries. Prints one JSON document (also written with --output), so runs
+on different commits can be diffed with --compare.
+
+    python -m benchmarks.suite --orders 20000 --output bench.json
+    python -m benchmarks.suite --orders 20000 --compare bench.json
+    python -m benchmarks.suite --scenarios transform_pandas load
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from .fake_woo import serve
+from .synthetic import WooDataset, generate
+
+SINCE = "2000-01-01T00:00:00"
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(fn: Callable, repeat: int = 1) -> Dict:
+    """Run fn `repeat` times; fn returns the number of rows it handled."""
+    times, rows = [], 0
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        rows = fn()
+        times.append(time.perf_counter() - t)
+    best = min(times)
+    return {
+        "rows": rows,
+        "seconds": round(best, 4),
+        "median_seconds": round(statistics.median(times), 4),
+        "rows_per_sec": round(rows / best, 1) if best else None,
+    }
+
+
+class Context:
+    def __init__(self, args, ds: WooDataset):
+        self.args = args
+        self.ds = ds
+        self.tmp = tempfile.mkdtemp(prefix="etl_bench_")
+
+    def fresh_db(self, name: str):
+        """Point DuckDBClient at a new warehouse file and return a client with the schema."""
+        from src.etl.load import duckdb_client
+        duckdb_client.DB_PATH = os.path.join(self.tmp, f"{name}.duckdb")
+        db = duckdb_client.DuckDBClient()
+        db.init_schema()
+        return db
+
+
+# ---------- Scenarios ----------
+
+def scenario_extract(ctx: Context) -> Dict:
+    from src.etl.extract.orders import iter_orders_since
+    from src.etl.extract.refunds import fetch_refund_payloads
+
+    out = {"orders_paged": _timed(lambda: sum(len(c) for c in iter_orders_since(SINCE)))}
+    out["refunds"] = _timed(lambda: len(fetch_refund_payloads([o["id"] for o in ctx.ds.orders], orders=ctx.ds.orders)))
+    return out
+
+
+def scenario_transform_pandas(ctx: Context) -> Dict:
+    from src.etl.extract.refunds import summarize_refunds
+    from src.etl.transform.enrich import apply_refunds, enrich_items_with_categories
+    from src.etl.transform.normalize_orders import normalize_orders
+
+    orders, r = ctx.ds.orders, ctx.args.repeat
+    df_orders, df_items = normalize_orders(orders)
+    refunds_map = summarize_refunds(df_orders["order_id"].tolist(), ctx.ds.refunds)
+    return {
+        "normalize": _timed(lambda: len(normalize_orders(orders)[0]), r),
+        "enrich": _timed(lambda: len(enrich_items_with_categories(df_items, ctx.ds.products)), r),
+        "apply_refunds": _timed(lambda: len(apply_refunds(df_orders, df_items, refunds_map)[1]), r),
+    }
+
+
+def scenario_transform_sql(ctx: Context) -> Dict:
+    db = ctx.fresh_db("transform_sql")
+    from src.etl.extract.product_cache import ProductCache
+    ProductCache(db.con).upsert(ctx.ds.products)
+    ids = [o["id"] for o in ctx.ds.orders]
+    out = {"land_raw": _timed(lambda: db.land_raw(ctx.ds.orders, ctx.ds.refunds) or len(ids))}
+
+    def transform():
+        db.stage_raw(ids)
+        return db.transform_staged()[0]
+
+    out["stage_and_transform"] = _timed(transform, ctx.args.repeat)
+    db.con.close()
+    return out
+
+
+def scenario_load(ctx: Context) -> Dict:
+    from src.etl.extract.refunds import summarize_refunds
+    from src.etl.load import duckdb_client
+    from src.etl.transform.enrich import apply_refunds, enrich_items_with_categories
+    from src.etl.transform.normalize_orders import normalize_orders
+
+    df_orders, df_items = normalize_orders(ctx.ds.orders)
+    df_items = enrich_items_with_categories(df_items, ctx.ds.products)
+    df_orders, df_items = apply_refunds(
+        df_orders, df_items, summarize_refunds(df_orders["order_id"].tolist(), ctx.ds.refunds)
+    )
+    rows = len(df_orders) + len(df_items)
+    out = {}
+    for mode in ("arrow", "pandas"):
+        duckdb_client.DUCKDB_LOAD_MODE = mode
+        db = ctx.fresh_db(f"load_{mode}")
+        out[f"{mode}_insert"] = _timed(lambda: db.load_batch(df_orders, df_items) or rows)
+        out[f"{mode}_upsert"] = _timed(lambda: db.load_batch(df_orders, df_items) or rows)
+        db.con.close()
+    duckdb_client.DUCKDB_LOAD_MODE = os.getenv("DUCKDB_LOAD_MODE", "arrow").lower()
+    return out
+
+
+def scenario_process_batch(ctx: Context) -> Dict:
+    from src.etl.extract.orders import iter_orders_since
+    from src.etl.orchestration.batch import process_batch
+
+    out = {}
+    for engine in ("pandas", "sql"):
+        ctx.fresh_db(f"process_{engine}").con.close()
+
+        def process():
+            return sum(process_batch(raw, engine=engine)[0] for raw in iter_orders_since(SINCE))
+
+        out[engine] = _timed(process)
+    return out
+
+
+def scenario_dashboard(ctx: Context) -> Dict:
+    from datetime import timedelta
+
+    import duckdb
+    from src.dashboard import queries
+    from src.etl.extract.product_cache import ProductCache
+
+    # Reuses the warehouse scenario_process_batch built; loads one offline if it did not run
+    path = os.path.join(ctx.tmp, "process_pandas.duckdb")
+    if not os.path.exists(path):
+        db = ctx.fresh_db("process_pandas")
+        db.land_raw(ctx.ds.orders, ctx.ds.refunds)
+        ProductCache(db.con).upsert(ctx.ds.products)
+        db.stage_raw()
+        db.transform_staged()
+        db.load_staged()
+        db.con.close()
+    con = duckdb.connect(path, read_only=True)
+    d_min, d_max = queries.date_bounds(con)
+
+    def page(d1, d2):
+        def run_all():
+            queries.date_bounds(con)
+            queries.kpis(con, d1, d2)
+            queries.timeseries(con, d1, d2)
+            queries.top_products(con, d1, d2)
+            queries.category_mix(con, d1, d2)
+            queries.geo(con, d1, d2)
+            return 6
+        return run_all
+
+    out = {
+        "page_30d": _timed(page(d_max - timedelta(days=30), d_max), ctx.args.repeat),
+        "page_all": _timed(page(d_min, d_max), ctx.args.repeat),
+    }
+    con.close()
+    return out
+
+
+SCENARIOS = {
+    "extract": scenario_extract,
+    "transform_pandas": scenario_transform_pandas,
+    "transform_sql": scenario_transform_sql,
+    "load": scenario_load,
+    "process_batch": scenario_process_batch,
+    "dashboard": scenario_dashboard,
+}
+NEEDS_SERVER = {"extract", "process_batch"}
+
+
+def compare(current: Dict, baseline: Dict) -> Dict:
+    """{scenario.case: current/baseline seconds} (> 1 means slower than baseline)."""
+    ratios = {}
+    for scenario, cases in current["results"].items():
+        for case, m in cases.items():
+            if not isinstance(m, dict):
+                continue
+            base = baseline.get("results", {}).get(scenario, {}).get(case)
+            if base and base.get("seconds") and m.get("seconds") is not None:
+                ratios[f"{scenario}.{case}"] = round(m["seconds"] / base["seconds"], 3)
+    return ratios
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ETL benchmark suite (JSON output)")
+    ap.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--orders", type=int, default=5000)
+    ap.add_argument("--items-per-order", type=int, default=3)
+    ap.add_argument("--refund-rate", type=float, default=0.05)
+    ap.add_argument("--catalog-size", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="Fake Woo per-request latency")
+    ap.add_argument("--repeat", type=int, default=3, help="Repeats for in-memory scenarios (best is reported)")
+    ap.add_argument("--output", help="Also write the JSON result to this file")
+    ap.add_argument("--compare", help="Baseline JSON from an earlier run; adds current/baseline time ratios")
+    args = ap.parse_args()
+    args.output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    commit = _git_commit()
+
+    ds = generate(
+        n_orders=args.orders, items_per_order=args.items_per_order, refund_rate=args.refund_rate,
+        catalog_size=args.catalog_size, seed=args.seed,
+    )
+    ctx = Context(args, ds)
+    results = {}
+    with serve(ds, latency_ms=args.latency_ms) as srv:
+        # Set before src.* is imported: clients read their settings at import time
+        os.environ.update(
+            WC_BASE_URL=srv.base_url, WC_CONSUMER_KEY="ck_bench", WC_CONSUMER_SECRET="cs_bench", WC_RATE_LIMIT="0",
+        )
+        os.chdir(ctx.tmp)  # keep ./data/* side effects out of the checkout
+        for name in args.scenarios:
+            logging.getLogger().setLevel(logging.WARNING)
+            srv.requests = 0
+            t = time.perf_counter()
+            results[name] = SCENARIOS[name](ctx)
+            if name in NEEDS_SERVER:
+                results[name]["http_requests"] = srv.requests
+            print(f"{name}: {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    import duckdb
+    import pandas as pd
+    doc = {
+        "suite": "woocommerce-etl",
+        "commit": commit,
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    if baseline is not None:
+        doc["compare"] = {
+            "baseline_commit": baseline.get("commit"),
+            "params_match": {k: v for k, v in baseline.get("params", {}).items() if k != "scenarios"}
+            == {k: v for k, v in doc["params"].items() if k != "scenarios"},
+            "ratios": compare(doc, baseline),
+        }
+
+    text = json.dumps(doc, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
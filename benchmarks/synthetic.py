@@ -0,0 +1,139 @@
+# benchmarks/synthetic.py
+"""Seeded generator of WooCommerce-shaped order, product and refund JSON."""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+CATEGORY_NAMES = [
+    "Apparel", "Shoes", "Accessories", "Home", "Kitchen", "Garden", "Toys",
+    "Books", "Electronics", "Beauty", "Sports", "Outdoor", "Pets", "Office",
+]
+CITIES = {
+    "GR": ["Athens", "Thessaloniki", "Patras", "Heraklion"],
+    "CY": ["Nicosia", "Limassol"],
+    "DE": ["Berlin", "Munich", "Hamburg"],
+    "IT": ["Rome", "Milan"],
+    "FR": ["Paris", "Lyon"],
+}
+STATUSES = ["completed"] * 8 + ["processing", "on-hold", "cancelled"]
+
+
+def _money(x: float) -> str:
+    return f"{x:.2f}"
+
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+@dataclass
+class WooDataset:
+    orders: List[dict] = field(default_factory=list)
+    products: Dict[int, dict] = field(default_factory=dict)
+    refunds: Dict[int, List[dict]] = field(default_factory=dict)  # order_id -> refunds
+
+
+def generate(
+    n_orders: int = 1000,
+    items_per_order: int = 3,
+    refund_rate: float = 0.05,
+    catalog_size: int = 500,
+    start: str = "2023-01-01",
+    days: int = 365,
+    seed: int = 42,
+) -> WooDataset:
+    """
+    Build a deterministic dataset. `items_per_order` is the mean line item count
+    (1..2*mean-1), `refund_rate` the share of orders with at least one refund.
+    """
+    rng = random.Random(seed)
+    ds = WooDataset()
+    t0 = datetime.fromisoformat(start)
+
+    # ---- Catalog
+    cats = [{"id": i + 1, "name": n, "slug": n.lower()} for i, n in enumerate(CATEGORY_NAMES)]
+    for pid in range(1, catalog_size + 1):
+        k = rng.choices([0, 1, 2, 3], weights=[2, 70, 22, 6])[0]
+        ds.products[pid] = {
+            "id": pid,
+            "name": f"Product {pid}",
+            "sku": f"SKU-{pid:06d}",
+            "price": _money(rng.uniform(3, 250)),
+            "date_modified_gmt": _ts(t0 + timedelta(days=rng.randint(0, days))),
+            "categories": rng.sample(cats, k),
+        }
+    pids = list(ds.products)
+    # Zipf-ish popularity so a few best sellers dominate, like a real store
+    weights = [1.0 / (rank + 1) for rank in range(len(pids))]
+
+    # ---- Orders (ascending creation date, as Woo returns with orderby=date&order=asc)
+    step = days * 86400 / max(n_orders, 1)
+    refund_id = 1
+    for n in range(n_orders):
+        oid = 1000 + n
+        created = t0 + timedelta(seconds=int(n * step + rng.uniform(0, step)))
+        n_items = rng.randint(1, max(1, 2 * items_per_order - 1))
+        line_items = []
+        for li_id, pid in enumerate(rng.choices(pids, weights=weights, k=n_items)):
+            qty = rng.randint(1, 4)
+            price = float(ds.products[pid]["price"])
+            line_items.append({
+                "id": oid * 100 + li_id,
+                "name": ds.products[pid]["name"],
+                "product_id": pid,
+                "variation_id": 0,
+                "quantity": qty,
+                "tax_class": "",
+                "subtotal": _money(price * qty),
+                "total": _money(price * qty),
+                "sku": ds.products[pid]["sku"],
+                "price": price,
+            })
+        items_total = sum(float(li["total"]) for li in line_items)
+        shipping = rng.choice([0.0, 3.5, 5.0])
+        tax = round((items_total + shipping) * 0.24, 2)
+        country = rng.choice(list(CITIES))
+
+        order_refunds = []
+        if rng.random() < refund_rate:
+            li = rng.choice(line_items)
+            qty = rng.randint(1, li["quantity"])
+            amount = round(li["price"] * qty, 2)
+            order_refunds.append({
+                "id": refund_id,
+                "date_created_gmt": _ts(created + timedelta(days=rng.randint(1, 20))),
+                "amount": _money(amount),
+                "reason": "",
+                "line_items": [{
+                    "id": li["id"],
+                    "product_id": li["product_id"],
+                    "variation_id": li["variation_id"],
+                    "quantity": -qty,
+                    "total": _money(-amount),
+                }],
+            })
+            refund_id += 1
+            ds.refunds[oid] = order_refunds
+
+        ds.orders.append({
+            "id": oid,
+            "status": rng.choice(STATUSES),
+            "currency": "EUR",
+            "date_created": _ts(created),
+            "date_created_gmt": _ts(created),
+            "date_modified_gmt": _ts(created + timedelta(hours=rng.randint(0, 72))),
+            "discount_total": "0.00",
+            "discount_tax": "0.00",
+            "shipping_total": _money(shipping),
+            "shipping_tax": "0.00",
+            "cart_tax": _money(tax),
+            "total": _money(items_total + shipping + tax),
+            "total_tax": _money(tax),
+            "customer_id": rng.randint(0, n_orders // 3 + 1),
+            "billing": {"country": country, "city": rng.choice(CITIES[country])},
+            "line_items": line_items,
+            # Woo embeds a refund summary on the order payload
+            "refunds": [{"id": r["id"], "reason": r["reason"], "total": _money(-float(r["amount"]))} for r in order_refunds],
+        })
+    return ds
@@ -1,116 +1,157 @@
 import os
+import shutil
+import threading
+import time
 import duckdb
-import pandas as pd
 import streamlit as st
-from datetime import date, timedelta
+from datetime import timedelta
+
+try:
+    from src.dashboard import queries
+except ImportError:  # `streamlit run` puts only this directory on sys.path
+    import queries
 
 DB = os.getenv("DUCKDB_PATH", "./data/warehouse.duckdb")
+# > 0: serve from a copy of the warehouse refreshed at most this often, so the ETL
+#      writer never waits on the dashboard's file lock
+# 0:   keep one read-only connection to the live file (blocks ETL writes while open)
+DASHBOARD_SNAPSHOT_MINUTES = float(os.getenv("DASHBOARD_SNAPSHOT_MINUTES", "5"))
+# Copies retried while the ETL keeps writing to the file or its WAL
+SNAPSHOT_COPY_ATTEMPTS = 3
+# Tables the dashboard reads; a snapshot is served only once all of them scan cleanly
+DASHBOARD_TABLES = ("agg_daily_kpis", "agg_daily_products", "agg_daily_categories", "agg_daily_geo", "dim_category")
+
+
+class WarehouseConnection:
+    """
+    One long-lived read-only DuckDB connection shared by all sessions, handing out
+    a cursor per thread (Streamlit runs each session on its own thread).
+    In snapshot mode the warehouse file (+ WAL) is copied and the connection swapped
+    when the copy is older than DASHBOARD_SNAPSHOT_MINUTES. The copy is taken by one
+    thread without holding the lock (the others keep querying the current snapshot),
+    retried if the ETL wrote during it, and swapped in only after the dashboard tables
+    read back cleanly; otherwise the previous snapshot stays.
+    """
+
+    def __init__(self, path: str = DB, snapshot_minutes: float = DASHBOARD_SNAPSHOT_MINUTES):
+        self.path = path
+        self.snapshot_minutes = snapshot_minutes
+        self._lock = threading.Lock()  # guards the fields below, held only to read/swap them
+        self._refresh_lock = threading.Lock()  # one copy at a time
+        self._local = threading.local()
+        self._con = None
+        self._retired = None  # previous generation, kept until cursors on it are replaced
+        self._generation = 0
+        self._opened_at = 0.0
+        self._snapshot_seq = 0
+
+    def _file_state(self) -> tuple:
+        state = []
+        for suffix in ("", ".wal"):
+            try:
+                st = os.stat(self.path + suffix)
+                state.append((st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                state.append(None)
+        return tuple(state)
+
+    def _snapshot(self, seq: int) -> duckdb.DuckDBPyConnection:
+        """Copy the warehouse to snapshot file `seq` and return a validated read-only connection to it."""
+        dst = f"{self.path}.snapshot{seq}"
+        for _ in range(SNAPSHOT_COPY_ATTEMPTS):
+            before = self._file_state()
+            for suffix in ("", ".wal"):
+                if os.path.exists(dst + suffix):
+                    os.remove(dst + suffix)
+                if os.path.exists(self.path + suffix):
+                    shutil.copyfile(self.path + suffix, dst + suffix)
+            if self._file_state() == before:
+                break
+        else:
+            raise OSError(f"{self.path} kept changing while being copied")
+        con = duckdb.connect(dst, read_only=True)
+        try:
+            # Read every column of every block the dashboard uses: a torn copy fails
+            # its block checksums here instead of in a user's query
+            for table in DASHBOARD_TABLES:
+                con.execute(f"SELECT COUNT(*), SUM(hash(COLUMNS(*))) FROM {table}").fetchall()
+        except duckdb.Error:
+            con.close()
+            raise
+        return con
+
+    def _due(self) -> bool:
+        stale = self.snapshot_minutes > 0 and time.monotonic() - self._opened_at > self.snapshot_minutes * 60
+        return self._con is None or stale
+
+    def _refresh(self) -> None:
+        with self._lock:
+            # Two generations back: its snapshot file is about to be overwritten
+            retired, self._retired = self._retired, None
+        if retired is not None:
+            retired.close()
+        # Alternate between two snapshot files so the copy never overwrites the open one
+        seq = self._snapshot_seq ^ 1
+        try:
+            con = self._snapshot(seq) if self.snapshot_minutes > 0 else duckdb.connect(self.path, read_only=True)
+        except (duckdb.Error, OSError):
+            if self._con is None:
+                raise
+            self._opened_at = time.monotonic()  # keep serving the last good snapshot
+            return
+        with self._lock:
+            self._snapshot_seq = seq
+            self._retired, self._con = self._con, con
+            self._generation += 1
+            self._opened_at = time.monotonic()
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        # Only the first open makes other sessions wait for the copy
+        if self._due() and self._refresh_lock.acquire(blocking=self._con is None):
+            try:
+                if self._due():
+                    self._refresh()
+            finally:
+                self._refresh_lock.release()
+        with self._lock:
+            generation, con = self._generation, self._con
+        cached = getattr(self._local, "cursor", None)
+        if cached is None or cached[0] != generation:
+            self._local.cursor = (generation, con.cursor())
+        return self._local.cursor[1]
+
+
+@st.cache_resource
+def warehouse() -> WarehouseConnection:
+    return WarehouseConnection()
+
+
+def _cursor() -> duckdb.DuckDBPyConnection:
+    return warehouse().cursor()
 
 @st.cache_data(ttl=120)
 def fetch_date_bounds():
-    con = duckdb.connect(DB, read_only=True)
-    df = con.execute("""
-        SELECT
-          MIN(CAST(order_date AS DATE)) AS min_d,
-          MAX(CAST(order_date AS DATE)) AS max_d
-        FROM fct_orders
-    """).df()
-    con.close()
-    if df.empty or pd.isna(df.loc[0, "min_d"]):
-        today = date.today()
-        return today - timedelta(days=30), today
-    return df.loc[0, "min_d"], df.loc[0, "max_d"]
+    return queries.date_bounds(_cursor())
 
 @st.cache_data(ttl=120)
 def load_kpis(d1, d2):
-    con = duckdb.connect(DB, read_only=True)
-    q = """
-      WITH base AS (
-        SELECT *
-        FROM fct_orders
-        WHERE CAST(order_date AS DATE) BETWEEN ? AND ?
-      )
-      SELECT
-        COUNT(*)                                   AS orders_cnt,
-        COALESCE(SUM(net_total), 0)               AS net_before_refunds,
-        COALESCE(SUM(refund_total), 0)            AS refunds,
-        COALESCE(SUM(COALESCE(net_after_refunds, net_total)), 0) AS net_after_refunds,
-        COALESCE(AVG(net_total), 0)               AS aov
-      FROM base;
-    """
-    k = con.execute(q, [d1, d2]).df().iloc[0].to_dict()
-    con.close()
-    return k
+    return queries.kpis(_cursor(), d1, d2)
 
 @st.cache_data(ttl=120)
 def load_timeseries(d1, d2):
-    con = duckdb.connect(DB, read_only=True)
-    ts = con.execute("""
-      SELECT
-        CAST(order_date AS DATE) AS d,
-        SUM(COALESCE(net_after_refunds, net_total)) AS net
-      FROM fct_orders
-      WHERE CAST(order_date AS DATE) BETWEEN ? AND ?
-      GROUP BY 1
-      ORDER BY 1
-    """, [d1, d2]).df()
-
-    con.close()
-    return ts
+    return queries.timeseries(_cursor(), d1, d2)
 
 @st.cache_data(ttl=120)
 def load_top_products(d1, d2, limit=15):
-    con = duckdb.connect(DB, read_only=True)
-    df = con.execute("""
-      SELECT
-        name,
-        SUM(total - COALESCE(refunded_total,0)) AS revenue,
-        SUM(quantity - COALESCE(refunded_quantity,0)) AS qty_sold
-      FROM fct_order_items i
-      JOIN fct_orders o USING(order_id)
-      WHERE CAST(o.order_date AS DATE) BETWEEN ? AND ?
-      GROUP BY 1
-      ORDER BY 2 DESC
-      LIMIT ?
-    """, [d1, d2, limit]).df()
-    con.close()
-    return df
+    return queries.top_products(_cursor(), d1, d2, limit)
 
 @st.cache_data(ttl=120)
 def load_category_mix(d1, d2, limit=15):
-    con = duckdb.connect(DB, read_only=True)
-    df = con.execute("""
-      SELECT
-        COALESCE(NULLIF(TRIM(category_snapshot), ''), 'Uncategorized') AS category,
-        SUM(total - COALESCE(refunded_total,0)) AS revenue
-      FROM fct_order_items i
-      JOIN fct_orders o USING(order_id)
-      WHERE CAST(o.order_date AS DATE) BETWEEN ? AND ?
-      GROUP BY 1
-      ORDER BY 2 DESC
-      LIMIT ?
-    """, [d1, d2, limit]).df()
-    con.close()
-    return df
+    return queries.category_mix(_cursor(), d1, d2, limit)
 
 @st.cache_data(ttl=120)
 def load_geo(d1, d2, limit=20):
-    con = duckdb.connect(DB, read_only=True)
-    df = con.execute("""
-      SELECT
-        COALESCE(NULLIF(TRIM(billing_country), ''), '—') AS country,
-        COALESCE(NULLIF(TRIM(billing_city), ''), '—')     AS city,
-        COUNT(*) AS orders,
-        SUM(COALESCE(net_after_refunds, net_total)) AS net
-      FROM fct_orders
-      WHERE CAST(order_date AS DATE) BETWEEN ? AND ?
-      GROUP BY 1,2
-      HAVING COUNT(*) > 0
-      ORDER BY net DESC
-      LIMIT ?
-    """, [d1, d2, limit]).df()
-    con.close()
-    return df
+    return queries.geo(_cursor(), d1, d2, limit)
 
 # --- UI ---
 st.set_page_config(page_title="Ecommerce KPIs", layout="wide")
@@ -0,0 +1,98 @@
+# src/dashboard/queries.py
+"""
+Dashboard queries over the agg_daily_* rollups, as plain functions of a DuckDB
+connection/cursor so they can be benchmarked without Streamlit.
+"""
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+def date_bounds(con):
+    df = con.execute("""
+        SELECT
+          MIN(day) AS min_d,
+          MAX(day) AS max_d
+        FROM agg_daily_kpis
+    """).df()
+    if df.empty or pd.isna(df.loc[0, "min_d"]):
+        today = date.today()
+        return today - timedelta(days=30), today
+    return df.loc[0, "min_d"], df.loc[0, "max_d"]
+
+
+def kpis(con, d1, d2):
+    q = """
+      SELECT
+        COALESCE(SUM(orders_cnt), 0)              AS orders_cnt,
+        COALESCE(SUM(net_before_refunds), 0)      AS net_before_refunds,
+        COALESCE(SUM(refunds), 0)                 AS refunds,
+        COALESCE(SUM(net_after_refunds), 0)       AS net_after_refunds,
+        COALESCE(SUM(net_before_refunds) / NULLIF(SUM(orders_cnt), 0), 0) AS aov
+      FROM agg_daily_kpis
+      WHERE day BETWEEN ? AND ?;
+    """
+    k = con.execute(q, [d1, d2]).df().iloc[0].to_dict()
+    return k
+
+
+def timeseries(con, d1, d2):
+    ts = con.execute("""
+      SELECT
+        day AS d,
+        net_after_refunds AS net
+      FROM agg_daily_kpis
+      WHERE day BETWEEN ? AND ?
+      ORDER BY 1
+    """, [d1, d2]).df()
+
+    return ts
+
+
+def top_products(con, d1, d2, limit=15):
+    df = con.execute("""
+      SELECT
+        name,
+        SUM(revenue) AS revenue,
+        SUM(qty_sold) AS qty_sold
+      FROM agg_daily_products
+      WHERE day BETWEEN ? AND ?
+      GROUP BY 1
+      ORDER BY 2 DESC
+      LIMIT ?
+    """, [d1, d2, limit]).df()
+    return df
+
+
+def category_mix(con, d1, d2, limit=15):
+    # Grouped on the integer id; names are the current dim_category ones. Rows without
+    # an id (items whose ids are not backfilled yet) group on their snapshot string
+    df = con.execute("""
+      SELECT
+        COALESCE(any_value(c.name), any_value(a.category)) AS category,
+        SUM(a.revenue) AS revenue
+      FROM agg_daily_categories AS a
+      LEFT JOIN dim_category AS c USING (category_id)
+      WHERE a.day BETWEEN ? AND ?
+      GROUP BY a.category_id, CASE WHEN a.category_id IS NULL THEN a.category END
+      ORDER BY 2 DESC
+      LIMIT ?
+    """, [d1, d2, limit]).df()
+    return df
+
+
+def geo(con, d1, d2, limit=20):
+    df = con.execute("""
+      SELECT
+        country,
+        city,
+        SUM(orders) AS orders,
+        SUM(net) AS net
+      FROM agg_daily_geo
+      WHERE day BETWEEN ? AND ?
+      GROUP BY 1,2
+      HAVING SUM(orders) > 0
+      ORDER BY net DESC
+      LIMIT ?
+    """, [d1, d2, limit]).df()
+    return df
@@ -0,0 +1,131 @@
+# src/etl/extract/async_wc_client.py
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List
+
+import httpx
+
+from .scheduler import WC_CONCURRENCY, get_scheduler
+from .wc_client import WC_MAX_CONNECTIONS, prepare_get
+from ..utils.metrics import observe_http
+
+# Protocol knobs for the shared async session (pool size: WC_MAX_CONNECTIONS)
+WC_HTTP2 = os.getenv("WC_HTTP2", "0").lower() in ("1", "true", "yes")
+WC_KEEPALIVE_EXPIRY = float(os.getenv("WC_KEEPALIVE_EXPIRY", "30"))
+
+# httpx logs every request URL at INFO, including query-string credentials (https)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class AsyncWooClient:
+    """
+    Async counterpart of WooClient built on one pooled httpx.AsyncClient.
+    All requests made through an instance share the same keep-alive connections
+    (and optionally HTTP/2), so open it once per run and pass it around:
+
+        async with AsyncWooClient() as wc:
+            orders = await wc.paged("orders", {"after": since})
+    """
+
+    def __init__(self, concurrency: int | None = None, http2: bool | None = None):
+        url = os.getenv("WC_BASE_URL", "").strip().rstrip("/")
+        ck = os.getenv("WC_CONSUMER_KEY")
+        cs = os.getenv("WC_CONSUMER_SECRET")
+
+        if not url or not ck or not cs:
+            raise RuntimeError("Woo credentials missing: set WC_BASE_URL, WC_CONSUMER_KEY, WC_CONSUMER_SECRET")
+
+        self.concurrency = max(1, int(concurrency or WC_CONCURRENCY))
+        # Same auth as WooClient: query string over https, OAuth 1.0a-signed URLs over http
+        self.api_url = f"{url}/wp-json/wc/v3/"
+        self.consumer_key = ck
+        self.consumer_secret = cs
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self.scheduler = get_scheduler()
+        self.http = httpx.AsyncClient(
+            http2=WC_HTTP2 if http2 is None else http2,
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=max(WC_MAX_CONNECTIONS, self.concurrency),
+                max_keepalive_connections=max(WC_MAX_CONNECTIONS, self.concurrency),
+                keepalive_expiry=WC_KEEPALIVE_EXPIRY,
+            ),
+            headers={"accept": "application/json"},
+        )
+
+    async def __aenter__(self) -> "AsyncWooClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        # Local cap per client; the shared scheduler adapts the global window below it
+        async with self._sem:
+            return await self.scheduler.acall(path, lambda: self._send(path, params), retry_on=(httpx.TransportError,))
+
+    async def _send(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        """One HTTP attempt, recorded in the etl_http_* metrics (retries count separately)."""
+        url, query = prepare_get(self.api_url, self.consumer_key, self.consumer_secret, path, params)
+        t = time.perf_counter()
+        try:
+            resp = await self.http.get(url, params=query)
+        except httpx.TransportError:
+            observe_http(path, "error", time.perf_counter() - t)
+            raise
+        observe_http(path, resp.status_code, time.perf_counter() - t, len(resp.content))
+        return resp
+
+    async def get(self, path: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return (await self._request(path, params)).json()
+
+    async def get_many(self, requests: Iterable[tuple]) -> List[Any]:
+        """Run many (path, params) GETs concurrently; results come back in input order."""
+        return list(await asyncio.gather(*(self.get(path, params) for path, params in requests)))
+
+    async def paged(self, path: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fetch all pages in page order; pages 2..N are requested concurrently."""
+        per_page = int(params.get("per_page", 100))
+        resp = await self._request(path, {**params, "page": 1, "per_page": per_page})
+        first = resp.json()
+        if not first:
+            return []
+        out: List[Dict[str, Any]] = list(first)
+        if len(first) < per_page:
+            return out
+
+        try:
+            total_pages = int(resp.headers.get("X-WP-TotalPages") or 0)
+        except (TypeError, ValueError):
+            total_pages = 0
+
+        page = 1
+        last = first
+        if total_pages > 1:
+            pages = await self.get_many(
+                (path, {**params, "page": n, "per_page": per_page}) for n in range(2, total_pages + 1)
+            )
+            for data in pages:
+                out.extend(data or [])
+                last = data or []
+            page = total_pages
+            if len(last) < per_page:
+                return out
+
+        while True:
+            page += 1
+            data = await self.get(path, {**params, "page": page, "per_page": per_page})
+            if not data:
+                break
+            out.extend(data)
+            if len(data) < per_page:
+                break
+        return out
@@ -1,19 +1,95 @@
+import os
 from .wc_client import WooClient
-from typing import List, Dict
+from typing import Iterator, List, Dict
 
-def fetch_orders_since(since_iso: str, status: str | None = None) -> List[Dict]:
-    """
-    Fetch orders created after given ISO timestamp.
-    NOTE: We intentionally do NOT use _fields, because WooCommerce does not reliably
-    project nested fields (line_items.product_id, etc.). We need full line_items.
-    """
-    wc = WooClient()
+# Orders handed to one normalize -> enrich -> refunds -> load batch when streaming
+ETL_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "1000"))
+
+# "created": new orders only (`after` + order_date watermark; default)
+# "modified": every order changed since the last run (`modified_after` + date_modified_gmt
+#             watermark), so status changes and refunds on old orders are picked up too
+ETL_SYNC_MODE = os.getenv("ETL_SYNC_MODE", "created").lower()
+SYNC_MODES = ("created", "modified")
+
+
+def _orders_params(since_iso: str, status: str | None = None, before_iso: str | None = None) -> Dict:
     params = {
         "after": since_iso,
         "orderby": "date",
         "order": "asc",
         "per_page": 100,
     }
+    if before_iso:
+        params["before"] = before_iso
     if status:
         params["status"] = status
-    return wc.paged("orders", params)
\ No newline at end of file
+    return params
+
+
+def _modified_params(modified_after_iso: str, modified_before_iso: str | None = None) -> Dict:
+    params = {
+        "modified_after": modified_after_iso,
+        "dates_are_gmt": "true",  # the watermark is date_modified_gmt
+        "orderby": "modified",
+        "order": "asc",
+        "per_page": 100,
+    }
+    if modified_before_iso:
+        params["modified_before"] = modified_before_iso
+    return params
+
+
+def _iter_chunks(params: Dict, chunk_size: int) -> Iterator[List[Dict]]:
+    wc = WooClient()
+    buf: List[Dict] = []
+    for page in wc.iter_pages("orders", params):
+        buf.extend(page)
+        if len(buf) >= chunk_size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def max_modified_gmt(raw_orders: List[Dict]) -> str | None:
+    """Newest date_modified_gmt in a batch, as 'YYYY-MM-DDTHH:MM:SS' (UTC)."""
+    stamps = [str(o["date_modified_gmt"])[:19] for o in raw_orders if o.get("date_modified_gmt")]
+    return max(stamps) if stamps else None
+
+
+def fetch_orders_since(since_iso: str, status: str | None = None, before_iso: str | None = None) -> List[Dict]:
+    """
+    Fetch orders created after given ISO timestamp (and before `before_iso`, if given).
+    NOTE: We intentionally do NOT use _fields, because WooCommerce does not reliably
+    project nested fields (line_items.product_id, etc.). We need full line_items.
+    """
+    wc = WooClient()
+    return wc.paged("orders", _orders_params(since_iso, status, before_iso))
+
+
+def iter_orders_since(
+    since_iso: str,
+    status: str | None = None,
+    chunk_size: int = ETL_CHUNK_SIZE,
+    before_iso: str | None = None,
+) -> Iterator[List[Dict]]:
+    """
+    Streaming variant of fetch_orders_since: yields orders (oldest first) in chunks of
+    about `chunk_size`, cut on page boundaries, while later pages are still downloading.
+    Only one chunk plus the prefetched pages are held in memory at a time.
+    """
+    yield from _iter_chunks(_orders_params(since_iso, status, before_iso), chunk_size)
+
+
+def iter_orders_modified_since(
+    modified_after_iso: str,
+    modified_before_iso: str | None = None,
+    chunk_size: int = ETL_CHUNK_SIZE,
+) -> Iterator[List[Dict]]:
+    """
+    Like iter_orders_since, but yields every order created OR changed (status, refunds,
+    edits) after `modified_after_iso` (UTC), oldest modification first, so each chunk's
+    max_modified_gmt() is a safe resume point. `modified_before_iso` pins the upper end
+    (the run's start) so orders changing while we page do not reshuffle the pages.
+    """
+    yield from _iter_chunks(_modified_params(modified_after_iso, modified_before_iso), chunk_size)
@@ -0,0 +1,209 @@
+# src/etl/extract/product_cache.py
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import pendulum as p
+
+from .products import fetch_products_by_ids, memo_forget, memo_lookup, memo_store
+from .wc_client import WooClient
+from ..load.duckdb_client import WRITE_LOCK, sync_category_dims, write_state
+from ..utils.logging import get_logger
+from ..utils.metrics import PRODUCT_LOOKUPS, timed_stage
+from ..utils.state import PRODUCTS_REFRESH_KEY
+
+log = get_logger(__name__)
+
+# Cached payloads older than this are treated as misses and evicted
+PRODUCT_CACHE_TTL_HOURS = float(os.getenv("PRODUCT_CACHE_TTL_HOURS", "168"))
+# Min interval between asks for products modified since the last refresh
+PRODUCT_CACHE_REFRESH_MINUTES = float(os.getenv("PRODUCT_CACHE_REFRESH_MINUTES", "15"))
+
+# One refresh at a time per process; the others then see its cursor and skip
+_REFRESH_LOCK = threading.Lock()
+# Parallel backfill windows share best sellers: the first thread to miss a product
+# fetches it, others that miss it meanwhile wait on its future instead of downloading
+# it again. The lock only guards this map, never the fetch itself.
+_IN_FLIGHT: Dict[Tuple[str, int], Future] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
+
+class ProductCache:
+    """
+    Product payloads persisted in DuckDB `dim_products`, keyed by product_id.
+    - get(): process memo (see products.memo_lookup), then dim_products; only misses /
+      expired rows go to the Woo API
+    - refresh(): evicts rows older than PRODUCT_CACHE_TTL_HOURS, then pulls
+      products?modified_after=<start of the previous refresh> (etl_state PRODUCTS_REFRESH_KEY)
+    """
+
+    def __init__(self, con, ttl_hours: float = PRODUCT_CACHE_TTL_HOURS):
+        self.con = con
+        self.ttl_hours = ttl_hours
+        # Memo scope: this database file (or this in-memory connection)
+        path = con.execute(
+            "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+        ).fetchone()[0]
+        self.scope = path or f"memory:{id(con)}"
+
+    def _cutoff(self) -> str:
+        return p.now("UTC").subtract(hours=self.ttl_hours).to_datetime_string()
+
+    def upsert(self, products: Dict[int, dict], state: dict | None = None) -> None:
+        """Cache `products` and write `state` (etl_state) in one transaction."""
+        if not products and not state:
+            return
+        now = p.now("UTC").to_datetime_string()
+        rows = pd.DataFrame({
+            "product_id": [int(pid) for pid in products],
+            "date_modified_gmt": pd.to_datetime(
+                [pr.get("date_modified_gmt") for pr in products.values()], errors="coerce"
+            ),
+            "payload": [json.dumps(pr) for pr in products.values()],
+            "fetched_at": pd.to_datetime([now] * len(products)),
+        })
+        with WRITE_LOCK:
+            self.con.begin()
+            try:
+                if products:
+                    self.con.register("product_rows", rows)
+                    self.con.execute("""
+                        INSERT OR REPLACE INTO dim_products
+                        SELECT product_id, date_modified_gmt, payload::JSON, fetched_at FROM product_rows
+                    """)
+                    self.con.unregister("product_rows")
+                    sync_category_dims(self.con, list(products))
+                for key, value in (state or {}).items():
+                    write_state(self.con, key, value)
+            except BaseException:
+                self.con.rollback()
+                raise
+            self.con.commit()
+        memo_store(products, scope=self.scope)
+
+    def _refresh_cursor(self) -> p.DateTime | None:
+        """
+        modified_after of the next refresh: when the last one started. Caches filled
+        before the cursor existed start from their oldest fetch (every cached payload
+        is at least that fresh); an empty cache has nothing to refresh.
+        """
+        row = self.con.execute("SELECT value FROM etl_state WHERE key = ?", [PRODUCTS_REFRESH_KEY]).fetchone()
+        if row:
+            return p.parse(row[0])
+        oldest = self.con.execute("SELECT MIN(fetched_at) FROM dim_products").fetchone()[0]
+        return p.instance(oldest, tz="UTC") if oldest else None
+
+    def refresh(self, force: bool = False) -> int:
+        """Incrementally pull products changed since the last refresh started. Returns rows updated."""
+        with _REFRESH_LOCK:
+            started = p.now("UTC")
+            since = self._refresh_cursor()
+            if not force and since and (started - since).in_seconds() < PRODUCT_CACHE_REFRESH_MINUTES * 60:
+                return 0
+            self.evict_expired()
+            changed = []
+            if since is not None:
+                # modified_after is exclusive and second-precise: step back a second
+                changed = WooClient().paged("products", {
+                    "modified_after": since.subtract(seconds=1).to_iso8601_string(),
+                    "dates_are_gmt": "true",
+                    "status": "any",
+                    "context": "edit",
+                    "per_page": 100,
+                })
+            # The cursor commits with the products it covers: a failed refresh is retried from the old one
+            self.upsert(
+                {int(pr["id"]): pr for pr in changed if pr.get("id") is not None},
+                state={PRODUCTS_REFRESH_KEY: started.to_iso8601_string()},
+            )
+        if changed:
+            log.info(f"Product cache: refreshed {len(changed)} modified products")
+        return len(changed)
+
+    def evict_expired(self) -> int:
+        with WRITE_LOCK:
+            evicted = [r[0] for r in self.con.execute(
+                "DELETE FROM dim_products WHERE fetched_at < ? RETURNING product_id", [self._cutoff()]
+            ).fetchall()]
+        if evicted:
+            # The SQL engine joins dim_products, so a memo hit must imply a cached row
+            memo_forget(evicted, scope=self.scope)
+            log.info(f"Product cache: evicted {len(evicted)} expired products")
+        return len(evicted)
+
+    @timed_stage("fetch_products", rows=len)
+    def get(self, product_ids: List[int]) -> Dict[int, dict]:
+        """Return {product_id: product_json} like fetch_products_by_ids, hitting Woo only for misses."""
+        ids = sorted({int(i) for i in product_ids if i is not None})
+        if not ids:
+            return {}
+
+        self.refresh()
+        out, rest = memo_lookup(ids, scope=self.scope)
+        if not rest:
+            log.info(f"Product cache: memo={len(out)}, hits=0, fetched=0")
+            return out
+
+        hits = self.con.execute("""
+            SELECT product_id, payload
+            FROM dim_products
+            WHERE product_id IN (SELECT * FROM UNNEST(?))
+              AND fetched_at >= ?
+        """, [rest, self._cutoff()]).fetchall()
+        cached: Dict[int, dict] = {int(pid): json.loads(payload) for pid, payload in hits}
+        memo_store(cached, scope=self.scope)
+        out.update(cached)
+
+        misses = [i for i in rest if i not in cached]
+        PRODUCT_LOOKUPS.labels(layer="dim_products", result="hit").inc(len(cached))
+        PRODUCT_LOOKUPS.labels(layer="dim_products", result="miss").inc(len(misses))
+        fetched = waited = 0
+        if misses:
+            found, fetched, waited = self._fetch_misses(misses)
+            out.update(found)
+        log.info(
+            f"Product cache: memo={len(ids) - len(rest)}, hits={len(cached)}, fetched={fetched}, waited={waited}"
+        )
+        return out
+
+    def _fetch_misses(self, misses: List[int]) -> Tuple[Dict[int, dict], int, int]:
+        """
+        Fetch `misses` from Woo, each id at most once across threads: ids another thread
+        is already fetching are awaited instead. Returns (products found, ids fetched
+        here, ids awaited); a failed fetch raises in its waiters too.
+        """
+        mine: Dict[int, Future] = {}
+        theirs: Dict[int, Future] = {}
+        with _IN_FLIGHT_LOCK:
+            # A fetch may have finished since the caller's memo lookup (it memoizes
+            # before leaving _IN_FLIGHT)
+            out, misses = memo_lookup(misses, scope=self.scope, record=False)
+            for pid in misses:
+                fut = _IN_FLIGHT.get((self.scope, pid))
+                if fut is None:
+                    mine[pid] = _IN_FLIGHT[(self.scope, pid)] = Future()
+                else:
+                    theirs[pid] = fut
+        try:
+            fetched = fetch_products_by_ids(list(mine), use_memo=False) if mine else {}
+            self.upsert(fetched)  # also memoizes them
+            memo_store({}, not_found=[i for i in mine if i not in fetched], scope=self.scope)
+        except BaseException as e:
+            for fut in mine.values():
+                fut.set_exception(e)
+            raise
+        finally:
+            with _IN_FLIGHT_LOCK:
+                for pid in mine:
+                    _IN_FLIGHT.pop((self.scope, pid), None)
+        for pid, fut in mine.items():
+            fut.set_result(fetched.get(pid))
+        out.update(fetched)
+        for pid, fut in theirs.items():
+            product = fut.result()
+            if product is not None:
+                out[pid] = product
+        return out, len(mine), len(theirs)
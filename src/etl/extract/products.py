@@ -1,6 +1,88 @@
 # src/etl/extract/products.py
-from typing import Dict, List, Iterable, Set
-from .wc_client import WooClient
+import os
+import threading
+from typing import Dict, List, Iterable, Set, Tuple
+
+from cachetools import TTLCache
+
+from .wc_client import WooClient, WooAPIError
+from ..utils.logging import get_logger
+from ..utils.metrics import PRODUCT_LOOKUPS
+
+log = get_logger(__name__)
+
+# Process-level memo in front of dim_products and the API, shared by every batch/window of a run.
+# Keys are (scope, product_id): ProductCache scopes entries to its database file, so a hit
+# there also means the product is in that file's dim_products; direct API lookups use None.
+PRODUCT_MEMO_SIZE = int(os.getenv("PRODUCT_MEMO_SIZE", "10000"))  # entries (LRU beyond that; 0 = off)
+PRODUCT_MEMO_TTL_SECONDS = float(os.getenv("PRODUCT_MEMO_TTL_SECONDS", "3600"))
+
+_NOT_FOUND = object()  # negative entry: Woo answered 404 / did not return the product
+
+_memo: TTLCache = TTLCache(maxsize=max(PRODUCT_MEMO_SIZE, 1), ttl=PRODUCT_MEMO_TTL_SECONDS)
+_memo_lock = threading.Lock()  # cachetools caches are not thread-safe (parallel backfill windows)
+_memo_stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+
+def memo_lookup(
+    ids: Iterable[int], scope: str | None = None, record: bool = True
+) -> Tuple[Dict[int, dict], List[int]]:
+    """
+    Split `ids` into ({product_id: payload} memo hits, ids still to look up).
+    Ids cached as not found are in neither: the caller treats them like a 404.
+    `record=False` re-checks without counting (e.g. after waiting for another fetch).
+    """
+    found: Dict[int, dict] = {}
+    rest: List[int] = []
+    if PRODUCT_MEMO_SIZE <= 0:
+        return found, list(ids)
+    hits = negative = 0
+    with _memo_lock:
+        for pid in ids:
+            entry = _memo.get((scope, pid))
+            if entry is None:
+                rest.append(pid)
+            elif entry is _NOT_FOUND:
+                negative += 1
+            else:
+                found[pid] = entry
+                hits += 1
+        if not record:
+            return found, rest
+        _memo_stats["hits"] += hits
+        _memo_stats["negative_hits"] += negative
+        _memo_stats["misses"] += len(rest)
+    PRODUCT_LOOKUPS.labels(layer="memory", result="hit").inc(hits)
+    PRODUCT_LOOKUPS.labels(layer="memory", result="negative_hit").inc(negative)
+    PRODUCT_LOOKUPS.labels(layer="memory", result="miss").inc(len(rest))
+    return found, rest
+
+
+def memo_store(products: Dict[int, dict], not_found: Iterable[int] = (), scope: str | None = None) -> None:
+    """Remember payloads (empty categories included, so they are not re-fetched) and 404s."""
+    if PRODUCT_MEMO_SIZE <= 0:
+        return
+    with _memo_lock:
+        for pid, product in products.items():
+            _memo[(scope, int(pid))] = product
+        for pid in not_found:
+            _memo[(scope, int(pid))] = _NOT_FOUND
+
+
+def memo_forget(ids: Iterable[int] | None = None, scope: str | None = None) -> None:
+    """Drop `ids` (every entry if None), e.g. after they were evicted from dim_products."""
+    with _memo_lock:
+        if ids is None:
+            _memo.clear()
+        else:
+            for pid in ids:
+                _memo.pop((scope, int(pid)), None)
+
+
+def memo_info() -> dict:
+    """Hit/miss counters since process start plus current size (like functools' cache_info)."""
+    with _memo_lock:
+        return {**_memo_stats, "size": len(_memo), "maxsize": PRODUCT_MEMO_SIZE}
 
 
 def _chunks(seq: Iterable[int], size: int = 100):
@@ -17,27 +99,43 @@ def _chunks(seq: Iterable[int], size: int = 100):
 
 
 def _fetch_product_single(wc: WooClient, pid: int) -> dict | None:
+    """GET one product; None only if Woo says it does not exist (deleted product)."""
     try:
         # Request full payload; some hosts hide nested fields with limited context
         p = wc.get(f"products/{pid}", params={"status": "any", "context": "edit"})
-        if isinstance(p, list):
-            p = p[0] if p else None
-        return p or None
-    except Exception:
-        return None
+    except WooAPIError as e:
+        if e.status == 404:
+            return None
+        raise
+    if isinstance(p, list):
+        p = p[0] if p else None
+    return p or None
 
 
-def fetch_products_by_ids(product_ids: List[int]) -> Dict[int, dict]:
+def fetch_products_by_ids(product_ids: List[int], use_memo: bool = True) -> Dict[int, dict]:
     """
     Return {product_id: product_json_with_categories}.
     Strategy:
+      0) Serve what the process memo already knows (payloads and 404s).
       1) Try batching with ?include=... (fast) using context=edit.
       2) For any missing IDs OR products with empty categories, GET /products/{id} individually.
+    Results, including products that stay uncategorized or missing, go back into the memo.
     """
     ids: List[int] = sorted({int(i) for i in product_ids if i is not None})
     if not ids:
         return {}
+    if use_memo:
+        known, ids = memo_lookup(ids)
+        if not ids:
+            return known
+        fetched = _fetch_products(ids)
+        memo_store(fetched, not_found=[i for i in ids if i not in fetched])
+        return {**known, **fetched}
+    return _fetch_products(ids)
+
 
+def _fetch_products(ids: List[int]) -> Dict[int, dict]:
+    """The API part of fetch_products_by_ids (steps 1 and 2) for sorted, de-duplicated ids."""
     wc = WooClient()
     out: Dict[int, dict] = {}
 
@@ -53,7 +151,9 @@ def fetch_products_by_ids(product_ids: List[int]) -> Dict[int, dict]:
                     "context": "edit",
                 },
             )
-        except Exception:
+        except WooAPIError as e:
+            # Some hosts reject include=...; the per-ID fallback below covers the batch
+            log.warning(f"Product batch fetch failed ({e.status}); falling back to per-ID for {len(batch)} ids")
             data = []
 
         for p in data or []:
@@ -1,9 +1,86 @@
 # src/etl/extract/refunds.py
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple
-from .wc_client import WooClient
+from .wc_client import WooClient, WC_CONCURRENCY
+from ..utils.metrics import timed_stage
 
 
-def fetch_refunds_for_orders(order_ids: List[int]) -> Dict[int, dict]:
+def _summarize(resp: List[dict]) -> dict:
+    """Fold one order's refunds payload into {refund_total, items}."""
+    total_amt = 0.0
+    items_map: Dict[Tuple[int, int], dict] = {}
+
+    for r in resp or []:
+        # Order-level refund amount (string in Woo, cast to float)
+        try:
+            total_amt += float(r.get("amount") or 0)
+        except Exception:
+            pass
+
+        # Item-level refunds
+        for li in (r.get("line_items") or []):
+            pid = int(li.get("product_id") or 0)
+            vid = int(li.get("variation_id") or 0)
+            key = (pid, vid)
+            entry = items_map.setdefault(key, {"qty": 0, "total": 0.0})
+
+            try:
+                entry["qty"] += int(li.get("quantity") or 0)
+            except Exception:
+                pass
+            try:
+                entry["total"] += float(li.get("total") or 0)
+            except Exception:
+                pass
+
+    return {
+        "refund_total": total_amt,
+        "items": items_map,
+    }
+
+
+@timed_stage("fetch_refunds", rows=len)
+def fetch_refund_payloads(
+    order_ids: List[int],
+    orders: List[Dict] | None = None,
+    concurrency: int | None = None,
+) -> Dict[int, List[dict]]:
+    """
+    Raw orders/{id}/refunds payloads for the orders that may have refunds.
+    If the raw `orders` payloads are passed, their embedded `refunds` summary is used
+    to skip orders that were never refunded (they are absent from the result); the rest
+    are fetched over `concurrency` workers (default WC_CONCURRENCY).
+    Request failures propagate (WooAPIError) instead of being read as "no refunds".
+    """
+    ids = [int(oid) for oid in order_ids or []]
+    need = ids
+    if orders is not None:
+        by_id = {int(o["id"]): o for o in orders if o.get("id") is not None}
+        # Payloads without the key (e.g. trimmed by a proxy) are fetched to be safe
+        need = [oid for oid in ids if oid not in by_id or by_id[oid].get("refunds", None) != []]
+    if not need:
+        return {}
+
+    wc = WooClient()
+
+    def fetch(oid: int) -> List[dict]:
+        return wc.get(f"orders/{oid}/refunds", params={"per_page": 100})
+
+    workers = max(1, min(int(concurrency or WC_CONCURRENCY), len(need)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(need, pool.map(fetch, need)))
+
+
+def summarize_refunds(order_ids: List[int], payloads: Dict[int, List[dict]]) -> Dict[int, dict]:
+    """Fold raw refund payloads into the fetch_refunds_for_orders mapping (zeros for the rest)."""
+    return {int(oid): _summarize(payloads.get(int(oid))) for oid in order_ids or []}
+
+
+def fetch_refunds_for_orders(
+    order_ids: List[int],
+    orders: List[Dict] | None = None,
+    concurrency: int | None = None,
+) -> Dict[int, dict]:
     """
     Returns a mapping:
       {
@@ -17,45 +94,6 @@ def fetch_refunds_for_orders(order_ids: List[int]) -> Dict[int, dict]:
           }
         }, ...
       }
+    See fetch_refund_payloads for how `orders` and `concurrency` are used.
     """
-    wc = WooClient()
-    result: Dict[int, dict] = {}
-
-    for oid in order_ids or []:
-        try:
-            resp = wc.get(f"orders/{int(oid)}/refunds", params={"per_page": 100})
-        except Exception:
-            resp = []
-
-        total_amt = 0.0
-        items_map: Dict[Tuple[int, int], dict] = {}
-
-        for r in resp or []:
-            # Order-level refund amount (string in Woo, cast to float)
-            try:
-                total_amt += float(r.get("amount") or 0)
-            except Exception:
-                pass
-
-            # Item-level refunds
-            for li in (r.get("line_items") or []):
-                pid = int(li.get("product_id") or 0)
-                vid = int(li.get("variation_id") or 0)
-                key = (pid, vid)
-                entry = items_map.setdefault(key, {"qty": 0, "total": 0.0})
-
-                try:
-                    entry["qty"] += int(li.get("quantity") or 0)
-                except Exception:
-                    pass
-                try:
-                    entry["total"] += float(li.get("total") or 0)
-                except Exception:
-                    pass
-
-        result[int(oid)] = {
-            "refund_total": total_amt,
-            "items": items_map,
-        }
-
-    return result
+    return summarize_refunds(order_ids, fetch_refund_payloads(order_ids, orders, concurrency))
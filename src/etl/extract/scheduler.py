@@ -0,0 +1,244 @@
+# src/etl/extract/scheduler.py
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Tuple, Type
+
+from ..utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Token bucket: sustained requests/second (0 disables) and burst size
+WC_RATE_LIMIT = float(os.getenv("WC_RATE_LIMIT", "10"))
+WC_RATE_BURST = int(os.getenv("WC_RATE_BURST", "20"))
+# AIMD concurrency window shared by every Woo client in the process.
+# WC_CONCURRENCY is the starting window and the per-call fan-out of paged().
+WC_CONCURRENCY = int(os.getenv("WC_CONCURRENCY", "4"))
+WC_MIN_CONCURRENCY = int(os.getenv("WC_MIN_CONCURRENCY", "1"))
+WC_MAX_CONCURRENCY = int(os.getenv("WC_MAX_CONCURRENCY", "16"))
+WC_LATENCY_TARGET = float(os.getenv("WC_LATENCY_TARGET", "2.0"))  # seconds
+# Retries for throttling / transient failures
+WC_MAX_RETRIES = int(os.getenv("WC_MAX_RETRIES", "5"))
+WC_BACKOFF_BASE = float(os.getenv("WC_BACKOFF_BASE", "0.5"))
+WC_BACKOFF_MAX = float(os.getenv("WC_BACKOFF_MAX", "60"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class WooAPIError(RuntimeError):
+    """A Woo request that failed for good (non-retryable status or retries exhausted)."""
+
+    def __init__(self, path: str, status: int, text: str = ""):
+        super().__init__(f"Woo GET {path} failed {status}: {text[:500]}")
+        self.path = path
+        self.status = status
+
+
+def _retry_after_seconds(headers) -> float | None:
+    v = (headers or {}).get("Retry-After")
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Process-wide gate in front of every Woo request:
+      - token bucket rate limiting (WC_RATE_LIMIT req/s, WC_RATE_BURST burst)
+      - AIMD concurrency: +1/limit per fast success, halve on throttling,
+        errors or latency above WC_LATENCY_TARGET (at most once per cooldown)
+      - retries on 429/5xx/transport errors, honoring Retry-After (which also
+        pauses all other requests) and otherwise backing off with full jitter
+    Works for both threads (call) and coroutines (acall).
+    """
+
+    def __init__(
+        self,
+        rate: float = WC_RATE_LIMIT,
+        burst: int = WC_RATE_BURST,
+        min_concurrency: int = WC_MIN_CONCURRENCY,
+        max_concurrency: int = WC_MAX_CONCURRENCY,
+        initial_concurrency: int | None = None,
+        latency_target: float = WC_LATENCY_TARGET,
+        max_retries: int = WC_MAX_RETRIES,
+        backoff_base: float = WC_BACKOFF_BASE,
+        backoff_max: float = WC_BACKOFF_MAX,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        start = initial_concurrency or WC_CONCURRENCY
+        self.limit = float(min(max(start, self.min_concurrency), self.max_concurrency))
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        # Counters, mostly for logs/benchmarks
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+    # ---------- Token bucket ----------
+
+    def _reserve_token(self) -> float:
+        """Take a token (possibly going into debt) and return how long to wait for it."""
+        with self._cond:
+            self.requests += 1
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate <= 0:
+                return wait
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    # ---------- AIMD window ----------
+
+    def _try_enter(self) -> bool:
+        if self._in_flight < int(self.limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _leave(self, ok: bool, latency: float, throttled: bool = False, pause: float | None = None) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if pause:
+                self._paused_until = max(self._paused_until, now + pause)
+            slow = latency > self.latency_target
+            if ok and not slow:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            elif now - self._last_decrease >= max(latency, 1.0):
+                # One multiplicative decrease per "round trip", not per failed request
+                old = self.limit
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+                if int(old) != int(self.limit):
+                    reason = "throttled" if throttled else ("slow" if ok else "error")
+                    log.info(f"Woo concurrency {int(old)} -> {int(self.limit)} ({reason}, {latency:.2f}s)")
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _on_response(self, path: str, resp, attempt: int, latency: float) -> float | None:
+        """Release the slot for a response; return the delay before retrying, or None if done."""
+        status = resp.status_code
+        if status < 400:
+            self._leave(True, latency)
+            return None
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            # Plain 4xx (e.g. 404) says nothing about server load
+            self._leave(status < 500 and status not in THROTTLE_STATUSES, latency)
+            raise WooAPIError(path, status, getattr(resp, "text", ""))
+
+        throttled = status in THROTTLE_STATUSES
+        retry_after = _retry_after_seconds(resp.headers)
+        self._leave(False, latency, throttled=throttled, pause=retry_after if throttled else None)
+        self.throttled += int(throttled)
+        self.retries += 1
+        delay = self._backoff(attempt, retry_after)
+        log.warning(f"Woo GET {path} -> {status}; retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def _on_transport_error(self, path: str, err: BaseException, attempt: int, latency: float) -> float:
+        self._leave(False, latency)
+        if attempt >= self.max_retries:
+            raise err
+        self.retries += 1
+        delay = self._backoff(attempt, None)
+        log.warning(f"Woo GET {path} transport error ({err}); retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    # ---------- Sync entry point ----------
+
+    def call(self, path: str, send: Callable[[], Any], retry_on: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """Run `send()` (one HTTP GET returning a response) under the rate/concurrency limits."""
+        attempt = 0
+        while True:
+            with self._cond:
+                while not self._try_enter():
+                    self._cond.wait()
+            t0 = time.monotonic()
+            try:
+                time.sleep(self._reserve_token())
+                t0 = time.monotonic()
+                resp = send()
+            except retry_on as e:
+                delay = self._on_transport_error(path, e, attempt, time.monotonic() - t0)
+            except BaseException:
+                # Anything else (decode errors, redirects, interrupts) fails the call, but
+                # must still give the slot back or the window shrinks for good
+                self._leave(False, time.monotonic() - t0)
+                raise
+            else:
+                delay = self._on_response(path, resp, attempt, time.monotonic() - t0)
+                if delay is None:
+                    return resp
+            attempt += 1
+            time.sleep(delay)
+
+    # ---------- Async entry point ----------
+
+    async def acall(self, path: str, send: Callable[[], Awaitable[Any]], retry_on: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """Coroutine version of call(); `send` is an async callable returning a response."""
+        attempt = 0
+        while True:
+            while True:
+                with self._cond:
+                    if self._try_enter():
+                        break
+                await asyncio.sleep(0.01)
+            t0 = time.monotonic()
+            try:
+                await asyncio.sleep(self._reserve_token())
+                t0 = time.monotonic()
+                resp = await send()
+            except retry_on as e:
+                delay = self._on_transport_error(path, e, attempt, time.monotonic() - t0)
+            except BaseException:  # incl. CancelledError: see call()
+                self._leave(False, time.monotonic() - t0)
+                raise
+            else:
+                delay = self._on_response(path, resp, attempt, time.monotonic() - t0)
+                if delay is None:
+                    return resp
+            attempt += 1
+            await asyncio.sleep(delay)
+
+_scheduler: RequestScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Shared scheduler, so all clients in the process respect one budget."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
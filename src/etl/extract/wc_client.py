@@ -2,48 +2,163 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-from typing import Dict, Any, List
-from woocommerce import API
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from woocommerce import __version__ as woocommerce_version
+from woocommerce.oauth import OAuth
+
+from .scheduler import WC_CONCURRENCY, WC_MAX_CONCURRENCY, WooAPIError, get_scheduler
+from ..utils.metrics import observe_http
+
+# Keep-alive connections kept open to the Woo host, shared by every client in the process
+WC_MAX_CONNECTIONS = int(os.getenv("WC_MAX_CONNECTIONS", "32"))
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Shared requests.Session: WooClient instances come and go per chunk, window and
+    product lookup, but all of them reuse one keep-alive pool instead of paying a TCP
+    (and TLS) handshake per request. The pool holds at least as many connections as
+    the scheduler lets requests run at once.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            size = max(WC_MAX_CONNECTIONS, WC_MAX_CONCURRENCY)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "user-agent": f"WooCommerce-Python-REST-API/{woocommerce_version}",
+                "accept": "application/json",
+            })
+            _session = session
+        return _session
+
+
+def prepare_get(api_url: str, consumer_key: str, consumer_secret: str, path: str, params: Dict[str, Any]):
+    """URL and query for one GET, authenticated the way the woocommerce lib does it."""
+    url = api_url + path.lstrip("/")
+    if url.startswith("https"):
+        # Query-string auth: helps with hosts that block Basic Auth or add WAF rules (e.g., Cloudflare)
+        return url, {**params, "consumer_key": consumer_key, "consumer_secret": consumer_secret}
+    # Plain HTTP: OAuth 1.0a-signed URL
+    signed = OAuth(
+        url=f"{url}?{urlencode(params)}" if params else url,
+        consumer_key=consumer_key,
+        consumer_secret=consumer_secret,
+        version="wc/v3",
+        method="GET",
+    ).get_oauth_url()
+    return signed, None
 
 
 class WooClient:
     def __init__(self):
-        url = os.getenv("WC_BASE_URL", "").strip().rstrip("/") + "/"
+        url = os.getenv("WC_BASE_URL", "").strip().rstrip("/")
         ck = os.getenv("WC_CONSUMER_KEY")
         cs = os.getenv("WC_CONSUMER_SECRET")
 
         if not url or not ck or not cs:
             raise RuntimeError("Woo credentials missing: set WC_BASE_URL, WC_CONSUMER_KEY, WC_CONSUMER_SECRET")
 
-        # Using query_string_auth=True helps with hosts that block Basic Auth or add WAF rules (e.g., Cloudflare)
-        self.wcapi = API(
-            url=url,
-            consumer_key=ck,
-            consumer_secret=cs,
-            version="wc/v3",
-            timeout=60,
-            wp_api=True,
-            query_string_auth=True,
-        )
+        self.api_url = f"{url}/wp-json/wc/v3/"
+        self.consumer_key = ck
+        self.consumer_secret = cs
+        self.http = get_session()
+        self.scheduler = get_scheduler()
+
+    def _prepare(self, path: str, params: Dict[str, Any]):
+        return prepare_get(self.api_url, self.consumer_key, self.consumer_secret, path, params)
+
+    def _request(self, path: str, params: Dict[str, Any]):
+        """
+        GET through the shared scheduler (rate limit, adaptive concurrency, retries).
+        Raises WooAPIError once a request has failed for good.
+        """
+        return self.scheduler.call(path, lambda: self._send(path, params), retry_on=(requests.ConnectionError, requests.Timeout))
+
+    def _send(self, path: str, params: Dict[str, Any]):
+        """One HTTP attempt, recorded in the etl_http_* metrics (retries count separately)."""
+        url, query = self._prepare(path, params)
+        t = time.perf_counter()
+        try:
+            resp = self.http.get(url, params=query, timeout=60)
+        except (requests.ConnectionError, requests.Timeout):
+            observe_http(path, "error", time.perf_counter() - t)
+            raise
+        observe_http(path, resp.status_code, time.perf_counter() - t, len(resp.content))
+        return resp
 
     def get(self, path: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
-        resp = self.wcapi.get(path.lstrip("/"), params=params)
-        # woocommerce lib returns a requests.Response-like object
-        if resp.status_code >= 400:
-            raise RuntimeError(f"Woo GET {path} failed {resp.status_code}: {resp.text}")
-        return resp.json()
+        return self._request(path, params).json()
 
-    def paged(self, path: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
-        page = 1
+    def iter_pages(self, path: str, params: Dict[str, Any], concurrency: int | None = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield the pages of a collection endpoint, in page order.
+        Page 1 is fetched first to read X-WP-TotalPages; later pages are prefetched by a
+        thread pool of `concurrency` workers (default WC_CONCURRENCY), never more than
+        `concurrency` pages ahead of the consumer, so memory stays bounded.
+        Falls back to sequential paging when the header is missing or concurrency is 1.
+        """
         per_page = int(params.get("per_page", 100))
-        out: List[Dict[str, Any]] = []
+        workers = max(1, int(concurrency or WC_CONCURRENCY))
+
+        def fetch(page: int) -> List[Dict[str, Any]]:
+            return self.get(path, {**params, "page": page, "per_page": per_page})
+
+        resp = self._request(path, {**params, "page": 1, "per_page": per_page})
+        first = resp.json()
+        if not first:
+            return
+        yield first
+        if len(first) < per_page:
+            return
+
+        try:
+            total_pages = int(resp.headers.get("X-WP-TotalPages") or 0)
+        except (TypeError, ValueError):
+            total_pages = 0
+
+        page = 1
+        if workers > 1 and total_pages > 1:
+            last: List[Dict[str, Any]] = []
+            with ThreadPoolExecutor(max_workers=min(workers, total_pages - 1)) as pool:
+                pending = deque()
+                next_page = 2
+                while pending or next_page <= total_pages:
+                    while next_page <= total_pages and len(pending) < workers:
+                        pending.append(pool.submit(fetch, next_page))
+                        next_page += 1
+                    last = pending.popleft().result() or []
+                    if last:
+                        yield last
+            page = total_pages
+            if len(last) < per_page:
+                return
+
+        # Sequential tail: no header, concurrency=1, or the collection grew past
+        # the page count reported by the first response.
         while True:
-            q = {**params, "page": page, "per_page": per_page}
-            data = self.get(path, q)
+            page += 1
+            data = fetch(page)
             if not data:
                 break
-            out.extend(data)
+            yield data
             if len(data) < per_page:
                 break
-            page += 1
-        return out
+
+    def paged(self, path: str, params: Dict[str, Any], concurrency: int | None = None) -> List[Dict[str, Any]]:
+        """Fetch all pages of a collection endpoint into one list (see iter_pages)."""
+        return [row for page in self.iter_pages(path, params, concurrency) for row in page]
@@ -1,9 +1,17 @@
+-- Raw landing zone (append-only; latest extracted_at per order wins on replay)
 CREATE TABLE IF NOT EXISTS stg_orders_raw (
   order_id BIGINT,
   json JSON,
   extracted_at TIMESTAMP
 );
 
+-- orders/{id}/refunds payloads (JSON array); never-refunded orders are not fetched
+CREATE TABLE IF NOT EXISTS stg_refunds_raw (
+  order_id BIGINT,
+  json JSON,
+  extracted_at TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS fct_orders (
   order_id BIGINT PRIMARY KEY,
   order_date TIMESTAMP,
@@ -21,7 +29,9 @@ CREATE TABLE IF NOT EXISTS fct_orders (
   refund_total DOUBLE,
   net_after_refunds DOUBLE,
   billing_country VARCHAR,
-  billing_city VARCHAR
+  billing_city VARCHAR,
+  -- Woo date_modified_gmt of the loaded payload (incremental runs skip unchanged re-reads)
+  date_modified_gmt TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS fct_order_items (
@@ -37,7 +47,135 @@ CREATE TABLE IF NOT EXISTS fct_order_items (
   tax_class VARCHAR,
   category_snapshot VARCHAR,
   refunded_quantity INTEGER,
-  refunded_total DOUBLE
+  refunded_total DOUBLE,
+  -- Denormalized from fct_orders so date ranges prune items without a join
+  order_date TIMESTAMP,
+  order_day DATE,
+  -- dim_category ids behind category_snapshot (aggregate per category on these)
+  category_ids BIGINT[]
+);
+
+-- Warehouses created before these columns existed
+ALTER TABLE fct_orders ADD COLUMN IF NOT EXISTS date_modified_gmt TIMESTAMP;
+ALTER TABLE fct_order_items ADD COLUMN IF NOT EXISTS order_date TIMESTAMP;
+ALTER TABLE fct_order_items ADD COLUMN IF NOT EXISTS order_day DATE;
+ALTER TABLE fct_order_items ADD COLUMN IF NOT EXISTS category_ids BIGINT[];
+
+-- Local product catalog cache (full Woo payloads), refreshed via modified_after
+CREATE TABLE IF NOT EXISTS dim_products (
+  product_id BIGINT PRIMARY KEY,
+  date_modified_gmt TIMESTAMP,
+  payload JSON,
+  fetched_at TIMESTAMP
+);
+
+-- Woo product categories (id -> latest name seen) and the product -> category bridge,
+-- derived from dim_products payloads whenever products are cached
+CREATE TABLE IF NOT EXISTS dim_category (
+  category_id BIGINT PRIMARY KEY,
+  name VARCHAR
+);
+
+-- No PRIMARY KEY: rows are swapped per product (delete + insert), which a key index
+-- rejects while another connection's open transaction still sees the deleted rows
+CREATE TABLE IF NOT EXISTS bridge_product_category (
+  product_id BIGINT,
+  category_id BIGINT,
+  position INTEGER
+);
+
+-- dim_products version each product's category_snapshot was last re-enriched from
+CREATE TABLE IF NOT EXISTS etl_product_versions (
+  product_id BIGINT PRIMARY KEY,
+  date_modified_gmt TIMESTAMP,
+  category_snapshot VARCHAR,
+  enriched_at TIMESTAMP
+);
+
+-- Pipeline state: per-entity cursors (watermarks) and backfill window checkpoints
+-- (see src/etl/utils/state.py); written in the same transaction as the facts.
+-- Bookkeeping timestamps here and in etl_runs / etl_run_metrics are naive UTC
+CREATE TABLE IF NOT EXISTS etl_state (
+  key VARCHAR PRIMARY KEY,
+  value VARCHAR,
+  updated_at TIMESTAMP,
+  run_id VARCHAR  -- etl_runs.run_id that last advanced the key
+);
+ALTER TABLE etl_state ADD COLUMN IF NOT EXISTS run_id VARCHAR;
+
+-- One row per pipeline run (metrics.start_run / finish_run). DuckDB admits one writer
+-- process, so a run still 'running' when the next one starts was interrupted
+CREATE TABLE IF NOT EXISTS etl_runs (
+  run_id VARCHAR PRIMARY KEY,
+  mode VARCHAR,
+  status VARCHAR,  -- running | ok | failed | interrupted
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  duration_seconds DOUBLE,
+  orders BIGINT,
+  items BIGINT,
+  http_requests BIGINT,
+  cursors JSON,  -- state.entity_cursors() at the end of the run
+  error VARCHAR
+);
+
+-- One row per metric sample per run (see src/etl/utils/metrics.py); counters and
+-- histogram _sum/_count hold the run's delta, gauges the value at the end of the run
+CREATE TABLE IF NOT EXISTS etl_run_metrics (
+  run_id VARCHAR,
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  mode VARCHAR,
+  ok BOOLEAN,
+  metric VARCHAR,
+  labels JSON,
+  value DOUBLE
+);
+
+-- Per-stage profile summary of runs started with --profile (see src/etl/utils/profiling.py);
+-- the full pstats dumps are in PROFILE_DIR/<run_id>/
+CREATE TABLE IF NOT EXISTS etl_run_profiles (
+  run_id VARCHAR,
+  stage VARCHAR,
+  calls INTEGER,
+  seconds DOUBLE,
+  alloc_peak_bytes BIGINT,
+  top_functions JSON,
+  top_allocations JSON
+);
+
+-- Daily rollups for the dashboard; the loader refreshes only the days each batch touches
+CREATE TABLE IF NOT EXISTS agg_daily_kpis (
+  day DATE PRIMARY KEY,
+  orders_cnt BIGINT,
+  net_before_refunds DOUBLE,
+  refunds DOUBLE,
+  net_after_refunds DOUBLE
+);
+
+CREATE TABLE IF NOT EXISTS agg_daily_products (
+  day DATE,
+  name VARCHAR,
+  revenue DOUBLE,
+  qty_sold BIGINT
+);
+
+-- One row per (day, category_id); an item in several categories counts in each.
+-- `category` is the name when the day was last refreshed; current names are in dim_category
+CREATE TABLE IF NOT EXISTS agg_daily_categories (
+  day DATE,
+  category_id BIGINT,
+  category VARCHAR,
+  revenue DOUBLE
+);
+ALTER TABLE agg_daily_categories ADD COLUMN IF NOT EXISTS category_id BIGINT;
+
+CREATE TABLE IF NOT EXISTS agg_daily_geo (
+  day DATE,
+  country VARCHAR,
+  city VARCHAR,
+  orders BIGINT,
+  net DOUBLE
 );
 
 CREATE INDEX IF NOT EXISTS idx_fct_order_items_order ON fct_order_items(order_id);
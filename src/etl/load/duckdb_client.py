@@ -1,29 +1,212 @@
 # src/etl/load/duckdb_client.py
+import json
 import os
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
 import duckdb
 import pandas as pd
+import pendulum as p
+import pyarrow as pa
+from ..transform.sql_transform import (
+    DIM_PRODUCT_CATEGORIES_SQL, items_sql, latest_raw_sql, orders_sql, parse_orders_sql, parse_refunds_sql,
+    product_categories_sql,
+)
 from ..utils.logging import get_logger
+from ..utils.metrics import current_run_id, stage
+from . import parquet_export
 
 log = get_logger(__name__)
 
 DB_PATH = os.getenv("DUCKDB_PATH", "./data/warehouse.duckdb")
 Path(os.path.dirname(DB_PATH) or ".").mkdir(parents=True, exist_ok=True)
 
+# "arrow": zero-copy Arrow staging + single-transaction upsert (default)
+# "pandas": original DELETE + INSERT through the pandas replacement scan
+DUCKDB_LOAD_MODE = os.getenv("DUCKDB_LOAD_MODE", "arrow").lower()
+# Rewrite the fact tables in order_date order at most this often, and only after
+# loads appended rows out of date order (see recluster)
+RECLUSTER_INTERVAL_HOURS = float(os.getenv("RECLUSTER_INTERVAL_HOURS", "24"))
+# etl_state key set by such loads, in their transaction; recluster() clears it
+RECLUSTER_PENDING_KEY = "recluster_pending"
+# INSERT OR REPLACE beats delete+insert for chunk-sized batches but gets slower
+# than it on large ones (PK index maintenance); switch strategy above this size
+UPSERT_REPLACE_MAX_ROWS = int(os.getenv("UPSERT_REPLACE_MAX_ROWS", "50000"))
+
+# DuckDB allows one writer per database file; threads in this process (parallel
+# backfill windows) take turns through this lock instead of hitting write conflicts
+WRITE_LOCK = threading.RLock()
+
+# etl_state key of the one-time category_ids backfill; CATEGORY_IDS_PENDING while items
+# of products missing from dim_products still have no ids (re-enrich finishes it)
+CATEGORY_IDS_STATE = "schema:category_ids"
+CATEGORY_IDS_PENDING = "pending"
+
+# product_id -> category_snapshot / category_ids map applied by apply_category_map (re-enrichment)
+CATEGORY_MAP_SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("category_snapshot", pa.string()),
+    ("category_ids", pa.list_(pa.int64())),
+    ("date_modified_gmt", pa.timestamp("us")),
+])
+
 # Column order we want in tables
 FCT_ORDERS_COLS = [
     "order_id", "order_date", "status", "currency", "customer_id",
     "discount_total", "discount_tax", "shipping_total", "shipping_tax",
     "cart_tax", "total_tax", "gross_total", "net_total",
     "refund_total", "net_after_refunds",
-    "billing_country", "billing_city",
+    "billing_country", "billing_city", "date_modified_gmt",
 ]
 
 FCT_ITEMS_COLS = [
     "order_id", "product_id", "variation_id", "sku", "name", "quantity",
     "price", "total", "subtotal", "tax_class",
-    "category_snapshot", "refunded_quantity", "refunded_total",
-]
+    "category_snapshot", "refunded_quantity", "refunded_total", "category_ids",
+]  # + order_date/order_day, filled from fct_orders on insert
+
+# Arrow schemas mirroring ddl.sql, so staged tables need no casts inside DuckDB
+FCT_ORDERS_SCHEMA = pa.schema([
+    ("order_id", pa.int64()), ("order_date", pa.timestamp("us")), ("status", pa.string()),
+    ("currency", pa.string()), ("customer_id", pa.int64()),
+    ("discount_total", pa.float64()), ("discount_tax", pa.float64()),
+    ("shipping_total", pa.float64()), ("shipping_tax", pa.float64()),
+    ("cart_tax", pa.float64()), ("total_tax", pa.float64()),
+    ("gross_total", pa.float64()), ("net_total", pa.float64()),
+    ("refund_total", pa.float64()), ("net_after_refunds", pa.float64()),
+    ("billing_country", pa.string()), ("billing_city", pa.string()),
+    ("date_modified_gmt", pa.timestamp("us")),
+])
+
+FCT_ITEMS_SCHEMA = pa.schema([
+    ("order_id", pa.int64()), ("product_id", pa.int64()), ("variation_id", pa.int64()),
+    ("sku", pa.string()), ("name", pa.string()), ("quantity", pa.int32()),
+    ("price", pa.float64()), ("total", pa.float64()), ("subtotal", pa.float64()),
+    ("tax_class", pa.string()), ("category_snapshot", pa.string()),
+    ("refunded_quantity", pa.int32()), ("refunded_total", pa.float64()),
+    ("category_ids", pa.list_(pa.int64())),
+])
+
+# Daily rollups (ddl.sql agg_daily_*): SELECTs over the facts, restricted by
+# {orders_where} / {items_where} to the days being refreshed
+ROLLUPS = {
+    "agg_daily_kpis": """
+        SELECT
+          CAST(order_date AS DATE) AS day,
+          COUNT(*) AS orders_cnt,
+          COALESCE(SUM(net_total), 0) AS net_before_refunds,
+          COALESCE(SUM(refund_total), 0) AS refunds,
+          COALESCE(SUM(COALESCE(net_after_refunds, net_total)), 0) AS net_after_refunds
+        FROM fct_orders AS o
+        WHERE {orders_where}
+        GROUP BY 1
+    """,
+    "agg_daily_products": """
+        SELECT
+          i.order_day AS day,
+          i.name,
+          SUM(i.total - COALESCE(i.refunded_total, 0)) AS revenue,
+          SUM(i.quantity - COALESCE(i.refunded_quantity, 0)) AS qty_sold
+        FROM fct_order_items AS i
+        WHERE {items_where}
+        GROUP BY 1, 2
+    """,
+    # One row per category an item belongs to (multi-category items count in each);
+    # category_id 0 = uncategorized. Names come from dim_category at refresh time.
+    "agg_daily_categories": """
+        SELECT
+          i.day,
+          i.category_id,
+          COALESCE(any_value(c.name), i.snapshot, 'Uncategorized') AS category,
+          SUM(i.revenue) AS revenue
+        FROM (
+          SELECT
+            i.order_day AS day,
+            -- Items still without ids (loaded before category_ids, product not cached
+            -- yet) keep their snapshot string under a NULL id until re-enrich fills them
+            UNNEST(CASE
+              WHEN len(i.category_ids) > 0 THEN i.category_ids
+              WHEN i.category_ids IS NULL AND NULLIF(TRIM(i.category_snapshot), '') IS NOT NULL THEN [NULL::BIGINT]
+              ELSE [0::BIGINT]
+            END) AS category_id,
+            CASE WHEN i.category_ids IS NULL THEN NULLIF(TRIM(i.category_snapshot), '') END AS snapshot,
+            i.total - COALESCE(i.refunded_total, 0) AS revenue
+          FROM fct_order_items AS i
+          WHERE {items_where}
+        ) AS i
+        LEFT JOIN dim_category AS c USING (category_id)
+        GROUP BY i.day, i.category_id, i.snapshot
+    """,
+    "agg_daily_geo": """
+        SELECT
+          CAST(order_date AS DATE) AS day,
+          COALESCE(NULLIF(TRIM(billing_country), ''), '—') AS country,
+          COALESCE(NULLIF(TRIM(billing_city), ''), '—') AS city,
+          COUNT(*) AS orders,
+          SUM(COALESCE(net_after_refunds, net_total)) AS net
+        FROM fct_orders AS o
+        WHERE {orders_where}
+        GROUP BY 1, 2, 3
+    """,
+}
+
+
+def to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Build an Arrow table with exactly `schema` (missing columns become nulls)."""
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        col = df[field.name]
+        if pa.types.is_timestamp(field.type):
+            col = pd.to_datetime(col, errors="coerce")
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            col = pd.to_numeric(col, errors="coerce")
+        try:
+            arr = pa.array(col, type=field.type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. numeric SKUs in a VARCHAR column
+            arr = pa.array(col.where(col.isna(), col.astype(str)), type=field.type, from_pandas=True)
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_state(con, key: str, value: str) -> None:
+    """Upsert one etl_state row, stamped with the etl_runs run writing it. Callers hold WRITE_LOCK."""
+    con.execute(
+        "INSERT OR REPLACE INTO etl_state (key, value, updated_at, run_id) VALUES (?, ?, ?, ?)",
+        [key, value, p.now("UTC").naive(), current_run_id()],
+    )
+
+
+def sync_category_dims(con, product_ids: list | None = None) -> None:
+    """
+    Refresh dim_category and bridge_product_category from the dim_products payloads of
+    `product_ids` (all cached products if None). Category names are upserted, never
+    deleted, so evicted products' categories keep their names. Callers hold WRITE_LOCK.
+    """
+    if product_ids is None:
+        where, params = "TRUE", []
+    else:
+        where, params = "product_id IN (SELECT UNNEST(?))", [[int(x) for x in product_ids]]
+    con.execute(f"CREATE OR REPLACE TEMP TABLE product_categories AS {product_categories_sql(where)}", params)
+    try:
+        if product_ids is None:
+            con.execute("DELETE FROM bridge_product_category")
+        else:
+            con.execute("DELETE FROM bridge_product_category WHERE product_id IN (SELECT UNNEST(?))", params)
+        con.execute("""
+            INSERT INTO bridge_product_category
+            SELECT product_id, category_id, min(position) FROM product_categories GROUP BY 1, 2
+        """)
+        con.execute("""
+            INSERT OR REPLACE INTO dim_category
+            SELECT category_id, any_value(name) FROM product_categories GROUP BY 1
+        """)
+    finally:
+        con.execute("DROP TABLE IF EXISTS product_categories")
 
 
 class DuckDBClient:
@@ -35,8 +218,83 @@ class DuckDBClient:
         ddl_path = Path(__file__).with_name("ddl.sql")
         with open(ddl_path, "r", encoding="utf-8") as f:
             self.con.execute(f.read())
+        with WRITE_LOCK:
+            # Items loaded before order_date/order_day existed: copy them from fct_orders
+            if self.con.execute("SELECT EXISTS (FROM fct_order_items WHERE order_day IS NULL)").fetchone()[0]:
+                self.con.execute("""
+                    UPDATE fct_order_items AS i
+                    SET order_date = o.order_date, order_day = CAST(o.order_date AS DATE)
+                    FROM fct_orders AS o
+                    WHERE i.order_id = o.order_id AND i.order_day IS NULL AND o.order_date IS NOT NULL
+                """)
+            # Warehouses created before dim_category / category_ids: build the dimension
+            # from the cached catalog, give items their current categories' ids and
+            # rebuild the per-category rollup, once. Items whose products are not cached
+            # leave the migration 'pending' until re-enrich fetches them
+            if self.get_state(CATEGORY_IDS_STATE) is None:
+                with self.transaction():
+                    sync_category_dims(self.con)
+                    self.con.execute("""
+                        UPDATE fct_order_items AS i
+                        SET category_ids = b.category_ids
+                        FROM (
+                          SELECT product_id, list(category_id ORDER BY position) AS category_ids
+                          FROM bridge_product_category GROUP BY 1
+                        ) AS b
+                        WHERE i.product_id = b.product_id AND i.category_ids IS NULL AND i.category_snapshot IS NOT NULL
+                    """)
+                    if self.con.execute("SELECT EXISTS (FROM agg_daily_categories)").fetchone()[0]:
+                        self._refresh_rollups(None)
+                    pending = self.con.execute(
+                        "SELECT EXISTS (FROM fct_order_items WHERE category_ids IS NULL AND product_id IS NOT NULL)"
+                    ).fetchone()[0]
+                    self._set_state(
+                        CATEGORY_IDS_STATE, CATEGORY_IDS_PENDING if pending else p.now("UTC").to_iso8601_string()
+                    )
+            # Warehouses created before the rollups existed: build them once from the facts
+            if self.con.execute(
+                "SELECT NOT EXISTS (FROM agg_daily_kpis) AND EXISTS (FROM fct_orders)"
+            ).fetchone()[0]:
+                self.refresh_rollups()
         log.info("Schema ensured.")
 
+    @contextmanager
+    def transaction(self):
+        with WRITE_LOCK:
+            self.con.begin()
+            try:
+                yield self.con
+            except BaseException:
+                self.con.rollback()
+                raise
+            self.con.commit()
+        if parquet_export.enabled():
+            self._export_parquet()
+
+    def _export_parquet(self) -> None:
+        """
+        Rewrite the Parquet partitions pending in etl_state (PARQUET_EXPORT_DIR): the ones
+        this commit marked plus any an earlier export failed on. A mark is cleared only
+        once its month is written, and only if no commit re-marked it in the meantime.
+        """
+        pending = self.states(parquet_export.PENDING_PREFIX)
+        if not pending:
+            return
+        marks = {key[len(parquet_export.PENDING_PREFIX):]: (key, token) for key, token in pending.items()}
+        if parquet_export.ALL_MONTHS in marks:
+            batches = [(parquet_export.ALL_MONTHS, None, list(marks.values()))]
+        else:
+            batches = [(m, {parquet_export.parse_month_key(m)}, [mark]) for m, mark in sorted(marks.items())]
+        for label, months, done in batches:
+            try:
+                parquet_export.export_months(self.con, months, run_id=current_run_id())
+            except Exception as e:  # the load is committed; the mark stays for the next commit
+                log.warning(f"Parquet export of {label} failed ({e}); will retry after the next commit")
+                continue
+            with WRITE_LOCK:
+                for key, token in done:
+                    self.con.execute("DELETE FROM etl_state WHERE key = ? AND value = ?", [key, token])
+
     def _align_cols(self, df: pd.DataFrame, cols: list) -> pd.DataFrame:
         df = df.copy()
         for c in cols:
@@ -45,11 +303,456 @@ class DuckDBClient:
         # keep only desired columns in correct order
         return df[cols]
 
-    def load_orders(self, df_orders: pd.DataFrame):
+    # ---------- Arrow upserts (no transaction handling; callers wrap them) ----------
+
+    def _note_out_of_order(self, oldest) -> None:
+        """Mark a recluster as due when rows older than the newest loaded order are appended."""
+        if oldest is None:
+            return
+        newest = self.con.execute("SELECT MAX(order_date) FROM fct_orders").fetchone()[0]
+        if newest is not None and oldest < newest:
+            self._set_state(RECLUSTER_PENDING_KEY, p.now("UTC").to_iso8601_string())
+
+    def _insert_orders_from(self, rel: str, n: int) -> None:
+        """Upsert orders from `rel`, appended in order_date order (keeps zone maps tight)."""
+        self._note_out_of_order(self.con.execute(f"SELECT MIN(order_date) FROM {rel}").fetchone()[0])
+        if n <= UPSERT_REPLACE_MAX_ROWS:
+            self.con.execute(f"INSERT OR REPLACE INTO fct_orders BY NAME SELECT * FROM {rel} ORDER BY order_date")
+        else:
+            self.con.execute(f"DELETE FROM fct_orders WHERE order_id IN (SELECT order_id FROM {rel})")
+            self.con.execute(f"INSERT INTO fct_orders BY NAME SELECT * FROM {rel} ORDER BY order_date")
+
+    def _insert_items_from(self, rel: str) -> None:
+        """Insert items from `rel` with order_date/order_day taken from fct_orders (upserted first)."""
+        self.con.execute(f"""
+            INSERT INTO fct_order_items BY NAME
+            SELECT s.*, o.order_date, CAST(o.order_date AS DATE) AS order_day
+            FROM {rel} AS s
+            LEFT JOIN fct_orders AS o USING (order_id)
+            ORDER BY o.order_date
+        """)
+
+    def _upsert_orders_arrow(self, df_orders: pd.DataFrame) -> int:
+        # INSERT OR REPLACE needs unique keys within the statement: last version wins
+        df = df_orders.drop_duplicates("order_id", keep="last")
+        self.con.register("stg_fct_orders", to_arrow(df, FCT_ORDERS_SCHEMA))
+        try:
+            self._insert_orders_from("stg_fct_orders", len(df))
+        finally:
+            self.con.unregister("stg_fct_orders")
+        return len(df)
+
+    def _upsert_items_arrow(self, df_items: pd.DataFrame) -> int:
+        # Items have no natural key: swap every staged order's rows as a unit
+        self.con.register("stg_fct_order_items", to_arrow(df_items, FCT_ITEMS_SCHEMA))
+        try:
+            self.con.execute("""
+                DELETE FROM fct_order_items
+                WHERE order_id IN (SELECT DISTINCT order_id FROM stg_fct_order_items)
+            """)
+            self._insert_items_from("stg_fct_order_items")
+        finally:
+            self.con.unregister("stg_fct_order_items")
+        return len(df_items)
+
+    def _upsert_orders(self, df_orders: pd.DataFrame) -> None:
         if df_orders.empty:
             return
+        with stage("load_fct_orders", rows=len(df_orders)):
+            if DUCKDB_LOAD_MODE == "pandas":
+                return self._load_orders_pandas(df_orders)
+            n = self._upsert_orders_arrow(df_orders)
+        log.info(f"Loaded {n} rows into fct_orders")
+
+    def _upsert_items(self, df_items: pd.DataFrame) -> None:
+        if df_items.empty:
+            return
+        with stage("load_fct_order_items", rows=len(df_items)):
+            if DUCKDB_LOAD_MODE == "pandas":
+                return self._load_order_items_pandas(df_items)
+            n = self._upsert_items_arrow(df_items)
+        log.info(f"Loaded {n} rows into fct_order_items")
+
+    # ---------- Public loaders ----------
+
+    def load_orders(self, df_orders: pd.DataFrame):
+        with self.transaction():
+            days = self._order_days(df_orders)
+            self._upsert_orders(df_orders)
+            self._refresh_rollups(days | self._order_days(df_orders))
+
+    def load_order_items(self, df_items: pd.DataFrame):
+        with self.transaction():
+            self._upsert_items(df_items)
+            self._refresh_rollups(self._order_days(df_items))
+
+    def load_batch(self, df_orders: pd.DataFrame, df_items: pd.DataFrame, state: dict | None = None):
+        """
+        Upsert both fact tables and advance pipeline state (e.g. the watermark) in ONE
+        transaction: after a crash either the whole batch is visible or none of it is.
+        """
+        with self.transaction():
+            days = self._order_days(df_orders)  # days the replaced rows sat on
+            self._upsert_orders(df_orders)
+            self._upsert_items(df_items)
+            self._refresh_rollups(days | self._order_days(df_orders))
+            for key, value in (state or {}).items():
+                self._set_state(key, value)
+
+    def unchanged_orders(self, raw_orders: list, until, by_modified: bool = False) -> set:
+        """
+        Ids of `raw_orders` already in fct_orders at the same date_modified_gmt whose
+        order_date (date_modified_gmt when `by_modified`) is at or before `until`:
+        the boundary orders an incremental run re-reads and need not load again.
+        """
+        ids, modified = [], []
+        for o in raw_orders or []:
+            if o.get("id") is not None and o.get("date_modified_gmt"):
+                ids.append(int(o["id"]))
+                modified.append(str(o["date_modified_gmt"])[:19])
+        if not ids:
+            return set()
+        column = "date_modified_gmt" if by_modified else "order_date"
+        rows = self.con.execute(f"""
+            SELECT f.order_id
+            FROM (SELECT UNNEST(?) AS order_id, TRY_CAST(UNNEST(?) AS TIMESTAMP) AS date_modified_gmt) AS r
+            JOIN fct_orders AS f USING (order_id)
+            WHERE f.date_modified_gmt = r.date_modified_gmt AND f.{column} <= ?
+        """, [ids, modified, until]).fetchall()
+        return {r[0] for r in rows}
+
+    # ---------- Raw landing zone (stg_*_raw) ----------
+
+    def _land(self, table: str, payloads: dict) -> None:
+        if not payloads:
+            return
+        now = p.now("UTC").naive()
+        self.con.register("stg_landing", pa.table({
+            "order_id": pa.array(list(payloads), type=pa.int64()),
+            "json": pa.array([json.dumps(v) for v in payloads.values()], type=pa.string()),
+            "extracted_at": pa.array([now] * len(payloads), type=pa.timestamp("us")),
+        }))
+        try:
+            self.con.execute(f"INSERT INTO {table} SELECT order_id, json::JSON, extracted_at FROM stg_landing")
+        finally:
+            self.con.unregister("stg_landing")
+
+    def land_raw(self, raw_orders: list, refund_payloads: dict | None = None) -> None:
+        """Append raw order and refund payloads to the landing zone, as extracted."""
+        with stage("land_raw", rows=len(raw_orders or [])), self.transaction():
+            self._land("stg_orders_raw", {int(o["id"]): o for o in raw_orders or [] if o.get("id") is not None})
+            self._land("stg_refunds_raw", {int(k): v for k, v in (refund_payloads or {}).items()})
+
+    # ---------- SQL engine (transforms over the landing zone; no transaction handling) ----------
+
+    def stage_raw(self, order_ids: list | None = None) -> list:
+        """
+        Parse the latest landed payloads of `order_ids` (all landed orders if None) into
+        temp tables for transform_staged(). Returns the product_ids they reference.
+        """
+        with stage("stage_raw", rows=len(order_ids) if order_ids is not None else None):
+            return self._stage_raw(order_ids)
+
+    def _stage_raw(self, order_ids: list | None) -> list:
+        where, params = ("TRUE", []) if order_ids is None else ("order_id IN (SELECT UNNEST(?))", [list(order_ids)])
+        latest_orders = f"({latest_raw_sql('stg_orders_raw', where)})"
+        self.con.execute(f"CREATE OR REPLACE TEMP TABLE sql_orders_raw AS {parse_orders_sql(latest_orders)}", params)
+        latest_refunds = f"({latest_raw_sql('stg_refunds_raw', 'order_id IN (SELECT order_id FROM sql_orders_raw)')})"
+        self.con.execute(f"CREATE OR REPLACE TEMP TABLE sql_refunds_raw AS {parse_refunds_sql(latest_refunds)}")
+        rows = self.con.execute("""
+            SELECT DISTINCT pid FROM (
+              SELECT TRY_CAST(UNNEST(j.line_items).product_id AS BIGINT) AS pid FROM sql_orders_raw
+            ) WHERE pid IS NOT NULL
+            ORDER BY pid
+        """).fetchall()
+        return [r[0] for r in rows]
+
+    def transform_staged(self, keep_missing_categories: bool = False) -> tuple[int, int, str | None]:
+        """
+        Normalize + enrich (dim_products) + apply refunds for the staged orders, in SQL.
+        With `keep_missing_categories`, products absent from dim_products keep their
+        current category_snapshot. Returns (orders, items, max order_date).
+        """
+        categories = f"({DIM_PRODUCT_CATEGORIES_SQL})"
+        if keep_missing_categories:
+            categories = f"""(
+                SELECT * FROM {categories}
+                UNION ALL
+                SELECT product_id, any_value(category_snapshot), any_value(category_ids) FROM fct_order_items
+                WHERE category_snapshot IS NOT NULL
+                  AND product_id NOT IN (SELECT product_id FROM dim_products)
+                GROUP BY product_id
+            )"""
+        with stage("sql_transform") as st:
+            self.con.execute(f"CREATE OR REPLACE TEMP TABLE sql_fct_orders AS {orders_sql('sql_orders_raw', 'sql_refunds_raw')}")
+            self.con.execute(
+                f"CREATE OR REPLACE TEMP TABLE sql_fct_order_items AS {items_sql('sql_orders_raw', 'sql_refunds_raw', categories)}"
+            )
+            n_orders, max_dt = self.con.execute("SELECT COUNT(*), MAX(order_date) FROM sql_fct_orders").fetchone()
+            n_items = self.con.execute("SELECT COUNT(*) FROM sql_fct_order_items").fetchone()[0]
+            st.rows = n_orders + n_items
+        return n_orders, n_items, (str(max_dt) if max_dt is not None else None)
+
+    def load_staged(self, state: dict | None = None) -> None:
+        """Upsert the transform_staged() output (and state) in ONE transaction, like load_batch."""
+        with self.transaction():
+            days = self._staged_days()
+            n = self.con.execute("SELECT COUNT(*) FROM sql_fct_orders").fetchone()[0]
+            with stage("load_fct_orders", rows=n):
+                self._insert_orders_from("sql_fct_orders", n)
+            n_items = self.con.execute("SELECT COUNT(*) FROM sql_fct_order_items").fetchone()[0]
+            with stage("load_fct_order_items", rows=n_items):
+                self.con.execute("DELETE FROM fct_order_items WHERE order_id IN (SELECT order_id FROM sql_fct_orders)")
+                self._insert_items_from("sql_fct_order_items")
+            self._refresh_rollups(days | self._staged_days())
+            for key, value in (state or {}).items():
+                self._set_state(key, value)
+        for t in ("sql_orders_raw", "sql_refunds_raw", "sql_fct_orders", "sql_fct_order_items"):
+            self.con.execute(f"DROP TABLE IF EXISTS {t}")
+        log.info(f"Loaded {n} rows into fct_orders (sql engine)")
+
+    def replay_from_landing(self) -> tuple[int, int]:
+        """
+        Rebuild fct_orders/fct_order_items for every landed order from stg_*_raw and
+        dim_products alone (no network). Products missing from dim_products keep their
+        current category_snapshot. Returns (orders, items).
+        """
+        self.stage_raw()
+        n_orders, n_items, _ = self.transform_staged(keep_missing_categories=True)
+        self.load_staged()
+        not_landed = self.con.execute("""
+            SELECT COUNT(*) FROM fct_orders
+            WHERE order_id NOT IN (SELECT DISTINCT order_id FROM stg_orders_raw)
+        """).fetchone()[0]
+        if not_landed:
+            log.info(f"Replay: {not_landed} orders predate the landing zone and were left as loaded")
+        log.info(f"Replay: rebuilt {n_orders} orders / {n_items} items from the landing zone")
+        return n_orders, n_items
+
+    # ---------- Daily rollups (agg_daily_*) ----------
+
+    def _order_days(self, df: pd.DataFrame) -> set:
+        """Days (per fct_orders) of the orders referenced by `df`."""
+        if df is None or df.empty or "order_id" not in df:
+            return set()
+        ids = pd.to_numeric(df["order_id"], errors="coerce").dropna().astype("int64").unique().tolist()
+        rows = self.con.execute("""
+            SELECT DISTINCT CAST(order_date AS DATE) FROM fct_orders
+            WHERE order_id IN (SELECT UNNEST(?)) AND order_date IS NOT NULL
+        """, [ids]).fetchall()
+        return {r[0] for r in rows}
+
+    def _staged_days(self) -> set:
+        rows = self.con.execute("""
+            SELECT DISTINCT CAST(order_date AS DATE) FROM fct_orders
+            WHERE order_id IN (SELECT order_id FROM sql_fct_orders) AND order_date IS NOT NULL
+        """).fetchall()
+        return {r[0] for r in rows}
+
+    def _refresh_rollups(self, days: set | None) -> None:
+        """Recompute the rollups for `days` only (every day if None)."""
+        if days is not None and not days:
+            return
+        if parquet_export.enabled():
+            # Same days as the rollups: their months are marked pending with this
+            # transaction and the Parquet copy follows them after commit
+            if days is None:
+                marks = [parquet_export.ALL_MONTHS]
+            else:
+                marks = sorted(parquet_export.month_key(m) for m in parquet_export.months_of(days))
+            for m in marks:
+                self._set_state(parquet_export.PENDING_PREFIX + m, uuid.uuid4().hex)
+        if days is None:
+            where, params = {"orders_where": "TRUE", "items_where": "TRUE"}, []
+        else:
+            # Plain range comparisons let DuckDB skip row groups by min/max before the
+            # exact day filter runs
+            days = sorted(days)
+            where = {
+                "orders_where": (
+                    "o.order_date >= ?::DATE AND o.order_date < ?::DATE + INTERVAL 1 DAY "
+                    "AND CAST(o.order_date AS DATE) IN (SELECT UNNEST(?::DATE[]))"
+                ),
+                "items_where": "i.order_day BETWEEN ? AND ? AND i.order_day IN (SELECT UNNEST(?::DATE[]))",
+            }
+            params = [days[0], days[-1], days]
+        with stage("refresh_rollups"):
+            for table, select in ROLLUPS.items():
+                if days is None:
+                    self.con.execute(f"DELETE FROM {table}")
+                else:
+                    self.con.execute(f"DELETE FROM {table} WHERE day IN (SELECT UNNEST(?::DATE[]))", [days])
+                self.con.execute(f"INSERT INTO {table} BY NAME {select.format(**where)}", params)
+
+    def refresh_rollups(self, days: set | None = None) -> None:
+        with self.transaction():
+            self._refresh_rollups(days)
+
+    # ---------- Physical layout ----------
+
+    def recluster(self) -> None:
+        """
+        Rewrite both fact tables sorted by order_date, so each row group covers a narrow
+        date range and min/max zone maps prune range scans. Batches already append in
+        date order; this repairs the drift from upserts of older orders and backfills.
+        """
+        with self.transaction():
+            for table in ("fct_orders", "fct_order_items"):
+                self.con.execute(f"CREATE OR REPLACE TEMP TABLE recluster_tmp AS SELECT * FROM {table} ORDER BY order_date")
+                self.con.execute(f"DELETE FROM {table}")
+                self.con.execute(f"INSERT INTO {table} SELECT * FROM recluster_tmp")
+                self.con.execute("DROP TABLE recluster_tmp")
+            self._set_state("reclustered_at", p.now("UTC").to_iso8601_string())
+            self.con.execute("DELETE FROM etl_state WHERE key = ?", [RECLUSTER_PENDING_KEY])
+        try:
+            self.con.execute("CHECKPOINT")
+        except duckdb.TransactionException as e:  # another connection is mid-transaction
+            log.info(f"Recluster checkpoint deferred to DuckDB's automatic one ({e})")
+        log.info("Re-clustered fct_orders / fct_order_items by order_date")
+
+    def maybe_recluster(self, force: bool = False) -> bool:
+        """
+        recluster() if a load appended rows out of date order since the last one and that
+        one is older than RECLUSTER_INTERVAL_HOURS. In-order incremental runs never rewrite.
+        """
+        if not force and self.get_state(RECLUSTER_PENDING_KEY) is None:
+            return False
+        last = self.get_state("reclustered_at")
+        due = last is None or p.now("UTC").diff(p.parse(last)).in_hours() >= RECLUSTER_INTERVAL_HOURS
+        if not (force or (RECLUSTER_INTERVAL_HOURS > 0 and due)):
+            return False
+        self.recluster()
+        return True
+
+    # ---------- Pipeline state (etl_state) ----------
+
+    def get_state(self, key: str) -> str | None:
+        row = self.con.execute("SELECT value FROM etl_state WHERE key = ?", [key]).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        write_state(self.con, key, value)
+
+    def states(self, prefix: str) -> dict:
+        """{key: value} of every state key starting with `prefix` (e.g. backfill checkpoints)."""
+        rows = self.con.execute("SELECT key, value FROM etl_state WHERE starts_with(key, ?)", [prefix]).fetchall()
+        return dict(rows)
+
+    def set_state(self, key: str, value: str) -> None:
+        with self.transaction():
+            self._set_state(key, value)
+
+    # ---------- Category re-enrichment ----------
+
+    def category_ids_pending(self) -> bool:
+        """True until re-enrich has backfilled category_ids for items loaded before they existed."""
+        return self.get_state(CATEGORY_IDS_STATE) == CATEGORY_IDS_PENDING
+
+    def apply_category_map(self, categories: pa.Table) -> int:
+        """
+        Set category_snapshot/category_ids from `categories` (CATEGORY_MAP_SCHEMA) with one UPDATE ... FROM,
+        record the product versions it came from and refresh the rollup days whose rows
+        changed, in ONE transaction. Returns item rows updated.
+        """
+        if categories.num_rows == 0:
+            return 0
+        with self.transaction():
+            self.con.register("category_map", categories)
+            try:
+                changed = """
+                    FROM fct_order_items AS i JOIN category_map AS m USING (product_id)
+                    WHERE (i.category_snapshot IS DISTINCT FROM m.category_snapshot
+                           OR i.category_ids IS DISTINCT FROM m.category_ids)
+                """
+                days = {r[0] for r in self.con.execute(
+                    f"SELECT DISTINCT i.order_day {changed} AND i.order_day IS NOT NULL"
+                ).fetchall()}
+                rows = self.con.execute("""
+                    UPDATE fct_order_items AS i
+                    SET category_snapshot = m.category_snapshot, category_ids = m.category_ids
+                    FROM category_map AS m
+                    WHERE i.product_id = m.product_id
+                      AND (i.category_snapshot IS DISTINCT FROM m.category_snapshot
+                           OR i.category_ids IS DISTINCT FROM m.category_ids)
+                """).fetchone()[0]
+                self.con.execute("""
+                    INSERT OR REPLACE INTO etl_product_versions
+                    SELECT product_id, date_modified_gmt, category_snapshot, ?::TIMESTAMP FROM category_map
+                """, [p.now("UTC").naive()])
+            finally:
+                self.con.unregister("category_map")
+            self._refresh_rollups(days)
+        return rows
+
+    # ---------- Run history (etl_runs) ----------
+
+    def begin_run(self, run_id: str, mode: str, started_at) -> int:
+        """
+        Record a run as 'running'. Earlier runs still 'running' belonged to a process that
+        died (DuckDB has one writer process), so they become 'interrupted', finished at
+        their last state write. Returns how many were.
+        """
+        with self.transaction():
+            stale = self.con.execute("""
+                UPDATE etl_runs AS r
+                SET status = 'interrupted',
+                    finished_at = (SELECT MAX(updated_at) FROM etl_state AS s WHERE s.run_id = r.run_id)
+                WHERE status = 'running'
+            """).fetchone()[0]
+            self.con.execute(
+                "INSERT OR REPLACE INTO etl_runs (run_id, mode, status, started_at) VALUES (?, ?, 'running', ?)",
+                [run_id, mode, p.instance(started_at).naive()],
+            )
+        if stale:
+            log.warning(f"{stale} earlier run(s) never finished; marked interrupted (checkpoints resume them)")
+        return stale
+
+    def end_run(
+        self, run_id: str, ok: bool, duration_seconds: float, orders: int, items: int,
+        http_requests: int, cursors: dict | None = None, error: str | None = None,
+    ) -> None:
+        with self.transaction():
+            self.con.execute("""
+                UPDATE etl_runs
+                SET status = ?, finished_at = ?, duration_seconds = ?, orders = ?, items = ?,
+                    http_requests = ?, cursors = ?::JSON, error = ?
+                WHERE run_id = ?
+            """, ["ok" if ok else "failed", p.now("UTC").naive(), duration_seconds, orders, items, http_requests,
+                  json.dumps(cursors or {}), error, run_id])
+
+    # ---------- Run metrics (etl_run_metrics) ----------
+
+    def save_run_metrics(self, run_id: str, mode: str, started_at, ok: bool, samples: dict) -> None:
+        """Persist one run's metric samples ({(metric, labels_json): value}, see utils.metrics)."""
+        if not samples:
+            return
+        finished_at = p.now("UTC").naive()
+        rows = [
+            (run_id, p.instance(started_at).naive(), finished_at, mode, ok, metric, labels, float(value))
+            for (metric, labels), value in samples.items()
+        ]
+        with self.transaction():
+            self.con.executemany("INSERT INTO etl_run_metrics VALUES (?, ?, ?, ?, ?, ?, ?::JSON, ?)", rows)
+
+    def save_run_profiles(self, run_id: str, stages: list) -> None:
+        """Persist one run's per-stage profile summary (see utils.profiling.summary)."""
+        if not stages:
+            return
+        rows = [
+            (run_id, s["stage"], s["calls"], s["seconds"], s["alloc_peak_bytes"],
+             json.dumps(s["top_functions"]), json.dumps(s["top_allocations"]))
+            for s in stages
+        ]
+        with self.transaction():
+            self.con.executemany("INSERT INTO etl_run_profiles VALUES (?, ?, ?, ?, ?, ?::JSON, ?::JSON)", rows)
+
+    # ---------- Legacy pandas path (DUCKDB_LOAD_MODE=pandas; no transaction handling) ----------
+
+    def _load_orders_pandas(self, df_orders: pd.DataFrame):
         df = self._align_cols(df_orders, FCT_ORDERS_COLS)
 
+        oldest = pd.to_datetime(df["order_date"], errors="coerce").min()
+        self._note_out_of_order(None if pd.isna(oldest) else oldest.to_pydatetime())
         ids = tuple(df["order_id"].unique().tolist())
         # Delete-then-insert to emulate upsert
         self.con.execute("DELETE FROM fct_orders WHERE order_id IN (SELECT * FROM UNNEST(?))", [ids])
@@ -57,12 +760,14 @@ class DuckDBClient:
         self.con.execute("INSERT INTO fct_orders SELECT * FROM df")
         log.info(f"Loaded {len(df)} rows into fct_orders")
 
-    def load_order_items(self, df_items: pd.DataFrame):
-        if df_items.empty:
-            return
+    def _load_order_items_pandas(self, df_items: pd.DataFrame):
         df = self._align_cols(df_items, FCT_ITEMS_COLS)
 
         ids = tuple(df["order_id"].unique().tolist())
         self.con.execute("DELETE FROM fct_order_items WHERE order_id IN (SELECT * FROM UNNEST(?))", [ids])
-        self.con.execute("INSERT INTO fct_order_items SELECT * FROM df")
-        log.info(f"Loaded {len(df)} rows into fct_order_items")
\ No newline at end of file
+        self.con.register("stg_fct_order_items", df)
+        try:
+            self._insert_items_from("stg_fct_order_items")
+        finally:
+            self.con.unregister("stg_fct_order_items")
+        log.info(f"Loaded {len(df)} rows into fct_order_items")
@@ -0,0 +1,168 @@
+# src/etl/load/parquet_export.py
+"""
+Hive-partitioned Parquet copy of the fact tables for external query engines.
+
+With PARQUET_EXPORT_DIR set, every committed load rewrites only the (year, month)
+partitions whose days it touched (DuckDBClient tracks them with the rollup days):
+
+  {PARQUET_EXPORT_DIR}/fct_orders/year=2024/month=3/data.parquet
+  {PARQUET_EXPORT_DIR}/fct_order_items/year=2024/month=3/data.parquet
+  {PARQUET_EXPORT_DIR}/_manifest.json
+
+Each partition is one zstd file written next to its target and swapped in with
+os.replace, so readers see the old or the new month, never a half-written one. The
+manifest lists every partition's path, rows, bytes and date range. BI tools and
+notebooks read it without opening the single-writer DuckDB file, e.g.
+
+  SELECT ... FROM read_parquet('data/parquet/fct_orders/*/*/*.parquet', hive_partitioning = true, union_by_name = true)
+  WHERE year = 2024 AND month = 3
+
+The months a load touched are marked pending in etl_state (PENDING_PREFIX) in the
+load's own transaction and cleared one by one as their export succeeds, so a failed
+export is retried by the next commit of any process until it goes through.
+
+Rows without an order date are not exported.
+"""
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple
+
+import pendulum as p
+
+from ..utils.logging import get_logger
+from ..utils.metrics import stage
+
+log = get_logger(__name__)
+
+PARQUET_EXPORT_DIR = os.getenv("PARQUET_EXPORT_DIR", "")  # empty = export off
+PARQUET_COMPRESSION_LEVEL = int(os.getenv("PARQUET_COMPRESSION_LEVEL", "3"))
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "122880"))
+
+MANIFEST = "_manifest.json"
+# table -> date column the partitions (and the month filter) are derived from
+EXPORT_TABLES = {"fct_orders": "order_date", "fct_order_items": "order_day"}
+
+# etl_state keys of committed but not yet exported partitions: parquet_pending:<YYYY-MM>,
+# or parquet_pending:all after a full rollup rebuild
+PENDING_PREFIX = "parquet_pending:"
+ALL_MONTHS = "all"
+
+Month = Tuple[int, int]
+
+# Parallel backfill windows commit concurrently; partition files and the manifest are
+# rewritten one export at a time (each export reads the latest committed data)
+_EXPORT_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(PARQUET_EXPORT_DIR)
+
+
+def months_of(days: Iterable) -> Set[Month]:
+    return {(d.year, d.month) for d in days if d is not None}
+
+
+def month_key(month: Month) -> str:
+    return f"{month[0]}-{month[1]:02d}"
+
+
+def parse_month_key(key: str) -> Month:
+    y, m = key.split("-")
+    return int(y), int(m)
+
+
+def all_months(con) -> Set[Month]:
+    rows = con.execute("""
+        SELECT DISTINCT year(order_date), month(order_date) FROM fct_orders WHERE order_date IS NOT NULL
+        UNION
+        SELECT DISTINCT year(order_day), month(order_day) FROM fct_order_items WHERE order_day IS NOT NULL
+    """).fetchall()
+    return {(int(y), int(m)) for y, m in rows}
+
+
+def partition_path(root: Path, table: str, month: Month) -> Path:
+    return root / table / f"year={month[0]}" / f"month={month[1]}" / "data.parquet"
+
+
+def _read_manifest(root: Path) -> dict:
+    try:
+        return json.loads((root / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"tables": {}}
+
+
+def _write_manifest(root: Path, manifest: dict) -> None:
+    tmp = root / f".{MANIFEST}.{uuid.uuid4().hex}"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, root / MANIFEST)
+
+
+def _export_partition(con, root: Path, table: str, column: str, month: Month) -> dict | None:
+    """Rewrite one table/month file; returns its manifest entry (None if the month is now empty)."""
+    target = partition_path(root, table, month)
+    start = p.date(month[0], month[1], 1)
+    # Range predicate only: DuckDB skips row groups by min/max (tables are reclustered by date)
+    where = f"{column} >= ? AND {column} < ?"
+    params = [start, start.add(months=1)]
+    rows, lo, hi = con.execute(f"SELECT COUNT(*), MIN({column}), MAX({column}) FROM {table} WHERE {where}", params).fetchone()
+    if not rows:
+        target.unlink(missing_ok=True)
+        return None
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".data.{uuid.uuid4().hex}.parquet")
+    con.execute(f"""
+        COPY (SELECT * FROM {table} WHERE {where} ORDER BY {column})
+        TO '{tmp.as_posix()}'
+        (FORMAT parquet, COMPRESSION zstd, COMPRESSION_LEVEL {PARQUET_COMPRESSION_LEVEL},
+         ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE})
+    """, params)
+    os.replace(tmp, target)
+    return {
+        "path": target.relative_to(root).as_posix(),
+        "rows": int(rows),
+        "bytes": target.stat().st_size,
+        "min": str(lo),
+        "max": str(hi),
+        "exported_at": p.now("UTC").to_iso8601_string(),
+    }
+
+
+def export_months(con, months: Set[Month] | None, root: str | None = None, run_id: str | None = None) -> int:
+    """
+    Rewrite `months` (every month with data, or previously exported, if None) of each
+    export table under `root` (PARQUET_EXPORT_DIR by default) and update the manifest.
+    Returns partitions written.
+    """
+    root = Path(root or PARQUET_EXPORT_DIR)
+    with _EXPORT_LOCK:
+        manifest = _read_manifest(root)
+        if months is None:
+            # Months already exported but gone from the tables are dropped too
+            listed = {parse_month_key(k) for parts in manifest["tables"].values() for k in parts}
+            months = all_months(con) | listed
+        if not months:
+            return 0
+        root.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with stage("export_parquet") as s:
+            for table, column in EXPORT_TABLES.items():
+                parts: Dict[str, dict] = manifest["tables"].setdefault(table, {})
+                for month in sorted(months):
+                    key = month_key(month)
+                    entry = _export_partition(con, root, table, column, month)
+                    if entry is None:
+                        parts.pop(key, None)
+                        continue
+                    parts[key] = {**entry, "run_id": run_id}
+                    written += 1
+                    s.rows = (s.rows or 0) + entry["rows"]
+            manifest.update(
+                format="parquet", compression="zstd", partitioning=["year", "month"],
+                updated_at=p.now("UTC").to_iso8601_string(), run_id=run_id,
+            )
+            _write_manifest(root, manifest)
+    log.info(f"Parquet export: {written} partitions ({len(months)} months) rewritten in {root}")
+    return written
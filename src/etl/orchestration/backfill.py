@@ -0,0 +1,129 @@
+# src/etl/orchestration/backfill.py
+"""
+Backfill planning and execution shared by run.py and the Prefect flow.
+
+History is split into disjoint [start, end) windows that are fetched with both
+`after` and `before`, so no window re-downloads another's orders. Each window keeps
+its own checkpoint in etl_state (committed with every chunk), so a failed window is
+resumed alone on the next run and finished windows are skipped.
+
+Checkpoints are keyed by window start only: the last window ends at "now", which moves
+between runs, so an interrupted last window still resumes mid-window, and a finished
+one ("done:<end>") only fetches the tail added since. A chunk is whole pages, but the
+checkpoint is its order_date watermark rather than a page number, because Woo's pages
+shift as orders are created.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
+
+import pendulum as p
+
+from ..extract.orders import iter_orders_since
+from ..load.duckdb_client import DuckDBClient
+from ..utils.logging import get_logger
+from ..utils.state import BACKFILL_PREFIX, WATERMARK_KEY
+
+log = get_logger(__name__)
+
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+WINDOW_DONE = "done"
+
+Window = Tuple[str, str]
+# process_batch(raw_orders, state_key=...) -> (n_orders, n_items, watermark)
+ProcessBatch = Callable[..., Tuple[int, int, str | None]]
+
+
+def plan_windows(start_iso: str, end_iso: str, window_days: int = 30) -> List[Window]:
+    """Split [start, end) into consecutive windows of `window_days`."""
+    start, end = p.parse(start_iso), p.parse(end_iso)
+    windows: List[Window] = []
+    cursor = start
+    while cursor < end:
+        nxt = min(cursor.add(days=window_days), end)
+        windows.append((cursor.to_iso8601_string(), nxt.to_iso8601_string()))
+        cursor = nxt
+    return windows
+
+
+def window_key(window: Window) -> str:
+    return f"{BACKFILL_PREFIX}{window[0]}"
+
+
+def _resume_after(db: DuckDBClient, window: Window) -> Optional[p.DateTime]:
+    """`after` to (re)start `window` from, or None when it is complete."""
+    start, end = window
+    # Checkpoints written before keys dropped the window end: backfill:<start>/<end>
+    checkpoint = db.get_state(window_key(window)) or db.get_state(f"{window_key(window)}/{end}")
+    if checkpoint == WINDOW_DONE:
+        return None
+    # Woo's after/before are exclusive and second-precise: step back one second so an
+    # order stamped exactly on the boundary is not dropped.
+    if checkpoint and checkpoint.startswith(f"{WINDOW_DONE}:"):
+        done_until = p.parse(checkpoint[len(WINDOW_DONE) + 1:])
+        return None if done_until >= p.parse(end) else done_until.subtract(seconds=1)
+    # A chunk checkpoint is its watermark, the chunk's max order_date (max + 1 min before),
+    # so step back that minute too; upserts make re-reading those few orders harmless.
+    if checkpoint:
+        return p.parse(checkpoint).subtract(minutes=1, seconds=1)
+    return p.parse(start).subtract(seconds=1)
+
+
+def pending_windows(windows: List[Window]) -> List[Window]:
+    db = DuckDBClient()
+    db.init_schema()
+    return [w for w in windows if _resume_after(db, w) is not None]
+
+
+def backfill_window(window: Window, process_batch: ProcessBatch) -> int:
+    """Stream one window through `process_batch`, resuming from its checkpoint. Returns orders loaded."""
+    start, end = window
+    key = window_key(window)
+    db = DuckDBClient()
+    after = _resume_after(db, window)
+    if after is None:
+        return 0
+    if after > p.parse(start).subtract(seconds=1):
+        log.info(f"Backfill window {start} → {end}: resuming after {after.to_iso8601_string()}")
+
+    loaded = 0
+    for raw in iter_orders_since(after.to_iso8601_string(), before_iso=end):
+        n_orders, _, _ = process_batch(raw, state_key=key)
+        loaded += n_orders
+    db.set_state(key, f"{WINDOW_DONE}:{end}")
+    log.info(f"Backfill window {start} → {end} done: orders={loaded}")
+    return loaded
+
+
+def advance_watermark_to_loaded() -> str | None:
+    """After a complete backfill, point the incremental watermark at the newest loaded order."""
+    db = DuckDBClient()
+    max_dt = db.con.execute("SELECT MAX(order_date) FROM fct_orders").fetchone()[0]
+    if max_dt is None:
+        return None
+    watermark = p.instance(max_dt, tz="UTC").to_iso8601_string()
+    db.set_state(WATERMARK_KEY, watermark)
+    return watermark
+
+
+def run_backfill(windows: List[Window], process_batch: ProcessBatch, workers: int = BACKFILL_WORKERS) -> int:
+    """
+    Run pending windows on a thread pool (extraction is I/O bound and DuckDB allows
+    only one writer process; loads serialize on the client's write lock).
+    Raises if any window failed, after letting the others finish.
+    """
+    todo = pending_windows(windows)
+    log.info(f"Backfill: {len(todo)}/{len(windows)} windows pending, workers={workers}")
+    total, failed = 0, []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(backfill_window, w, process_batch): w for w in todo}
+        for fut in as_completed(futures):
+            try:
+                total += fut.result()
+            except Exception as e:
+                w = futures[fut]
+                failed.append(w)
+                log.error(f"Backfill window {w[0]} → {w[1]} failed: {e}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} backfill window(s) failed; rerun the backfill to resume them")
+    return total
@@ -2,22 +2,28 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import pendulum as p
-import duckdb
 import pandas as pd
+from functools import partial
 from typing import Tuple
 
-from prefect import flow, task, get_run_logger
+from prefect import flow, task, get_run_logger, unmapped
 
-from src.etl.utils.state import get_since_ts, set_since_ts
-from src.etl.extract.orders import fetch_orders_since
+from src.etl.utils.state import (
+    entity_cursors, get_modified_since_ts, get_since_ts, set_since_ts, MODIFIED_WATERMARK_KEY, WATERMARK_KEY,
+)
+from src.etl.extract.orders import ETL_SYNC_MODE, fetch_orders_since, iter_orders_modified_since, iter_orders_since
 from src.etl.extract.products import fetch_products_by_ids
 from src.etl.extract.refunds import fetch_refunds_for_orders
 from src.etl.transform.normalize_orders import normalize_orders
 from src.etl.transform.enrich import enrich_items_with_categories, apply_refunds
+from src.etl.transform.sql_transform import ETL_ENGINE
 from src.etl.load.duckdb_client import DuckDBClient
-
-import os
-DB_PATH = os.getenv("DUCKDB_PATH", "./data/warehouse.duckdb")
+from src.etl.utils.metrics import finish_run, start_run
+from src.etl.orchestration.batch import process_batch
+from src.etl.orchestration.re_enrich import re_enrich_categories
+from src.etl.orchestration.backfill import (
+    BACKFILL_WORKERS, advance_watermark_to_loaded, backfill_window, pending_windows, plan_windows,
+)
 
 
 # ---------- Core Tasklets ----------
@@ -38,8 +44,7 @@ def t_apply_refunds(df_orders: pd.DataFrame, df_items: pd.DataFrame, refunds_map
 def t_load(df_orders: pd.DataFrame, df_items: pd.DataFrame):
     db = DuckDBClient()
     db.init_schema()
-    db.load_orders(df_orders)
-    db.load_order_items(df_items)
+    db.load_batch(df_orders, df_items)
 
 @task(retries=2, retry_delay_seconds=30)
 def t_fetch_orders(since_iso: str):
@@ -57,49 +62,21 @@ def t_fetch_refunds(order_ids):
 # ---------- Helpers wrapped as tasks ----------
 
 @task
-def t_re_enrich_categories(force_all: bool = False) -> int:
-    """Re-enrich category_snapshot in-place for existing rows. Returns number of products attempted."""
-    con = duckdb.connect(DB_PATH)
-    if force_all:
-        need = con.execute("""
-            SELECT DISTINCT product_id
-            FROM fct_order_items
-            WHERE product_id IS NOT NULL
-        """).df()
-    else:
-        need = con.execute("""
-            SELECT DISTINCT product_id
-            FROM fct_order_items
-            WHERE product_id IS NOT NULL
-              AND (category_snapshot IS NULL OR TRIM(category_snapshot) = '')
-        """).df()
-
-    if need.empty:
-        return 0
-
-    pids = [int(x) for x in need["product_id"].dropna().tolist()]
-    products = fetch_products_by_ids(pids)  # direct call OK here (pure function)
-
-    def cat_str(pid):
-        p = products.get(int(pid))
-        cats = (p or {}).get("categories") or []
-        names = [c.get("name") for c in cats if c.get("name")]
-        return " | ".join(names) if names else None
-
-    map_df = pd.DataFrame({
-        "product_id": pids,
-        "category_snapshot": [cat_str(pid) for pid in pids]
-    })
-    con.register("map_df", map_df)
-    con.execute("""
-        UPDATE fct_order_items AS i
-        SET category_snapshot = m.category_snapshot
-        FROM map_df AS m
-        WHERE i.product_id = m.product_id
-          AND (? OR i.category_snapshot IS NULL OR TRIM(i.category_snapshot) = '')
-    """, [force_all])
-    con.close()
-    return len(pids)
+def t_re_enrich_categories(force_all: bool = False) -> Tuple[int, int]:
+    """Re-enrich category_snapshot for stale products. Returns (products mapped, item rows updated)."""
+    return re_enrich_categories(force_all=force_all)
+
+
+@task
+def t_maybe_recluster(force: bool = False) -> bool:
+    return DuckDBClient().maybe_recluster(force=force)
+
+
+@task
+def t_replay() -> Tuple[int, int]:
+    db = DuckDBClient()
+    db.init_schema()
+    return db.replay_from_landing()
 
 
 @task
@@ -109,7 +86,7 @@ def t_advance_watermark(df_orders: pd.DataFrame) -> str | None:
     max_dt = df_orders["order_date"].max()
     if not max_dt:
         return None
-    watermark = p.parse(max_dt).add(minutes=1).to_iso8601_string()
+    watermark = p.parse(str(max_dt)).to_iso8601_string()
     set_since_ts(watermark)
     return watermark
 
@@ -117,40 +94,15 @@ def t_advance_watermark(df_orders: pd.DataFrame) -> str | None:
 # ---------- Batch processor (as a task) ----------
 
 @task
-def t_process_batch(raw_orders) -> Tuple[int, int, str | None]:
-    """
-    Normalize -> enrich -> refunds -> load. Return (n_orders, n_items, new_watermark_or_None).
-    """
-    logger = get_run_logger()
-    if not raw_orders:
-        return 0, 0, None
+def t_process_batch(raw_orders, engine: str = ETL_ENGINE, by_modified: bool = False) -> Tuple[int, int, str | None]:
+    state_key = MODIFIED_WATERMARK_KEY if by_modified else WATERMARK_KEY
+    return process_batch(raw_orders, state_key=state_key, engine=engine, by_modified=by_modified)
 
-    # Normalize
-    df_orders, df_items = normalize_orders(raw_orders)  # local: avoid task overhead
-    logger.info(f"Normalized: orders={len(df_orders)}, items={len(df_items)}")
 
-    # Enrich categories (for this batch’s product_ids)
-    product_ids = sorted({int(x) for x in df_items["product_id"].dropna().unique().tolist()}) if not df_items.empty else []
-    products = fetch_products_by_ids(product_ids)
-    df_items = enrich_items_with_categories(df_items, products)
-
-    # Apply refunds
-    order_ids = df_orders["order_id"].tolist()
-    refunds_map = fetch_refunds_for_orders(order_ids)
-    df_orders, df_items = apply_refunds(df_orders, df_items, refunds_map)
-
-    # Load
-    db = DuckDBClient()
-    db.init_schema()
-    db.load_orders(df_orders)
-    db.load_order_items(df_items)
-
-    # Watermark
-    max_dt = df_orders["order_date"].max() if not df_orders.empty else None
-    watermark = p.parse(max_dt).add(minutes=1).to_iso8601_string() if max_dt else None
-    if watermark:
-        set_since_ts(watermark)
-    return len(df_orders), len(df_items), watermark
+@task(retries=1, retry_delay_seconds=30)
+def t_backfill_window(window, engine: str = ETL_ENGINE) -> int:
+    """One disjoint backfill window; a retry resumes from the window's checkpoint."""
+    return backfill_window(window, partial(process_batch, engine=engine))
 
 
 # ---------- Flows ----------
@@ -161,59 +113,118 @@ def run_flow(
     force_enrich_all: bool = False,
     backfill_start: str | None = None,
     window_days: int = 30,
+    workers: int = BACKFILL_WORKERS,
+    replay: bool = False,
+    engine: str = ETL_ENGINE,
+    profile: bool = False,
+    sync: str = ETL_SYNC_MODE,
 ):
     """
     Unified Prefect flow:
-      - If backfill_start is provided: backfill in windows, then re-enrich missing categories.
+      - If backfill_start is provided: backfill disjoint windows (`workers` at a time), then re-enrich missing categories.
       - Else: run incremental ETL; if no new orders, optionally re-enrich missing categories.
       - `force_enrich_all` overwrites categories for all items.
+      - `replay` rebuilds the fact tables from the raw landing zone (no API calls).
+      - `engine` selects the transform engine: "pandas" or "sql" (DuckDB over the landed JSON).
+      - `sync="modified"` makes the incremental run a delta sync over every order changed since the last run.
+      - `profile` also profiles every stage (cProfile + tracemalloc) into PROFILE_DIR/<run_id> and etl_run_profiles.
+    Per-stage metrics are written to etl_run_metrics (and METRICS_TEXTFILE / PROMETHEUS_PUSHGATEWAY),
+    the run's status, rows and cursors to etl_runs.
     """
+    db = DuckDBClient()
+    db.init_schema()
+    start_run("replay" if replay else "backfill" if backfill_start else sync, profile=profile, db=db)
+    error = None
+    try:
+        _run_flow(re_enrich, force_enrich_all, backfill_start, window_days, workers, replay, engine, sync)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wm_key = MODIFIED_WATERMARK_KEY if sync == "modified" and not backfill_start else WATERMARK_KEY
+        finish_run(db, watermark=db.get_state(wm_key), ok=error is None, error=error, cursors=entity_cursors(db))
+
+
+def _run_flow(re_enrich, force_enrich_all, backfill_start, window_days, workers, replay, engine, sync):
     logger = get_run_logger()
 
+    # Replay mode
+    if replay:
+        n_orders, n_items = t_replay()
+        logger.info(f"Replay complete: orders={n_orders}, items={n_items}")
+        return
+
     # Backfill mode
     if backfill_start:
         start = p.parse(backfill_start)
         end = p.now("UTC")
-        cursor = start
-        total_orders = 0
-        logger.info(f"Backfill from {start.to_iso8601_string()} to {end.to_iso8601_string()} (window={window_days}d)")
-        while cursor < end:
-            # We use 'after=cursor' and let watermark advance inside the processor
-            raw = t_fetch_orders(cursor.to_iso8601_string())
-            n_orders, n_items, wm = t_process_batch(raw)
-            total_orders += n_orders
-            if wm:
-                cursor = p.parse(wm)  # already +1 min inside
-                logger.info(f"Loaded {n_orders} orders; watermark={wm}")
-            else:
-                cursor = min(cursor.add(days=window_days), end)
+        windows = plan_windows(start.to_iso8601_string(), end.to_iso8601_string(), window_days)
+        todo = pending_windows(windows)
+        logger.info(
+            f"Backfill from {start.to_iso8601_string()} to {end.to_iso8601_string()} "
+            f"(window={window_days}d): {len(todo)}/{len(windows)} windows pending"
+        )
+        # Windows are disjoint (after/before), so they run concurrently on the task runner;
+        # submit at most `workers` at a time to stay within the API rate budget
+        total_orders, failed = 0, []
+        for i in range(0, len(todo), max(1, workers)):
+            futures = t_backfill_window.map(todo[i:i + workers], engine=unmapped(engine))
+            for window, fut in zip(todo[i:i + workers], futures):
+                try:
+                    total_orders += fut.result()
+                except Exception as e:
+                    failed.append(window)
+                    logger.error(f"Backfill window {window[0]} → {window[1]} failed: {e}")
+        if failed:
+            raise RuntimeError(f"{len(failed)} backfill window(s) failed; rerun the flow to resume them")
+        wm = advance_watermark_to_loaded()
+        logger.info(f"Backfill windows complete; watermark={wm}")
+
         # final re-enrich pass for missing
         if force_enrich_all:
-            n = t_re_enrich_categories(force_all=True)
-            logger.info(f"Re-enriched ALL categories for {n} products.")
+            n, rows = t_re_enrich_categories(force_all=True)
+            logger.info(f"Re-enriched ALL categories for {n} products ({rows} item rows updated).")
         else:
-            n = t_re_enrich_categories(force_all=False)
-            logger.info(f"Re-enriched MISSING categories for {n} products.")
+            n, rows = t_re_enrich_categories(force_all=False)
+            logger.info(f"Re-enriched stale/missing categories for {n} products ({rows} item rows updated).")
+        t_maybe_recluster(force=True)  # windows append out of date order
         logger.info(f"Backfill complete. Total orders loaded: {total_orders}")
         return
 
     # Incremental mode
-    since = get_since_ts()
-    logger.info(f"Incremental run since={since}")
-    raw = t_fetch_orders(since)
-    n_orders, n_items, wm = t_process_batch(raw)
+    by_modified = sync == "modified"
+    if by_modified:
+        # Delta sync: every order created or changed since the last run, up to this run's start
+        since = get_modified_since_ts()
+        logger.info(f"Delta run modified_after={since}")
+        chunks = iter_orders_modified_since(since, modified_before_iso=p.now("UTC").to_iso8601_string())
+    else:
+        since = get_since_ts()
+        logger.info(f"Incremental run since={since}")
+        chunks = iter_orders_since(since)
+    n_orders, wm = 0, None
+    for raw in chunks:
+        n, _, chunk_wm = t_process_batch(raw, engine=engine, by_modified=by_modified)
+        n_orders += n
+        wm = chunk_wm or wm
 
     if n_orders == 0:
         logger.info("No new orders.")
         # If no new orders, auto re-enrich (or force-all if requested)
         if force_enrich_all:
-            n = t_re_enrich_categories(force_all=True)
-            logger.info(f"Re-enriched ALL categories for {n} products.")
+            n, rows = t_re_enrich_categories(force_all=True)
+            logger.info(f"Re-enriched ALL categories for {n} products ({rows} item rows updated).")
         elif re_enrich or True:  # default: re-enrich missing when nothing new
-            n = t_re_enrich_categories(force_all=False)
-            logger.info(f"Re-enriched MISSING categories for {n} products.")
+            n, rows = t_re_enrich_categories(force_all=False)
+            logger.info(f"Re-enriched stale/missing categories for {n} products ({rows} item rows updated).")
     else:
         logger.info(f"Loaded {n_orders} orders; watermark={wm}")
+        if re_enrich or DuckDBClient().category_ids_pending():  # one-time category_ids backfill
+            n, rows = t_re_enrich_categories(force_all=False)
+            logger.info(f"Re-enriched stale/missing categories for {n} products ({rows} item rows updated).")
+
+    # Keep the fact tables date-ordered for zone-map pruning (after out-of-order loads)
+    t_maybe_recluster()
 
 
 if __name__ == "__main__":
@@ -222,4 +233,6 @@ if __name__ == "__main__":
     # run_flow(re_enrich=True)  # incremental + force re-enrich missing
     # run_flow(force_enrich_all=True)  # overwrite categories for all items
     # run_flow(backfill_start="2022-01-01", window_days=30)  # backfill mode
+    # run_flow(replay=True)  # rebuild facts from the landing zone
+    # run_flow(profile=True)  # per-stage cProfile/tracemalloc dumps in PROFILE_DIR
     run_flow()
@@ -0,0 +1,94 @@
+# src/etl/orchestration/re_enrich.py
+"""
+Category re-enrichment shared by run.py, the Prefect flow and tools/re_enrich_categories.py.
+
+etl_product_versions remembers which dim_products version (date_modified_gmt) each
+product's category_snapshot was last written from. A pass:
+  1. refreshes dim_products with one products?modified_after=<newest cached> call
+  2. fetches only products with uncategorized items that are not cached yet
+  3. builds an Arrow map (product_id -> category_snapshot) for products whose cached
+     version differs from the recorded one, or that still have uncategorized items
+  4. applies it with one UPDATE ... FROM (DuckDBClient.apply_category_map)
+Idle runs therefore cost a handful of product calls, not one per product ever sold.
+
+While the one-time category_ids backfill is pending (warehouses loaded before
+category_ids existed, see DuckDBClient.init_schema), items without ids count as
+uncategorized too, so their products are fetched and the ids written; the pass then
+marks the backfill done. Items of products Woo no longer has keep their snapshot.
+"""
+import json
+from typing import Tuple
+
+import pendulum as p
+import pyarrow as pa
+
+from ..extract.product_cache import ProductCache
+from ..load.duckdb_client import CATEGORY_IDS_STATE, CATEGORY_MAP_SCHEMA, DuckDBClient
+from ..transform.enrich import category_frame
+from ..utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Products sold that have items without a category (or, during the backfill, without ids)
+_MISSING_SQL = """
+    SELECT DISTINCT product_id FROM fct_order_items
+    WHERE product_id IS NOT NULL AND (
+      category_snapshot IS NULL OR TRIM(category_snapshot) = ''
+      OR (? AND category_ids IS NULL)
+    )
+"""
+
+
+def _stale_products(db: DuckDBClient, force_all: bool, backfill_ids: bool) -> list:
+    """(product_id, date_modified_gmt, payload) of sold products whose snapshot may be out of date."""
+    return db.con.execute(f"""
+        SELECT d.product_id, d.date_modified_gmt, d.payload
+        FROM dim_products AS d
+        LEFT JOIN etl_product_versions AS v USING (product_id)
+        WHERE d.product_id IN (SELECT DISTINCT product_id FROM fct_order_items)
+          AND (
+            ? OR v.product_id IS NULL
+            OR d.date_modified_gmt IS DISTINCT FROM v.date_modified_gmt
+            OR d.product_id IN ({_MISSING_SQL})
+          )
+    """, [force_all, backfill_ids]).fetchall()
+
+
+def re_enrich_categories(force_all: bool = False, db: DuckDBClient | None = None) -> Tuple[int, int]:
+    """
+    Bring category_snapshot in line with the current product catalog.
+    `force_all` rewrites every sold product's snapshot from the cache (still fetching
+    only uncached products). Returns (products mapped, item rows updated).
+    """
+    db = db or DuckDBClient()
+    db.init_schema()
+    cache = ProductCache(db.con)
+    cache.refresh(force=True)
+
+    backfill_ids = db.category_ids_pending()
+    missing = [r[0] for r in db.con.execute(_MISSING_SQL, [backfill_ids]).fetchall()]
+    if missing:
+        cache.get(missing)  # API only for products not in dim_products (or expired)
+
+    stale = _stale_products(db, force_all, backfill_ids)
+    if not stale:
+        _finish_ids_backfill(db, backfill_ids)
+        log.info("Re-enrich: nothing to do.")
+        return 0, 0
+
+    frame = category_frame({int(pid): json.loads(payload) for pid, _, payload in stale})
+    frame["date_modified_gmt"] = [modified for _, modified, _ in stale]
+    categories = pa.Table.from_pandas(frame, schema=CATEGORY_MAP_SCHEMA, preserve_index=False)
+    rows = db.apply_category_map(categories)
+    _finish_ids_backfill(db, backfill_ids)
+    log.info(f"Re-enrich: {len(stale)} products checked, {rows} item rows updated")
+    return len(stale), rows
+
+
+def _finish_ids_backfill(db: DuckDBClient, backfill_ids: bool) -> None:
+    """Every fetchable product now has ids on its items; the rest were deleted from Woo."""
+    if not backfill_ids:
+        return
+    left = db.con.execute("SELECT COUNT(*) FROM fct_order_items WHERE category_ids IS NULL").fetchone()[0]
+    db.set_state(CATEGORY_IDS_STATE, p.now("UTC").to_iso8601_string())
+    log.info(f"Re-enrich: category_ids backfill done ({left} items of products Woo no longer has keep their snapshot)")
@@ -1,28 +1,67 @@
 import pandas as pd
 from typing import Dict, Tuple
 
+from ..utils.metrics import timed_stage
 
+
+def _cat_str(product: dict | None) -> str | None:
+    cats = (product or {}).get("categories") or []
+    names = [c.get("name") for c in cats if c.get("name")]
+    return " | ".join(names) if names else None
+
+
+def _cat_ids(product: dict | None) -> list:
+    """Woo ids of the categories _cat_str names (dim_category keys), in payload order."""
+    cats = (product or {}).get("categories") or []
+    return [int(c["id"]) for c in cats if c.get("name") and c.get("id") is not None]
+
+
+def _int_key(s: pd.Series) -> pd.Series:
+    """Coerce an id column to int64, mapping None/NaN/garbage to 0 (Woo's 'no id')."""
+    return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64")
+
+
+def category_frame(products: Dict[int, dict]) -> pd.DataFrame:
+    """product_id -> category_snapshot / category_ids, built once per product (not per item)."""
+    return pd.DataFrame({
+        "product_id": pd.Series([int(pid) for pid in products], dtype="int64"),
+        "category_snapshot": [_cat_str(p) for p in products.values()],
+        "category_ids": [_cat_ids(p) for p in products.values()],
+    })
+
+
+def refund_item_frame(refunds_map: Dict[int, dict]) -> pd.DataFrame:
+    """Flatten refunds_map into (order_id, product_id, variation_id, qty, total) rows."""
+    rows = [
+        (int(oid), int(pid), int(vid), v.get("qty", 0), v.get("total", 0.0))
+        for oid, m in refunds_map.items()
+        for (pid, vid), v in ((m or {}).get("items") or {}).items()
+    ]
+    df = pd.DataFrame(rows, columns=["order_id", "product_id", "variation_id", "qty", "total"])
+    df["qty"] = pd.to_numeric(df["qty"], errors="coerce").fillna(0).astype("int64")
+    df["total"] = pd.to_numeric(df["total"], errors="coerce").fillna(0.0).astype("float64")
+    return df.astype({"order_id": "int64", "product_id": "int64", "variation_id": "int64"})
+
+
+@timed_stage("enrich", rows=len)
 def enrich_items_with_categories(df_items: pd.DataFrame, products: Dict[int, dict]) -> pd.DataFrame:
     """
-    Adds a 'category_snapshot' string to each item by looking up the product's categories.
+    Adds a 'category_snapshot' string and 'category_ids' list (dim_category keys) to each
+    item by looking up the product's categories.
     """
     if df_items.empty or not products:
         return df_items
 
-    def cat_str(pid):
-        try:
-            p = products.get(int(pid)) if pid is not None else None
-        except Exception:
-            p = None
-        cats = (p or {}).get("categories") or []
-        names = [c.get("name") for c in cats if c.get("name")]
-        return " | ".join(names) if names else None
-
+    cats = category_frame(products).set_index("product_id")
     df = df_items.copy()
-    df["category_snapshot"] = df["product_id"].apply(cat_str)
+    pids = pd.to_numeric(df["product_id"], errors="coerce").astype("Int64")
+    for col in ("category_snapshot", "category_ids"):
+        mapped = pids.map(cats[col])
+        df[col] = mapped.astype(object).where(mapped.notna(), None)
     return df
 
 
+@timed_stage("apply_refunds", rows=lambda r: len(r[0]) + len(r[1]))
 def apply_refunds(
     df_orders: pd.DataFrame,
     df_items: pd.DataFrame,
@@ -40,34 +79,24 @@ def apply_refunds(
     dfi = df_items.copy()
 
     # Order-level refunds
-    def order_refund_total(oid):
-        m = refunds_map.get(int(oid), {})
-        try:
-            return float(m.get("refund_total", 0.0))
-        except Exception:
-            return 0.0
-
-    dfo["refund_total"] = dfo["order_id"].apply(order_refund_total)
+    order_totals = pd.Series(
+        {int(oid): (m or {}).get("refund_total", 0.0) for oid, m in refunds_map.items()}, dtype=object
+    )
+    order_totals = pd.to_numeric(order_totals, errors="coerce").astype("float64")
+    dfo["refund_total"] = _int_key(dfo["order_id"]).map(order_totals).fillna(0.0).to_numpy()
     dfo["net_after_refunds"] = dfo["net_total"] - dfo["refund_total"]
 
-    # Item-level refunds (by product_id + variation_id)
+    # Item-level refunds (by order_id + product_id + variation_id)
     if not dfi.empty:
-        def ref_qty(row):
-            m = refunds_map.get(int(row["order_id"])) or {}
-            items = m.get("items", {})
-            key = (int(row.get("product_id") or 0), int(row.get("variation_id") or 0))
-            return int((items.get(key) or {}).get("qty", 0))
-
-        def ref_total(row):
-            m = refunds_map.get(int(row["order_id"])) or {}
-            items = m.get("items", {})
-            key = (int(row.get("product_id") or 0), int(row.get("variation_id") or 0))
-            try:
-                return float((items.get(key) or {}).get("total", 0.0))
-            except Exception:
-                return 0.0
-
-        dfi["refunded_quantity"] = dfi.apply(ref_qty, axis=1)
-        dfi["refunded_total"] = dfi.apply(ref_total, axis=1)
+        keys = pd.DataFrame({
+            "order_id": _int_key(dfi["order_id"]).to_numpy(),
+            "product_id": _int_key(dfi["product_id"]).to_numpy() if "product_id" in dfi else 0,
+            "variation_id": _int_key(dfi["variation_id"]).to_numpy() if "variation_id" in dfi else 0,
+        })
+        merged = keys.merge(
+            refund_item_frame(refunds_map), on=["order_id", "product_id", "variation_id"], how="left"
+        )
+        dfi["refunded_quantity"] = merged["qty"].fillna(0).astype("int64").to_numpy()
+        dfi["refunded_total"] = merged["total"].fillna(0.0).astype("float64").to_numpy()
 
     return dfo, dfi
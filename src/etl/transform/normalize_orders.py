@@ -1,77 +1,122 @@
 from typing import List, Dict, Tuple
 import pandas as pd
-import pendulum as p
 
+from ..utils.metrics import timed_stage
 
-def _f(v) -> float:
-    try:
-        return float(v or 0)
-    except Exception:
-        return 0.0
+ORDER_NUMERIC = {
+    # output column -> Woo order field
+    "discount_total": "discount_total",
+    "discount_tax": "discount_tax",
+    "shipping_total": "shipping_total",
+    "shipping_tax": "shipping_tax",
+    "cart_tax": "cart_tax",
+    "total_tax": "total_tax",
+    "gross_total": "total",
+}
+ITEM_NUMERIC = ["price", "total", "subtotal"]
 
 
+def _num(values: list) -> pd.Series:
+    """Bulk float cast: Woo money strings/None/garbage -> float64, invalid -> 0.0."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0.0).astype("float64")
+
+
+def _datetime_strings(values: list) -> pd.Series:
+    """
+    Parse Woo timestamps in one pass and render them as 'YYYY-MM-DD HH:MM:SS'
+    (wall-clock time; any UTC offset or fraction is dropped, as before).
+    """
+    s = pd.Series(values, dtype=object).str.slice(0, 19)
+    dt = pd.to_datetime(s, format="ISO8601", errors="coerce")
+    out = dt.dt.strftime("%Y-%m-%d %H:%M:%S")
+    return out.astype(object).where(dt.notna(), None)
+
+
+@timed_stage("normalize", rows=lambda r: len(r[0]) + len(r[1]))
 def normalize_orders(raw_orders: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Flatten Woo order JSON into:
       - df_orders (one row per order)
       - df_items  (one row per line item)
     Adds placeholders for refund enrichment and category snapshot.
+    Values are gathered column-wise and cast in bulk (no per-row dicts or parsing).
     """
-    orders_rows = []
-    items_rows = []
-
-    for o in raw_orders or []:
-        order_id = o.get("id")
-        created = o.get("date_created_gmt") or o.get("date_created")  # fallback just in case
-
-        row = {
-            "order_id": order_id,
-            "order_date": p.parse(created).to_datetime_string() if created else None,
-            "status": o.get("status"),
-            "currency": o.get("currency"),
-            "customer_id": o.get("customer_id"),
-            "discount_total": _f(o.get("discount_total")),
-            "discount_tax": _f(o.get("discount_tax")),
-            "shipping_total": _f(o.get("shipping_total")),
-            "shipping_tax": _f(o.get("shipping_tax")),
-            "cart_tax": _f(o.get("cart_tax")),
-            "total_tax": _f(o.get("total_tax")),
-            "gross_total": _f(o.get("total")),
-            # Baseline net (pre-refund); refunds applied later
-            "net_total": _f(o.get("total")) - _f(o.get("total_tax")),
-            # Refund enrichment placeholders
-            "refund_total": 0.0,
-            "net_after_refunds": None,
-            # Light geo
-            "billing_country": (o.get("billing") or {}).get("country"),
-            "billing_city": (o.get("billing") or {}).get("city"),
-        }
-        orders_rows.append(row)
+    raw_orders = raw_orders or []
+
+    # ---- Orders: one list per column
+    order_id, created, modified, status, currency, customer_id = [], [], [], [], [], []
+    country, city = [], []
+    numeric = {col: [] for col in ORDER_NUMERIC}
+
+    # ---- Items
+    i_order_id, product_id, variation_id, sku, name, quantity, tax_class = [], [], [], [], [], [], []
+    i_numeric = {col: [] for col in ITEM_NUMERIC}
+
+    for o in raw_orders:
+        oid = o.get("id")
+        order_id.append(oid)
+        created.append(o.get("date_created_gmt") or o.get("date_created"))  # fallback just in case
+        modified.append(o.get("date_modified_gmt"))
+        status.append(o.get("status"))
+        currency.append(o.get("currency"))
+        customer_id.append(o.get("customer_id"))
+        for col, field in ORDER_NUMERIC.items():
+            numeric[col].append(o.get(field))
+        billing = o.get("billing") or {}
+        country.append(billing.get("country"))
+        city.append(billing.get("city"))
 
         for li in o.get("line_items", []) or []:
-            items_rows.append(
-                {
-                    "order_id": order_id,
-                    "product_id": li.get("product_id"),
-                    "variation_id": li.get("variation_id"),
-                    "sku": li.get("sku"),
-                    "name": li.get("name"),
-                    "quantity": int(li.get("quantity") or 0),
-                    "price": _f(li.get("price")),
-                    "total": _f(li.get("total")),
-                    "subtotal": _f(li.get("subtotal")),
-                    "tax_class": li.get("tax_class"),
-                    # Enrichment placeholders
-                    "category_snapshot": None,
-                    "refunded_quantity": 0,
-                    "refunded_total": 0.0,
-                }
-            )
-
-    df_orders = pd.DataFrame(orders_rows)
-    df_items = pd.DataFrame(items_rows)
-
-    if not df_orders.empty and "order_date" in df_orders.columns:
-        df_orders.sort_values("order_date", inplace=True)
+            i_order_id.append(oid)
+            product_id.append(li.get("product_id"))
+            variation_id.append(li.get("variation_id"))
+            sku.append(li.get("sku"))
+            name.append(li.get("name"))
+            quantity.append(li.get("quantity"))
+            tax_class.append(li.get("tax_class"))
+            for col in ITEM_NUMERIC:
+                i_numeric[col].append(li.get(col))
+
+    if not order_id:
+        return pd.DataFrame(), pd.DataFrame()
+
+    nums = {col: _num(vals) for col, vals in numeric.items()}
+    df_orders = pd.DataFrame({
+        "order_id": order_id,
+        "order_date": _datetime_strings(created),
+        "status": status,
+        "currency": currency,
+        "customer_id": customer_id,
+        **nums,
+        # Baseline net (pre-refund); refunds applied later
+        "net_total": nums["gross_total"] - nums["total_tax"],
+        # Refund enrichment placeholders
+        "refund_total": 0.0,
+        "net_after_refunds": None,
+        # Light geo
+        "billing_country": country,
+        "billing_city": city,
+        "date_modified_gmt": _datetime_strings(modified),
+    })
+
+    if i_order_id:
+        df_items = pd.DataFrame({
+            "order_id": i_order_id,
+            "product_id": product_id,
+            "variation_id": variation_id,
+            "sku": sku,
+            "name": name,
+            "quantity": pd.to_numeric(pd.Series(quantity, dtype=object), errors="coerce").fillna(0).astype("int64"),
+            **{col: _num(vals) for col, vals in i_numeric.items()},
+            "tax_class": tax_class,
+            # Enrichment placeholders
+            "category_snapshot": None,
+            "refunded_quantity": 0,
+            "refunded_total": 0.0,
+        })
+    else:
+        df_items = pd.DataFrame()
+
+    df_orders.sort_values("order_date", inplace=True)
 
     return df_orders, df_items
@@ -0,0 +1,190 @@
+# src/etl/transform/sql_transform.py
+"""
+Set-based Woo JSON -> fact rows inside DuckDB, mirroring normalize_orders +
+enrich_items_with_categories + apply_refunds with vectorized JSON functions.
+Used by the "sql" engine (ETL_ENGINE / --engine) and by --replay.
+
+Raw payloads are parsed once (parse_orders_sql / parse_refunds_sql) and the
+fact SELECTs read the parsed relations by name:
+  - orders:     (order_id, j)        one parsed order STRUCT per order_id
+  - refunds:    (order_id, refunds)  the parsed orders/{id}/refunds list per order_id
+  - categories: (product_id, category_snapshot)
+"""
+import json
+import os
+
+from .normalize_orders import ITEM_NUMERIC, ORDER_NUMERIC
+
+# "pandas": normalize/enrich/apply_refunds in Python (default)
+# "sql": the same transforms as DuckDB SQL over the landed raw payloads
+ETL_ENGINE = os.getenv("ETL_ENGINE", "pandas").lower()
+ENGINES = ("pandas", "sql")
+
+
+def latest_raw_sql(table: str, where: str = "TRUE") -> str:
+    """Latest landed payload per order (the landing zone is append-only)."""
+    return f"""
+    SELECT order_id, json FROM {table}
+    WHERE {where}
+    QUALIFY row_number() OVER (PARTITION BY order_id ORDER BY extracted_at DESC) = 1
+    """
+
+
+# Same rules as enrich._cat_str / enrich._cat_ids: non-empty category names joined
+# with " | ", and the ids of those categories in payload order
+DIM_PRODUCT_CATEGORIES_SQL = """
+    SELECT
+      product_id,
+      NULLIF(array_to_string(
+        list_filter(json_extract_string(payload, '$.categories[*].name'), x -> COALESCE(x, '') <> ''),
+        ' | '
+      ), '') AS category_snapshot,
+      list_transform(
+        list_filter(json_extract(payload, '$.categories[*]'), c -> COALESCE((c->>'name'), '') <> '' AND (c->>'id') IS NOT NULL),
+        c -> CAST(c->>'id' AS BIGINT)
+      ) AS category_ids
+    FROM dim_products
+"""
+
+
+def product_categories_sql(where: str = "TRUE") -> str:
+    """(product_id, category_id, position, name) rows of dim_products payloads, for dim_category and its bridge."""
+    return f"""
+    SELECT product_id, CAST(c->>'id' AS BIGINT) AS category_id, position, c->>'name' AS name
+    FROM (
+      SELECT product_id, UNNEST(cats) AS c, generate_subscripts(cats, 1) AS position
+      FROM (SELECT product_id, json_extract(payload, '$.categories[*]') AS cats FROM dim_products WHERE {where})
+    )
+    WHERE COALESCE((c->>'name'), '') <> '' AND (c->>'id') IS NOT NULL
+    """
+
+
+# Each payload is parsed ONCE into a typed STRUCT (json_transform); repeated ->>
+# extraction re-parses the whole document per field. Scalars stay VARCHAR and are
+# cast like the pandas path, so strings and JSON numbers behave the same.
+_V = "VARCHAR"
+ORDER_STRUCT = json.dumps({
+    "date_created_gmt": _V, "date_created": _V, "date_modified_gmt": _V, "status": _V, "currency": _V, "customer_id": _V,
+    **{field: _V for field in ORDER_NUMERIC.values()},
+    "billing": {"country": _V, "city": _V},
+    "refunds": "JSON",
+    "line_items": [{
+        "product_id": _V, "variation_id": _V, "sku": _V, "name": _V, "quantity": _V, "tax_class": _V,
+        **{col: _V for col in ITEM_NUMERIC},
+    }],
+})
+REFUNDS_STRUCT = json.dumps([{
+    "amount": _V,
+    "line_items": [{"product_id": _V, "variation_id": _V, "quantity": _V, "total": _V}],
+}])
+
+
+def _num(expr: str) -> str:
+    """Woo money string -> DOUBLE, invalid/missing -> 0.0 (as normalize_orders._num)."""
+    return f"COALESCE(TRY_CAST({expr} AS DOUBLE), 0.0)"
+
+
+def _key(expr: str) -> str:
+    """Woo id -> BIGINT, missing -> 0 (as enrich._int_key)."""
+    return f"COALESCE(TRY_CAST({expr} AS BIGINT), 0)"
+
+
+def parse_orders_sql(raw: str) -> str:
+    """(order_id, json) -> (order_id, j STRUCT)."""
+    return f"SELECT order_id, json_transform(json, '{ORDER_STRUCT}') AS j FROM {raw}"
+
+
+def parse_refunds_sql(raw: str) -> str:
+    """(order_id, json) -> (order_id, refunds LIST)."""
+    return f"SELECT order_id, json_transform(json, '{REFUNDS_STRUCT}') AS refunds FROM {raw}"
+
+
+def _refund_ctes(orders: str, refunds: str) -> str:
+    # Orders whose payload says refunds == [] were never refunded: ignore any stale
+    # refunds rows for them, exactly like fetch_refund_payloads skips them
+    return f"""
+      o AS (SELECT order_id, j FROM {orders}),
+      r AS (
+        SELECT r.order_id, UNNEST(r.refunds) AS refund
+        FROM {refunds} AS r JOIN o USING (order_id)
+        WHERE json_array_length(o.j.refunds) IS DISTINCT FROM 0
+      )
+    """
+
+
+def orders_sql(orders: str, refunds: str) -> str:
+    """SELECT producing fct_orders rows (column names match the table)."""
+    numeric = ",\n".join(f"          {_num(f'j.{field}')} AS {col}" for col, field in ORDER_NUMERIC.items())
+    return f"""
+    WITH {_refund_ctes(orders, refunds)},
+      refund_totals AS (
+        SELECT order_id, SUM({_num("refund.amount")}) AS refund_total
+        FROM r GROUP BY order_id
+      ),
+      base AS (
+        SELECT
+          o.order_id,
+          TRY_CAST(left(COALESCE(NULLIF(j.date_created_gmt, ''), j.date_created), 19) AS TIMESTAMP) AS order_date,
+          j.status AS status,
+          j.currency AS currency,
+          TRY_CAST(j.customer_id AS BIGINT) AS customer_id,
+{numeric},
+          COALESCE(rt.refund_total, 0.0) AS refund_total,
+          j.billing.country AS billing_country,
+          j.billing.city AS billing_city,
+          TRY_CAST(left(NULLIF(j.date_modified_gmt, ''), 19) AS TIMESTAMP) AS date_modified_gmt
+        FROM o LEFT JOIN refund_totals AS rt USING (order_id)
+      )
+    SELECT
+      * EXCLUDE (refund_total, billing_country, billing_city, date_modified_gmt),
+      gross_total - total_tax AS net_total,
+      refund_total,
+      gross_total - total_tax - refund_total AS net_after_refunds,
+      billing_country,
+      billing_city,
+      date_modified_gmt
+    FROM base
+    ORDER BY order_date
+    """
+
+
+def items_sql(orders: str, refunds: str, categories: str) -> str:
+    """SELECT producing fct_order_items rows (column names match the table)."""
+    numeric = ",\n".join(f"          {_num(f'li.{col}')} AS {col}" for col in ITEM_NUMERIC)
+    return f"""
+    WITH {_refund_ctes(orders, refunds)},
+      refund_items AS (
+        SELECT
+          order_id,
+          {_key("li.product_id")} AS product_key,
+          {_key("li.variation_id")} AS variation_key,
+          SUM(COALESCE(TRY_CAST(li.quantity AS INTEGER), 0)) AS refunded_quantity,
+          SUM({_num("li.total")}) AS refunded_total
+        FROM (SELECT order_id, UNNEST(refund.line_items) AS li FROM r)
+        GROUP BY ALL
+      ),
+      flat AS (
+        SELECT
+          order_id,
+          TRY_CAST(li.product_id AS BIGINT) AS product_id,
+          TRY_CAST(li.variation_id AS BIGINT) AS variation_id,
+          li.sku AS sku,
+          li.name AS name,
+          CAST(trunc(COALESCE(TRY_CAST(li.quantity AS DOUBLE), 0)) AS INTEGER) AS quantity,
+{numeric},
+          li.tax_class AS tax_class
+        FROM (SELECT order_id, UNNEST(j.line_items) AS li FROM o)
+      )
+    SELECT
+      f.*,
+      c.category_snapshot,
+      COALESCE(ri.refunded_quantity, 0) AS refunded_quantity,
+      COALESCE(ri.refunded_total, 0.0) AS refunded_total,
+      c.category_ids
+    FROM flat AS f
+    LEFT JOIN {categories} AS c ON c.product_id = f.product_id
+    LEFT JOIN refund_items AS ri
+      ON ri.order_id = f.order_id
+     AND ri.product_key = COALESCE(f.product_id, 0)
+     AND ri.variation_key = COALESCE(f.variation_id, 0)
+    """
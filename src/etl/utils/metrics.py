@@ -0,0 +1,253 @@
+# src/etl/utils/metrics.py
+"""
+Per-stage pipeline metrics on a dedicated prometheus_client registry.
+
+- WooClient/AsyncWooClient call observe_http() for every HTTP attempt
+- transforms and DuckDBClient time themselves with stage() / timed_stage()
+- start_run() / finish_run() bracket a pipeline run: they keep its etl_runs record
+  (status, duration, rows, cursors), finish_run records peak RSS and watermark lag,
+  writes the run's deltas to the etl_run_metrics table and exports the registry to
+  METRICS_TEXTFILE (node_exporter textfile collector) and/or PROMETHEUS_PUSHGATEWAY.
+"""
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Tuple
+
+import pendulum as p
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, push_to_gateway, write_to_textfile
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+from . import profiling
+from .logging import get_logger
+
+log = get_logger(__name__)
+
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE")  # e.g. /var/lib/node_exporter/textfile/woo_etl.prom
+PROMETHEUS_PUSHGATEWAY = os.getenv("PROMETHEUS_PUSHGATEWAY")  # e.g. localhost:9091
+METRICS_JOB = os.getenv("METRICS_JOB", "woocommerce_etl")
+
+REGISTRY = CollectorRegistry()
+
+HTTP_REQUESTS = Counter(
+    "etl_http_requests", "Woo HTTP attempts (retries included)", ["endpoint", "status"], registry=REGISTRY
+)
+HTTP_SECONDS = Histogram(
+    "etl_http_request_seconds", "Woo HTTP attempt latency", ["endpoint"], registry=REGISTRY,
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+HTTP_BYTES = Counter("etl_http_response_bytes", "Woo response body bytes downloaded", ["endpoint"], registry=REGISTRY)
+STAGE_SECONDS = Histogram(
+    "etl_stage_seconds", "Wall time per transform/load stage call", ["stage"], registry=REGISTRY,
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+STAGE_ROWS = Counter("etl_stage_rows", "Rows processed per stage", ["stage"], registry=REGISTRY)
+STAGE_ROWS_PER_SEC = Gauge("etl_stage_rows_per_second", "Throughput of the last stage call", ["stage"], registry=REGISTRY)
+PEAK_RSS = Gauge("etl_peak_rss_bytes", "Peak resident set size of the ETL process", registry=REGISTRY)
+WATERMARK_LAG = Gauge("etl_watermark_lag_seconds", "Now minus the orders watermark", registry=REGISTRY)
+RUN_SECONDS = Gauge("etl_run_duration_seconds", "Duration of the last run", ["mode"], registry=REGISTRY)
+LAST_SUCCESS = Gauge("etl_last_success_timestamp_seconds", "Unix time of the last successful run", ["mode"], registry=REGISTRY)
+PRODUCT_LOOKUPS = Counter(
+    "etl_product_lookups", "Product lookups per cache layer (memory memo, dim_products)", ["layer", "result"],
+    registry=REGISTRY,
+)
+
+# orders/123/refunds -> orders/{id}/refunds, keeping label cardinality bounded
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_label(path: str) -> str:
+    return _ID_SEGMENT.sub("/{id}", "/" + path.strip("/"))[1:]
+
+
+def observe_http(path: str, status, seconds: float, nbytes: int = 0) -> None:
+    endpoint = endpoint_label(path)
+    HTTP_REQUESTS.labels(endpoint=endpoint, status=str(status)).inc()
+    HTTP_SECONDS.labels(endpoint=endpoint).observe(seconds)
+    if nbytes:
+        HTTP_BYTES.labels(endpoint=endpoint).inc(nbytes)
+
+
+class _Stage:
+    def __init__(self, rows: int | None = None):
+        self.rows = rows
+
+
+@contextmanager
+def stage(name: str, rows: int | None = None):
+    """Time a block as `name`; set `.rows` on the yielded object if known only at the end."""
+    s = _Stage(rows)
+    prof = profiling.begin(name) if profiling.ENABLED else None
+    t = time.perf_counter()
+    try:
+        yield s
+    finally:
+        seconds = time.perf_counter() - t
+        if prof is not None:
+            profiling.end(prof)
+        STAGE_SECONDS.labels(stage=name).observe(seconds)
+        if s.rows:
+            STAGE_ROWS.labels(stage=name).inc(s.rows)
+            if seconds > 0:
+                STAGE_ROWS_PER_SEC.labels(stage=name).set(s.rows / seconds)
+
+
+def timed_stage(name: str, rows: Callable | None = None):
+    """Decorator form of stage(); `rows(result)` extracts the row count from the return value."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as s:
+                result = fn(*args, **kwargs)
+                s.rows = rows(result) if rows else None
+            return result
+        return wrapper
+    return deco
+
+
+def peak_rss_bytes() -> int | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(rss if sys.platform == "darwin" else rss * 1024)  # bytes on macOS, KiB on Linux
+
+
+# ---------- Run bracketing ----------
+
+_Key = Tuple[str, str]
+
+
+def _snapshot() -> Dict[_Key, float]:
+    """Current value of every sample except histogram buckets and *_created timestamps."""
+    out: Dict[_Key, float] = {}
+    for family in REGISTRY.collect():
+        for s in family.samples:
+            if s.name.endswith(("_bucket", "_created")):
+                continue
+            out[(s.name, json.dumps(s.labels, sort_keys=True))] = s.value
+    return out
+
+
+_run: dict = {}
+
+
+def start_run(mode: str, profile: bool = False, db=None) -> str:
+    """
+    Mark the start of a run; returns its run_id. `profile` profiles every stage (see
+    profiling); `db` records the run in etl_runs as 'running'.
+    """
+    if profile:
+        profiling.enable()
+    _run.clear()
+    _run.update(
+        run_id=uuid.uuid4().hex[:12], mode=mode, started_at=p.now("UTC"), t0=time.perf_counter(), baseline=_snapshot()
+    )
+    if db is not None:
+        try:
+            db.begin_run(_run["run_id"], mode, _run["started_at"])
+        except Exception as e:  # run bookkeeping must never fail the run
+            log.warning(f"Metrics: could not record the run in etl_runs: {e}")
+    return _run["run_id"]
+
+
+def current_run_id() -> str | None:
+    """run_id of the run in progress (stamped on etl_state writes), None outside start/finish_run."""
+    return _run.get("run_id")
+
+
+_GAUGES = {
+    "etl_stage_rows_per_second", "etl_peak_rss_bytes", "etl_watermark_lag_seconds",
+    "etl_run_duration_seconds", "etl_last_success_timestamp_seconds",
+}
+# Process-wide gauges that describe every run, even when unchanged since the last one
+_ALWAYS = {"etl_peak_rss_bytes", "etl_watermark_lag_seconds"}
+
+
+def _run_deltas() -> Dict[_Key, float]:
+    """
+    This run's samples: counters and histogram sums/counts as deltas, gauges as values
+    (only those set during the run, so a second run in one process does not report
+    the first one's stages).
+    """
+    base = _run.get("baseline", {})
+    out = {}
+    for key, value in _snapshot().items():
+        if key[0] in _GAUGES:
+            if key[0] in _ALWAYS or base.get(key) != value:
+                out[key] = value
+        elif value - base.get(key, 0.0):
+            out[key] = value - base.get(key, 0.0)
+    return out
+
+
+def _total(samples: Dict[_Key, float], metric: str, **labels) -> int:
+    """Sum of `metric` samples whose labels include `labels`."""
+    return int(sum(
+        v for (name, lbl), v in samples.items()
+        if name == metric and labels.items() <= json.loads(lbl).items()
+    ))
+
+
+def finish_run(
+    db=None, watermark: str | None = None, ok: bool = True, error: str | None = None, cursors: dict | None = None
+) -> Dict[_Key, float]:
+    """
+    Close the run started by start_run(): record peak RSS, watermark lag and duration,
+    persist the run's samples to etl_run_metrics and its etl_runs record (status, rows
+    loaded, HTTP requests, `cursors`, `error`) if `db` is given, and export.
+    Profiles, when enabled, are written to PROFILE_DIR/<run_id> and etl_run_profiles.
+    """
+    if not _run:
+        return {}
+    mode = _run["mode"]
+    rss = peak_rss_bytes()
+    if rss is not None:
+        PEAK_RSS.set(rss)
+    if watermark:
+        WATERMARK_LAG.set(max(0.0, p.now("UTC").diff(p.parse(watermark)).in_seconds()))
+    duration = time.perf_counter() - _run["t0"]
+    RUN_SECONDS.labels(mode=mode).set(duration)
+    if ok:
+        LAST_SUCCESS.labels(mode=mode).set(time.time())
+
+    samples = _run_deltas()
+    if db is not None:
+        try:
+            db.save_run_metrics(_run["run_id"], mode, _run["started_at"], ok, samples)
+            db.end_run(
+                _run["run_id"], ok, duration,
+                orders=_total(samples, "etl_stage_rows_total", stage="load_fct_orders"),
+                items=_total(samples, "etl_stage_rows_total", stage="load_fct_order_items"),
+                http_requests=_total(samples, "etl_http_requests_total"),
+                cursors=cursors, error=error,
+            )
+        except Exception as e:  # metrics must never fail the run
+            log.warning(f"Metrics: could not persist the run's metrics: {e}")
+    export()
+    profiling.dump(_run["run_id"], db)
+    log.info(
+        f"Run {_run['run_id']} ({mode}) metrics: {len(samples)} samples, "
+        f"peak_rss={(rss or 0) / 2**20:.0f} MiB, duration={duration:.1f}s"
+    )
+    _run.clear()
+    return samples
+
+
+def export() -> None:
+    """Write METRICS_TEXTFILE and/or push to PROMETHEUS_PUSHGATEWAY (both optional)."""
+    try:
+        if METRICS_TEXTFILE:
+            write_to_textfile(METRICS_TEXTFILE, REGISTRY)
+        if PROMETHEUS_PUSHGATEWAY:
+            push_to_gateway(PROMETHEUS_PUSHGATEWAY, job=METRICS_JOB, registry=REGISTRY)
+    except Exception as e:
+        log.warning(f"Metrics: export failed: {e}")
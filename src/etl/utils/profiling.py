@@ -0,0 +1,215 @@
+# src/etl/utils/profiling.py
+"""
+Opt-in per-stage profiling (run.py --profile / run_flow(profile=True)).
+
+While enabled, every metrics.stage() runs under cProfile with tracemalloc tracing its
+allocation peak; the first PROFILE_SNAPSHOT_CALLS calls of each stage also diff two
+tracemalloc snapshots (a snapshot walks every live block, so doing it on every call
+would dominate the run; 0 turns them off) to find the allocation sites. Results are
+aggregated per stage over the run and written by dump():
+  - {PROFILE_DIR}/{run_id}/{stage}.prof   pstats dump (snakeviz / python -m pstats)
+  - {PROFILE_DIR}/{run_id}/summary.txt    top-N functions and allocation sites per stage
+  - etl_run_profiles                      the same summary, next to etl_run_metrics
+
+Disabled (the default), stage() only checks `ENABLED`.
+
+cProfile sees the thread that entered the stage; work a stage hands to a pool (refund
+and product fetches) shows up as waiting. tracemalloc is process-wide, so with parallel
+backfill windows a stage's allocation peak includes the other threads.
+
+From Python 3.12 cProfile runs on sys.monitoring, which allows one profiler per
+process: while one thread's stage is profiled, stages entered on other threads (or
+while another profiling tool is active) run unprofiled and are counted as `skipped`.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+from .logging import get_logger
+
+log = get_logger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+PROFILE_SNAPSHOT_CALLS = int(os.getenv("PROFILE_SNAPSHOT_CALLS", "1"))
+
+ENABLED = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats: Dict[str, pstats.Stats] = {}
+_calls: Dict[str, int] = {}
+_alloc_peak: Dict[str, int] = {}
+_alloc_sites: Dict[str, Dict[str, int]] = {}
+_pending: Dict[str, int] = {}  # snapshot calls in flight, per stage
+_skipped: Dict[str, int] = {}
+
+# Held by the thread whose profiler is active where only one may be (see module doc)
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+_profiler_lock = threading.Lock()
+
+
+def enable() -> None:
+    """Start collecting; clears anything left from an earlier run in this process."""
+    global ENABLED
+    with _lock:
+        _stats.clear()
+        _calls.clear()
+        _alloc_peak.clear()
+        _alloc_sites.clear()
+        _pending.clear()
+        _skipped.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    ENABLED = True
+
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+
+def _skip(stage: str, reason: str) -> None:
+    with _lock:
+        first = not _skipped
+        _skipped[stage] = _skipped.get(stage, 0) + 1
+    if first:
+        log.warning(f"Profiling: {stage} not profiled ({reason}); overlapping stages are skipped and counted")
+
+
+def begin(stage: str):
+    """
+    Start profiling `stage` on this thread; None when a stage is already profiled here
+    (nested) or the profiler is taken by another thread or tool (skipped).
+    """
+    if getattr(_local, "active", False):
+        return None
+    if _PROCESS_WIDE and not _profiler_lock.acquire(blocking=False):
+        _skip(stage, "another thread is being profiled")
+        return None
+    tracemalloc.reset_peak()
+    with _lock:
+        snapshot = _calls.get(stage, 0) + _pending.get(stage, 0) < PROFILE_SNAPSHOT_CALLS
+        if snapshot:
+            _pending[stage] = _pending.get(stage, 0) + 1
+    before = _snapshot() if snapshot else None
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError as e:  # "Another profiling tool is already active"
+        if _PROCESS_WIDE:
+            _profiler_lock.release()
+        with _lock:
+            if snapshot:
+                _pending[stage] -= 1
+        _skip(stage, str(e))
+        return None
+    _local.active = True
+    return stage, prof, before
+
+
+def end(token) -> None:
+    stage, prof, before = token
+    prof.disable()
+    _local.active = False
+    if _PROCESS_WIDE:
+        _profiler_lock.release()
+    peak = tracemalloc.get_traced_memory()[1]
+    diff = _snapshot().compare_to(before, "lineno") if before is not None else []
+    with _lock:
+        if before is not None:
+            _pending[stage] -= 1
+        _calls[stage] = _calls.get(stage, 0) + 1
+        if stage in _stats:
+            _stats[stage].add(prof)
+        else:
+            _stats[stage] = pstats.Stats(prof)
+        _alloc_peak[stage] = max(_alloc_peak.get(stage, 0), peak)
+        sites = _alloc_sites.setdefault(stage, {})
+        for d in diff[:PROFILE_TOP_N]:
+            if d.size_diff > 0:
+                site = str(d.traceback[0])
+                sites[site] = sites.get(site, 0) + d.size_diff
+
+
+def _top_functions(stats: pstats.Stats, n: int) -> List[dict]:
+    rows = []
+    # stats.stats: {(file, line, func): (primitive calls, calls, tottime, cumtime, callers)}
+    for (file, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(file)}:{line}({func})",
+            "ncalls": ncalls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6),
+        })
+    return sorted(rows, key=lambda r: r["cumtime"], reverse=True)[:n]
+
+
+def summary(top_n: int = PROFILE_TOP_N) -> List[dict]:
+    """One dict per profiled stage: calls, seconds, alloc peak, top functions and allocation sites."""
+    out = []
+    with _lock:
+        for stage, stats in _stats.items():
+            sites = sorted(_alloc_sites.get(stage, {}).items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+            out.append({
+                "stage": stage,
+                "calls": _calls[stage],
+                "skipped": _skipped.get(stage, 0),
+                "seconds": round(stats.total_tt, 6),
+                "alloc_peak_bytes": _alloc_peak.get(stage, 0),
+                "top_functions": _top_functions(stats, top_n),
+                "top_allocations": [{"site": site, "bytes": size} for site, size in sites],
+            })
+    return sorted(out, key=lambda s: s["seconds"], reverse=True)
+
+
+def _summary_text(rows: List[dict]) -> str:
+    buf = io.StringIO()
+    for s in rows:
+        buf.write(
+            f"== {s['stage']}: calls={s['calls']} skipped={s['skipped']} seconds={s['seconds']:.3f} "
+            f"alloc_peak={s['alloc_peak_bytes'] / 2**20:.1f} MiB\n"
+        )
+        buf.write(f"{'cumtime':>10} {'tottime':>10} {'ncalls':>9}  function\n")
+        for f in s["top_functions"]:
+            buf.write(f"{f['cumtime']:>10.4f} {f['tottime']:>10.4f} {f['ncalls']:>9}  {f['function']}\n")
+        if s["top_allocations"]:
+            buf.write("  allocated (net, KiB):\n")
+            for a in s["top_allocations"]:
+                buf.write(f"{a['bytes'] / 1024:>12.1f}  {a['site']}\n")
+        buf.write("\n")
+    return buf.getvalue()
+
+
+def dump(run_id: str, db=None) -> str | None:
+    """Write this run's per-stage dumps + summary (and etl_run_profiles if `db`), then disable."""
+    if not ENABLED:
+        return None
+    rows = summary()
+    out_dir = Path(PROFILE_DIR) / run_id
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        for stage, stats in _stats.items():
+            stats.dump_stats(str(out_dir / f"{stage}.prof"))
+    (out_dir / "summary.txt").write_text(_summary_text(rows), encoding="utf-8")
+    if db is not None:
+        try:
+            db.save_run_profiles(run_id, rows)
+        except Exception as e:  # profiling must never fail the run
+            log.warning(f"Profiling: could not persist etl_run_profiles: {e}")
+    disable()
+    log.info(f"Profiles for {len(rows)} stages written to {out_dir}")
+    return str(out_dir)
@@ -1,21 +1,104 @@
+"""
+Pipeline state in the DuckDB etl_state table, committed with the facts it describes.
+
+Cursors per entity:
+  orders            WATERMARK_KEY: newest loaded order_date (`after` of the next created-mode run)
+  orders_modified   MODIFIED_WATERMARK_KEY: date_modified_gmt of the next delta sync
+  products          PRODUCTS_REFRESH_KEY: start of the last ProductCache.refresh (its next modified_after)
+  refunds           no cursor: fetched with the orders they belong to
+Backfill windows checkpoint under `backfill:<window start>` (orchestration/backfill.py).
+Each etl_state row records the etl_runs run that last wrote it.
+"""
 import json
 import os
+from typing import Dict
+
+import pendulum as p
 from .time import default_lookback_iso
+from ..load.duckdb_client import DuckDBClient
+
+
+# Pre-DuckDB watermark file; only read once to seed etl_state on upgrade
+STATE_PATH = os.getenv("LEGACY_STATE_PATH", "./data/state.json")
+WATERMARK_KEY = "orders_since"
+# date_modified_gmt cursor of the "modified" sync mode (ETL_SYNC_MODE / --sync)
+MODIFIED_WATERMARK_KEY = "orders_modified_since"
+# Start of the last products?modified_after refresh (ProductCache.refresh)
+PRODUCTS_REFRESH_KEY = "products_refreshed_at"
+BACKFILL_PREFIX = "backfill:"
+
+
+def _db() -> DuckDBClient:
+    db = DuckDBClient()
+    db.init_schema()
+    return db
 
 
-STATE_PATH = "./data/state.json"
+def _step_back(since: str) -> str:
+    return p.parse(since, tz="UTC").subtract(seconds=1).to_iso8601_string()
 
 
 def get_since_ts() -> str:
-    os.makedirs("./data", exist_ok=True)
+    """
+    `after` for the next created-mode run. The watermark is the newest loaded
+    order_date itself. Woo's `after` is exclusive and second-precise, and a chunk can
+    end partway through a second, so step back one second: orders stamped on the
+    watermark are re-read instead of the rest of that second being skipped when a run
+    stops between chunks; process_batch skips those already loaded unchanged.
+    """
+    db = _db()
+    since = db.get_state(WATERMARK_KEY)
+    if since:
+        return _step_back(since)
+
     if os.path.exists(STATE_PATH):
         with open(STATE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f).get("since_iso")
-    
+            since = json.load(f).get("since_iso")
+        if since:
+            db.set_state(WATERMARK_KEY, since)
+            return _step_back(since)
+
     days = int(os.getenv("DEFAULT_LOOKBACK_DAYS", "30"))
     return default_lookback_iso(days)
 
 
 def set_since_ts(iso_ts: str) -> None:
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump({"since_iso": iso_ts}, f)
\ No newline at end of file
+    """Standalone watermark write; batch loads commit it via DuckDBClient.load_batch instead."""
+    _db().set_state(WATERMARK_KEY, iso_ts)
+
+
+def get_modified_since_ts() -> str:
+    """
+    modified_after for the next delta sync. Woo's filter is exclusive and second-precise,
+    so step back one second: orders modified in the watermark's second are re-read
+    instead of possibly missed; process_batch skips those already loaded unchanged.
+    First run: start from the newest modification already landed, else the lookback.
+    """
+    db = _db()
+    since = db.get_state(MODIFIED_WATERMARK_KEY)
+    if not since:
+        since = db.con.execute(
+            "SELECT MAX(json->>'date_modified_gmt') FROM stg_orders_raw"
+        ).fetchone()[0]
+    if not since:
+        return default_lookback_iso(int(os.getenv("DEFAULT_LOOKBACK_DAYS", "30")))
+    return _step_back(since)
+
+
+def entity_cursors(db: DuckDBClient | None = None) -> Dict[str, object]:
+    """
+    Where each entity's sync stands, plus unfinished backfill windows (saved with each
+    etl_runs row). "refunds" is derived, not a cursor: the newest landed refund payload,
+    reported only.
+    """
+    db = db or _db()
+    refunds = db.con.execute("SELECT MAX(extracted_at) FROM stg_refunds_raw").fetchone()[0]
+    return {
+        "orders": db.get_state(WATERMARK_KEY),
+        "orders_modified": db.get_state(MODIFIED_WATERMARK_KEY),
+        "products": db.get_state(PRODUCTS_REFRESH_KEY),
+        "refunds": refunds.isoformat() if refunds else None,
+        "backfill_open": {
+            k[len(BACKFILL_PREFIX):]: v for k, v in db.states(BACKFILL_PREFIX).items() if not v.startswith("done")
+        },
+    }
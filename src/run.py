@@ -2,127 +2,38 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import argparse
-import os
-import duckdb
+from functools import partial
 import pendulum as p
-import pandas as pd
 
-from src.etl.extract.orders import fetch_orders_since
-from src.etl.extract.products import fetch_products_by_ids
-from src.etl.extract.refunds import fetch_refunds_for_orders
-from src.etl.transform.normalize_orders import normalize_orders
-from src.etl.transform.enrich import enrich_items_with_categories, apply_refunds
+from src.etl.extract.orders import ETL_SYNC_MODE, SYNC_MODES, iter_orders_modified_since, iter_orders_since
+from src.etl.transform.sql_transform import ETL_ENGINE, ENGINES
 from src.etl.load.duckdb_client import DuckDBClient
-from src.etl.utils.state import get_since_ts, set_since_ts
+from src.etl.orchestration.batch import process_batch
+from src.etl.orchestration.backfill import BACKFILL_WORKERS, advance_watermark_to_loaded, plan_windows, run_backfill
+from src.etl.orchestration.re_enrich import re_enrich_categories
+from src.etl.utils.state import entity_cursors, get_modified_since_ts, get_since_ts, MODIFIED_WATERMARK_KEY, WATERMARK_KEY
 from src.etl.utils.logging import get_logger
+from src.etl.utils.metrics import finish_run, start_run
 
 log = get_logger(__name__)
-DB_PATH = os.getenv("DUCKDB_PATH", "./data/warehouse.duckdb")
 
 
-def _process_batch(raw_orders):
-    """Normalize -> enrich -> refunds -> load. Returns (n_orders, n_items, max_order_dt_or_None)."""
-    if not raw_orders:
-        return 0, 0, None
+def _backfill(start_iso: str, window_days: int = 30, workers: int = BACKFILL_WORKERS, engine: str = ETL_ENGINE):
+    """
+    Backfill from start date to now in disjoint after/before windows, processed in
+    parallel. Each window checkpoints per chunk, so a rerun resumes only unfinished windows.
+    """
+    end_iso = p.now("UTC").to_iso8601_string()
+    windows = plan_windows(start_iso, end_iso, window_days)
+    log.info(f"Backfill from {start_iso} to {end_iso}: {len(windows)} x {window_days}-day windows")
 
-    # Normalize
-    df_orders, df_items = normalize_orders(raw_orders)
-    log.info(f"Normalized: orders={len(df_orders)}, items={len(df_items)}")
-
-    # Enrich categories (for this batch’s product_ids)
-    product_ids = sorted({int(x) for x in df_items["product_id"].dropna().unique().tolist()}) if not df_items.empty else []
-    products = fetch_products_by_ids(product_ids)
-    df_items = enrich_items_with_categories(df_items, products)
-
-    # Apply refunds (orders + items)
-    order_ids = df_orders["order_id"].tolist()
-    refunds_map = fetch_refunds_for_orders(order_ids)
-    df_orders, df_items = apply_refunds(df_orders, df_items, refunds_map)
-
-    # Load
-    db = DuckDBClient()
-    db.init_schema()
-    db.load_orders(df_orders)
-    db.load_order_items(df_items)
-
-    max_dt = df_orders["order_date"].max() if not df_orders.empty else None
-    return len(df_orders), len(df_items), max_dt
-
-
-def _re_enrich_categories(force_all: bool = False) -> int:
-    """Re-enrich category_snapshot for existing rows. Returns number of products attempted."""
-    con = duckdb.connect(DB_PATH)
-    if force_all:
-        need = con.execute("""
-            SELECT DISTINCT product_id
-            FROM fct_order_items
-            WHERE product_id IS NOT NULL
-        """).df()
-    else:
-        need = con.execute("""
-            SELECT DISTINCT product_id
-            FROM fct_order_items
-            WHERE product_id IS NOT NULL
-              AND (category_snapshot IS NULL OR TRIM(category_snapshot) = '')
-        """).df()
-
-    if need.empty:
-        log.info("Re-enrich: nothing to do.")
-        return 0
-
-    pids = [int(x) for x in need["product_id"].dropna().tolist()]
-    log.info(f"Re-enrich: fetching {len(pids)} products…")
-    products = fetch_products_by_ids(pids)
-
-    def cat_str(pid):
-        p = products.get(int(pid))
-        cats = (p or {}).get("categories") or []
-        names = [c.get("name") for c in cats if c.get("name")]
-        return " | ".join(names) if names else None
-
-    map_df = pd.DataFrame({
-        "product_id": pids,
-        "category_snapshot": [cat_str(pid) for pid in pids]
-    })
-    con.register("map_df", map_df)
-    con.execute("""
-        UPDATE fct_order_items AS i
-        SET category_snapshot = m.category_snapshot
-        FROM map_df AS m
-        WHERE i.product_id = m.product_id
-          AND (? OR i.category_snapshot IS NULL OR TRIM(i.category_snapshot) = '')
-    """, [force_all])
-    con.close()
-    log.info("Re-enrich: done.")
-    return len(pids)
-
-
-def _backfill(start_iso: str, window_days: int = 30):
-    """Backfill from start date to now in windows. Updates watermark as it goes."""
-    start = p.parse(start_iso)
-    end = p.now("UTC")
-    cursor = start
-    total_orders = 0
-    log.info(f"Backfill from {start.to_iso8601_string()} to {end.to_iso8601_string()} in {window_days}-day windows")
-
-    while cursor < end:
-        window_end = min(cursor.add(days=window_days), end)
-        # Woo supports 'after' param; we bound window by advancing watermark ourselves
-        raw = fetch_orders_since(cursor.to_iso8601_string())
-        n_orders, n_items, max_dt = _process_batch(raw)
-        total_orders += n_orders
-        # advance cursor conservatively
-        if max_dt:
-            cursor = p.parse(max_dt).add(minutes=1)
-            set_since_ts(cursor.to_iso8601_string())
-            log.info(f"Backfill window loaded: orders={n_orders}; watermark={cursor.to_iso8601_string()}")
-        else:
-            # no data; jump window
-            cursor = window_end
+    total_orders = run_backfill(windows, partial(process_batch, engine=engine), workers=workers)
+    watermark = advance_watermark_to_loaded()
 
     # Final re-enrich pass for any lingering uncategorized
-    _re_enrich_categories(force_all=False)
-    log.info(f"Backfill complete. Total orders loaded: {total_orders}")
+    re_enrich_categories(force_all=False)
+    DuckDBClient().maybe_recluster(force=True)  # backfills append out of date order
+    log.info(f"Backfill complete. Total orders loaded: {total_orders}; watermark={watermark}")
 
 
 def main():
@@ -130,36 +41,89 @@ def main():
     ap.add_argument("--re-enrich", action="store_true", help="Re-enrich categories for existing items that are missing them")
     ap.add_argument("--force-enrich-all", action="store_true", help="Re-enrich categories for ALL items (overwrites existing)")
     ap.add_argument("--backfill-start", type=str, help="ISO date (YYYY-MM-DD) to backfill from")
+    ap.add_argument("--window-days", type=int, default=30, help="Backfill window size in days")
+    ap.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Backfill windows processed in parallel")
+    ap.add_argument("--replay", action="store_true", help="Rebuild fact tables from the raw landing zone (no API calls)")
+    ap.add_argument("--engine", choices=ENGINES, default=ETL_ENGINE, help="Transform engine: pandas or DuckDB SQL")
+    ap.add_argument("--sync", choices=SYNC_MODES, default=ETL_SYNC_MODE,
+                    help="Incremental mode: new orders (created) or every changed order (modified)")
+    ap.add_argument("--profile", action="store_true", help="cProfile + tracemalloc every stage; dumps go to PROFILE_DIR/<run_id>")
     args = ap.parse_args()
 
+    # Per-stage metrics for the whole run: persisted to etl_run_metrics and exported
+    # to METRICS_TEXTFILE / PROMETHEUS_PUSHGATEWAY when configured; the run itself
+    # (status, rows, cursors) is recorded in etl_runs
+    db = DuckDBClient()
+    db.init_schema()
+    mode = "replay" if args.replay else "backfill" if args.backfill_start else args.sync
+    start_run(mode, profile=args.profile, db=db)
+    error = None
+    try:
+        _run(args)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wm_key = MODIFIED_WATERMARK_KEY if args.sync == "modified" and not args.backfill_start else WATERMARK_KEY
+        finish_run(db, watermark=db.get_state(wm_key), ok=error is None, error=error, cursors=entity_cursors(db))
+
+
+def _run(args):
+    # Replay mode: re-run transforms over stg_*_raw + dim_products only
+    if args.replay:
+        db = DuckDBClient()
+        db.init_schema()
+        n_orders, n_items = db.replay_from_landing()
+        log.info(f"Replay complete: orders={n_orders}, items={n_items}")
+        return
+
     # Backfill mode
     if args.backfill_start:
         start_iso = p.parse(args.backfill_start).to_iso8601_string()
-        _backfill(start_iso)
+        _backfill(start_iso, window_days=args.window_days, workers=args.workers, engine=args.engine)
         return
 
     # Incremental ETL
-    since_iso = get_since_ts()
-    log.info(f"Starting ETL since={since_iso}")
-    raw_orders = fetch_orders_since(since_iso)
-    log.info(f"Fetched {len(raw_orders)} orders")
-
-    if raw_orders:
-        n_orders, n_items, max_dt = _process_batch(raw_orders)
-        if max_dt:
-            watermark = p.parse(max_dt).add(minutes=1).to_iso8601_string()
-            set_since_ts(watermark)
-            log.info(f"Done. New watermark={watermark}")
+    by_modified = args.sync == "modified"
+    if by_modified:
+        # Delta sync: every order created or changed since the last run (status, refunds),
+        # up to this run's start; the date_modified_gmt watermark commits with each chunk
+        since_iso = get_modified_since_ts()
+        log.info(f"Starting delta ETL modified_after={since_iso}")
+        chunks = iter_orders_modified_since(since_iso, modified_before_iso=p.now("UTC").to_iso8601_string())
+    else:
+        since_iso = get_since_ts()
+        log.info(f"Starting ETL since={since_iso}")
+        chunks = iter_orders_since(since_iso)
+    total_orders = 0
+    watermark = None
+    # Stream chunk by chunk so memory is bounded by ETL_CHUNK_SIZE, not by the backlog
+    for raw_orders in chunks:
+        n_orders, n_items, wm = process_batch(
+            raw_orders, state_key=MODIFIED_WATERMARK_KEY if by_modified else WATERMARK_KEY,
+            engine=args.engine, by_modified=by_modified,
+        )
+        total_orders += n_orders
+        if wm:
+            watermark = wm
+            log.info(f"Chunk loaded: orders={n_orders}; watermark={watermark}")
+
+    if total_orders:
+        log.info(f"Done. Loaded {total_orders} orders. New watermark={watermark}")
     else:
         log.info("No new orders.")
 
     # Re-enrich pass:
     #  - if user requested explicitly OR
     #  - if no new orders were fetched (keep categories fresh without extra commands)
+    #  - while old items still wait for their category_ids (one-time backfill)
     if args.force_enrich_all:
-        _re_enrich_categories(force_all=True)
-    elif args.re_enrich or not raw_orders:
-        _re_enrich_categories(force_all=False)
+        re_enrich_categories(force_all=True)
+    elif args.re_enrich or not total_orders or DuckDBClient().category_ids_pending():
+        re_enrich_categories(force_all=False)
+
+    # Keep the fact tables date-ordered for zone-map pruning (after out-of-order loads)
+    DuckDBClient().maybe_recluster()
 
 
 if __name__ == "__main__":
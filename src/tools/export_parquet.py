@@ -0,0 +1,24 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+
+from src.etl.load.duckdb_client import DuckDBClient
+from src.etl.load.parquet_export import PARQUET_EXPORT_DIR, export_months
+
+
+def main():
+    ap = argparse.ArgumentParser(description="(Re)write the Hive-partitioned Parquet copy of fct_orders/fct_order_items")
+    ap.add_argument("--dir", default=PARQUET_EXPORT_DIR or "./data/parquet", help="Export root (default: PARQUET_EXPORT_DIR)")
+    ap.add_argument("--month", action="append", default=[], metavar="YYYY-MM",
+                    help="Only rewrite this month (repeatable); default: every month")
+    args = ap.parse_args()
+
+    db = DuckDBClient()
+    db.init_schema()
+    months = {tuple(int(x) for x in m.split("-")) for m in args.month} or None
+    written = export_months(db.con, months, root=args.dir)
+    print(f"Done. Wrote {written} partitions under {args.dir} (manifest: {args.dir}/_manifest.json).")
+
+if __name__ == "__main__":
+    main()
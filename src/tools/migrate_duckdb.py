@@ -23,6 +23,20 @@ ensure_columns("fct_order_items", [
     ("category_snapshot", "category_snapshot VARCHAR"),
     ("refunded_quantity", "refunded_quantity INTEGER"),
     ("refunded_total", "refunded_total DOUBLE"),
+    ("order_date", "order_date TIMESTAMP"),
+    ("order_day", "order_day DATE"),
+    ("category_ids", "category_ids BIGINT[]"),
 ])
 
+# Denormalized item dates (DuckDBClient.init_schema does the same on first run)
+con.execute("""
+    UPDATE fct_order_items AS i
+    SET order_date = o.order_date, order_day = CAST(o.order_date AS DATE)
+    FROM fct_orders AS o
+    WHERE i.order_id = o.order_id AND i.order_day IS NULL
+""")
+
+# category_ids are filled from dim_category/bridge_product_category by
+# DuckDBClient.init_schema (one-time migration) on the next run
+
 print("Migration complete.")
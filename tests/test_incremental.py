@@ -0,0 +1,89 @@
+import argparse
+
+import pytest
+
+import src.run as run
+from src.etl.load import duckdb_client
+from src.etl.load.duckdb_client import RECLUSTER_PENDING_KEY, DuckDBClient
+from src.etl.orchestration.batch import process_batch
+from src.etl.utils.state import MODIFIED_WATERMARK_KEY, WATERMARK_KEY
+
+
+def _order(oid: int, created: str, modified: str) -> dict:
+    return {
+        "id": oid, "date_created_gmt": created, "date_modified_gmt": modified, "status": "completed",
+        "currency": "EUR", "customer_id": 1, "total": "10.00", "total_tax": "0.00",
+        "billing": {"country": "GR", "city": "Athens"}, "refunds": [], "line_items": [],
+    }
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(duckdb_client, "DB_PATH", str(tmp_path / "warehouse.duckdb"))
+    client = DuckDBClient()
+    client.init_schema()
+    return client
+
+
+def _args(**kw) -> argparse.Namespace:
+    defaults = dict(replay=False, backfill_start=None, sync="created", engine="pandas", force_enrich_all=False, re_enrich=False)
+    return argparse.Namespace(**{**defaults, **kw})
+
+
+@pytest.mark.parametrize("engine", ["pandas", "sql"])
+def test_idle_run_loads_nothing_and_re_enriches(db, monkeypatch, engine):
+    orders = [_order(1, "2024-03-01T10:00:00", "2024-03-01T10:00:00"), _order(2, "2024-03-01T11:00:00", "2024-03-01T11:00:00")]
+    pages = [orders]
+    monkeypatch.setattr(run, "iter_orders_since", lambda since: iter(pages))
+    re_enriched = []
+    monkeypatch.setattr(run, "re_enrich_categories", lambda force_all: re_enriched.append(force_all))
+
+    run._run(_args(engine=engine))
+    assert db.get_state(WATERMARK_KEY) == "2024-03-01T11:00:00Z"
+    assert re_enriched == []
+
+    # The next run re-reads the watermark's second: nothing new is landed, loaded or counted
+    pages[:] = [[orders[1]]]
+    landed = db.con.execute("SELECT COUNT(*) FROM stg_orders_raw").fetchone()[0]
+    assert process_batch([orders[1]], engine=engine) == (0, 0, None)
+    run._run(_args(engine=engine))
+    assert db.con.execute("SELECT COUNT(*) FROM stg_orders_raw").fetchone()[0] == landed
+    assert re_enriched == [False]
+
+
+def test_changed_boundary_order_is_reloaded(db):
+    order = _order(1, "2024-03-01T10:00:00", "2024-03-01T10:00:00")
+    assert process_batch([order])[0] == 1
+
+    changed = {**order, "status": "refunded", "date_modified_gmt": "2024-03-02T09:00:00"}
+    assert process_batch([changed])[0] == 1
+    assert db.con.execute("SELECT status FROM fct_orders WHERE order_id = 1").fetchone() == ("refunded",)
+
+
+def test_idle_delta_sync_loads_nothing(db, monkeypatch):
+    orders = [_order(1, "2024-03-01T10:00:00", "2024-03-05T08:00:00"), _order(2, "2024-03-02T10:00:00", "2024-03-05T08:00:00")]
+    pages = [orders]
+    monkeypatch.setattr(run, "iter_orders_modified_since", lambda since, modified_before_iso=None: iter(pages))
+    monkeypatch.setattr(run, "re_enrich_categories", lambda force_all: None)
+
+    run._run(_args(sync="modified"))
+    assert db.get_state(MODIFIED_WATERMARK_KEY) == "2024-03-05T08:00:00"
+
+    # Re-read at the watermark: only the order modified since is loaded
+    assert process_batch(orders, state_key=MODIFIED_WATERMARK_KEY, by_modified=True) == (0, 0, None)
+    changed = {**orders[1], "status": "cancelled", "date_modified_gmt": "2024-03-05T08:00:01"}
+    assert process_batch([orders[0], changed], state_key=MODIFIED_WATERMARK_KEY, by_modified=True)[:2] == (1, 0)
+    assert db.get_state(MODIFIED_WATERMARK_KEY) == "2024-03-05T08:00:01"
+
+
+def test_only_out_of_order_loads_recluster(db):
+    process_batch([_order(1, "2024-03-01T10:00:00", "2024-03-01T10:00:00")])
+    process_batch([_order(2, "2024-03-02T10:00:00", "2024-03-02T10:00:00")])
+    assert db.get_state(RECLUSTER_PENDING_KEY) is None
+    assert not DuckDBClient().maybe_recluster()
+
+    process_batch([_order(3, "2024-02-01T10:00:00", "2024-03-03T10:00:00")])  # older than the newest loaded
+    assert db.get_state(RECLUSTER_PENDING_KEY) is not None
+    assert DuckDBClient().maybe_recluster()
+    assert db.get_state(RECLUSTER_PENDING_KEY) is None
+    assert db.con.execute("SELECT list(order_id) FROM fct_orders").fetchone()[0] == [3, 1, 2]
@@ -0,0 +1,89 @@
+import threading
+
+import pendulum as p
+import pytest
+
+from src.etl.extract import product_cache
+from src.etl.extract.product_cache import ProductCache
+from src.etl.load import duckdb_client
+from src.etl.load.duckdb_client import DuckDBClient
+from src.etl.utils.state import PRODUCTS_REFRESH_KEY
+
+
+def _product(pid: int) -> dict:
+    return {"id": pid, "date_modified_gmt": "2024-01-01T00:00:00", "categories": [{"id": 1, "name": "Shoes"}]}
+
+
+@pytest.fixture
+def new_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(duckdb_client, "DB_PATH", str(tmp_path / "warehouse.duckdb"))
+    DuckDBClient().init_schema()
+    return lambda: ProductCache(DuckDBClient().con)  # one connection per thread, like backfill windows
+
+
+def _run(*targets):
+    threads = [threading.Thread(target=t, daemon=True) for t in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+
+def test_disjoint_misses_are_fetched_concurrently(new_cache, monkeypatch):
+    both_fetching = threading.Barrier(2, timeout=5)
+
+    def fetch(ids, use_memo=True):
+        both_fetching.wait()  # times out if one fetch waits for the other
+        return {i: _product(i) for i in ids}
+
+    monkeypatch.setattr(product_cache, "fetch_products_by_ids", fetch)
+    results = {}
+    _run(lambda: results.update(a=new_cache().get([1, 2])), lambda: results.update(b=new_cache().get([3, 4])))
+    assert sorted(results["a"]) == [1, 2] and sorted(results["b"]) == [3, 4]
+
+
+def test_overlapping_miss_is_fetched_once(new_cache, monkeypatch):
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def fetch(ids, use_memo=True):
+        calls.append(sorted(ids))
+        if 1 in ids:
+            started.set()
+            release.wait(5)
+        return {i: _product(i) for i in ids if i != 404}
+
+    monkeypatch.setattr(product_cache, "fetch_products_by_ids", fetch)
+    results = {}
+
+    def second():
+        assert started.wait(5)
+        threading.Timer(0.2, release.set).start()
+        results["b"] = new_cache().get([2, 3, 404])
+
+    _run(lambda: results.update(a=new_cache().get([1, 2, 404])), second)
+    assert calls == [[1, 2, 404], [3]]
+    assert sorted(results["a"]) == [1, 2] and sorted(results["b"]) == [2, 3]
+    assert not product_cache._IN_FLIGHT
+
+
+def test_refresh_resumes_from_its_own_cursor(new_cache, monkeypatch):
+    asked = []
+
+    class Woo:
+        def paged(self, path, params):
+            asked.append(params["modified_after"])
+            return [_product(7)]
+
+    monkeypatch.setattr(product_cache, "WooClient", Woo)
+    cache = new_cache()
+    assert cache.refresh() == 0 and asked == []  # empty cache: only the cursor is written
+    cursor = p.parse(cache.con.execute(
+        "SELECT value FROM etl_state WHERE key = ?", [PRODUCTS_REFRESH_KEY]
+    ).fetchone()[0])
+
+    # A miss fetched later (newer date_modified_gmt) does not move the cursor
+    cache.upsert({8: {**_product(8), "date_modified_gmt": "2030-01-01T00:00:00"}})
+    assert cache.refresh() == 0  # within PRODUCT_CACHE_REFRESH_MINUTES
+    assert cache.refresh(force=True) == 1
+    assert asked == [cursor.subtract(seconds=1).to_iso8601_string()]
+    assert cache.con.execute("SELECT COUNT(*) FROM dim_products").fetchone()[0] == 2
@@ -0,0 +1,54 @@
+import cProfile
+import threading
+
+import pytest
+
+from src.etl.utils import metrics, profiling
+
+
+@pytest.fixture
+def profiled():
+    profiling.enable()
+    yield
+    profiling.disable()
+
+
+def test_stage_survives_profiler_already_active(profiled, monkeypatch):
+    def busy(self):
+        raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(cProfile.Profile, "enable", busy)
+    with metrics.stage("t_busy") as s:
+        s.rows = 1
+    assert profiling._skipped == {"t_busy": 1}
+    assert not getattr(profiling._local, "active", False)
+    assert profiling._pending.get("t_busy", 0) == 0
+
+    monkeypatch.undo()
+    with metrics.stage("t_busy"):
+        pass
+    assert [row["calls"] for row in profiling.summary() if row["stage"] == "t_busy"] == [1]
+
+
+def test_one_profiled_thread_at_a_time_when_process_wide(profiled, monkeypatch):
+    monkeypatch.setattr(profiling, "_PROCESS_WIDE", True)
+    entered, release = threading.Event(), threading.Event()
+
+    def worker():
+        with metrics.stage("t_outer"):
+            entered.set()
+            release.wait(5)
+
+    t = threading.Thread(target=worker, daemon=True)
+    t.start()
+    assert entered.wait(5)
+    with metrics.stage("t_inner"):  # another thread holds the profiler: skipped, not raised
+        pass
+    release.set()
+    t.join(5)
+
+    assert profiling._skipped == {"t_inner": 1}
+    with metrics.stage("t_inner"):  # free again
+        pass
+    calls = {row["stage"]: row["calls"] for row in profiling.summary()}
+    assert calls == {"t_outer": 1, "t_inner": 1}
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+import pendulum as p
+import pyarrow as pa
+import pytest
+
+from src.etl.load import duckdb_client
+from src.etl.load.duckdb_client import CATEGORY_MAP_SCHEMA, DuckDBClient
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Warehouse whose DuckDB session runs in Europe/Athens (UTC+2/+3), as it does under TZ=Europe/Athens."""
+    monkeypatch.setattr(duckdb_client, "DB_PATH", str(tmp_path / "warehouse.duckdb"))
+    client = DuckDBClient()
+    client.con.execute("SET TimeZone = 'Europe/Athens'")
+    client.init_schema()
+    return client
+
+
+def _near_utc_now(ts) -> bool:
+    return abs(ts - p.now("UTC").naive()) < timedelta(minutes=5)
+
+
+def test_interrupted_run_finishes_at_its_last_state_write_in_utc(db, monkeypatch):
+    monkeypatch.setattr(duckdb_client, "current_run_id", lambda: "r1")
+    db.begin_run("r1", "created", p.now("UTC"))
+    db.set_state("orders_since", "2024-01-01T00:00:00Z")
+
+    assert db.begin_run("r2", "created", p.now("UTC")) == 1
+    started, finished = db.con.execute(
+        "SELECT started_at, finished_at FROM etl_runs WHERE run_id = 'r1' AND status = 'interrupted'"
+    ).fetchone()
+    assert _near_utc_now(finished)
+    assert finished >= started
+
+
+def test_product_versions_enriched_at_is_utc(db):
+    categories = pa.Table.from_pylist(
+        [{"product_id": 1, "category_snapshot": "Shoes", "category_ids": [7], "date_modified_gmt": None}],
+        schema=CATEGORY_MAP_SCHEMA,
+    )
+    db.apply_category_map(categories)
+    (enriched_at,) = db.con.execute("SELECT enriched_at FROM etl_product_versions WHERE product_id = 1").fetchone()
+    assert _near_utc_now(enriched_at)
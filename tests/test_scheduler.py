@@ -0,0 +1,225 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.etl.extract import scheduler
+from src.etl.extract.scheduler import RequestScheduler, WooAPIError
+from src.etl.extract.wc_client import WooClient
+
+
+class DecodeError(Exception):
+    """Stands in for requests' ChunkedEncodingError / ContentDecodingError (not in retry_on)."""
+
+
+class TransportError(Exception):
+    pass
+
+
+def _scheduler(limit: int = 2) -> RequestScheduler:
+    return RequestScheduler(rate=0, min_concurrency=1, initial_concurrency=limit, max_concurrency=limit, max_retries=0)
+
+
+def _raise(exc):
+    raise exc
+
+
+def test_call_releases_slot_on_non_retryable_error():
+    s = _scheduler()
+    for _ in range(2):  # as many failures as slots
+        with pytest.raises(DecodeError):
+            s.call("orders", lambda: _raise(DecodeError()), retry_on=(TransportError,))
+    assert s._in_flight == 0
+
+    # A later call still gets a slot instead of waiting forever
+    done = threading.Event()
+    t = threading.Thread(target=lambda: (s.call("orders", lambda: type("R", (), {"status_code": 200})()), done.set()))
+    t.daemon = True
+    t.start()
+    t.join(5)
+    assert done.is_set()
+
+
+def test_acall_releases_slot_on_error_and_cancellation():
+    s = _scheduler()
+
+    async def fail():
+        raise DecodeError()
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(DecodeError):
+                await s.acall("orders", fail, retry_on=(TransportError,))
+        assert s._in_flight == 0
+        task = asyncio.ensure_future(s.acall("orders", hang))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert s._in_flight == 0
+
+
+# ---------- Deterministic timing: fake clock + scripted transport ----------
+
+class FakeClock:
+    """Stands in for the scheduler's `time` module: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self.on_sleep = None  # called once, at the next non-zero sleep
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return 1_700_000_000.0 + self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        if seconds and self.on_sleep:
+            hook, self.on_sleep = self.on_sleep, None
+            hook()
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status: int, headers: dict | None = None, latency: float = 0.0):
+        self.status_code = status
+        self.headers = headers or {}
+        self.latency = latency
+        self.text = f"status {status}"
+        self.content = b"[]"
+
+    def json(self):
+        return []
+
+
+class StubTransport:
+    """Returns scripted responses in order (the last one repeats) and records when each was sent."""
+
+    def __init__(self, clock: FakeClock, *responses: Response):
+        self.clock = clock
+        self.responses = list(responses)
+        self.sent = []
+
+    def __call__(self) -> Response:
+        resp = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        self.sent.append(self.clock.now)
+        self.clock.now += resp.latency
+        return resp
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    """random.uniform(a, b) -> b, recording the bounds."""
+    bounds = []
+
+    class Random:
+        @staticmethod
+        def uniform(a, b):
+            bounds.append((a, b))
+            return b
+
+    monkeypatch.setattr(scheduler, "random", Random)
+    return bounds
+
+
+def test_token_bucket_spaces_requests_after_the_burst(clock):
+    s = RequestScheduler(rate=5, burst=2, initial_concurrency=1, max_retries=0)
+    send = StubTransport(clock, Response(200))
+    for _ in range(6):
+        s.call("orders", send)
+    assert [round(t - 1000.0, 6) for t in send.sent] == [0.0, 0.0, 0.2, 0.4, 0.6, 0.8]
+
+
+def test_retry_after_pauses_every_request(clock):
+    s = RequestScheduler(rate=0, initial_concurrency=2, max_retries=1)
+    orders = StubTransport(clock, Response(429, {"Retry-After": "3"}), Response(200))
+    products = StubTransport(clock, Response(200))
+    # While the throttled call waits out Retry-After, another request comes in
+    clock.on_sleep = lambda: s.call("products", products)
+
+    s.call("orders", orders)
+    assert products.sent == [1003.0]  # held until the pause ended, not sent at once
+    assert orders.sent[1] >= 1003.0
+    assert s.throttled == 1 and s.retries == 1
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retryable_status_backs_off_with_full_jitter(clock, jitter, status):
+    s = RequestScheduler(rate=0, max_retries=3, backoff_base=0.5, backoff_max=60)
+    send = StubTransport(clock, Response(status), Response(status), Response(status), Response(200))
+    assert s.call("orders", send).status_code == 200
+    assert jitter == [(0, 0.5), (0, 1.0), (0, 2.0)]
+    assert [d for d in clock.sleeps if d] == [0.5, 1.0, 2.0]
+    assert s.retries == 3
+
+
+def test_aimd_grows_on_fast_success_and_halves_once_per_round_trip(clock):
+    s = RequestScheduler(rate=0, min_concurrency=1, max_concurrency=8, initial_concurrency=4,
+                         latency_target=2.0, max_retries=0)
+    fast = StubTransport(clock, Response(200, latency=0.1))
+    for _ in range(5):
+        s.call("orders", fast)
+    assert int(s.limit) == 5
+
+    grown = s.limit
+    s.call("orders", StubTransport(clock, Response(200, latency=3.0)))  # slower than the target
+    assert s.limit == pytest.approx(grown / 2)
+
+    # Throttled right after: no second decrease within the same round trip ...
+    halved = s.limit
+    with pytest.raises(WooAPIError):
+        s.call("orders", StubTransport(clock, Response(503)))
+    assert s.limit == halved
+    # ... but a second later it halves again, down to min_concurrency at most
+    clock.now += 1.0
+    with pytest.raises(WooAPIError):
+        s.call("orders", StubTransport(clock, Response(503)))
+    assert s.limit == pytest.approx(halved / 2)
+    for _ in range(3):
+        clock.now += 1.0
+        with pytest.raises(WooAPIError):
+            s.call("orders", StubTransport(clock, Response(503)))
+    assert s.limit == 1
+
+
+def test_failures_raise_instead_of_returning_no_data(clock, jitter):
+    s = RequestScheduler(rate=0, max_retries=2, initial_concurrency=4)
+    missing = StubTransport(clock, Response(404))
+    with pytest.raises(WooAPIError) as e:
+        s.call("orders/1", missing)
+    assert e.value.status == 404 and len(missing.sent) == 1  # not retried
+    assert int(s.limit) == 4  # and says nothing about load
+
+    down = StubTransport(clock, Response(500))
+    with pytest.raises(WooAPIError) as e:
+        s.call("orders", down)
+    assert e.value.status == 500 and len(down.sent) == 3
+    assert s._in_flight == 0
+
+
+def test_woo_client_pages_raise_on_failure(clock, jitter, monkeypatch):
+    monkeypatch.setenv("WC_BASE_URL", "https://shop.test")
+    monkeypatch.setenv("WC_CONSUMER_KEY", "ck_test")
+    monkeypatch.setenv("WC_CONSUMER_SECRET", "cs_test")
+    wc = WooClient()
+    wc.scheduler = RequestScheduler(rate=0, max_retries=1)
+    send = StubTransport(clock, Response(503))
+    wc.http = type("Session", (), {"get": lambda self, url, params=None, timeout=None: send()})()
+    with pytest.raises(WooAPIError):
+        wc.paged("orders", {"after": "2024-01-01T00:00:00"})
+    assert len(send.sent) == 2
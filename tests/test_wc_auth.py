@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from src.etl.extract.async_wc_client import AsyncWooClient
+
+
+def _requested_query(monkeypatch, base_url: str) -> dict:
+    monkeypatch.setenv("WC_BASE_URL", base_url)
+    monkeypatch.setenv("WC_CONSUMER_KEY", "ck_test")
+    monkeypatch.setenv("WC_CONSUMER_SECRET", "cs_test")
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url)
+        return httpx.Response(200, json=[])
+
+    async def get():
+        async with AsyncWooClient() as wc:
+            await wc.http.aclose()
+            wc.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            await wc.get("orders", {"after": "2024-01-01T00:00:00"})
+
+    asyncio.run(get())
+    (url,) = seen
+    assert url.path == "/wp-json/wc/v3/orders"
+    return dict(url.params)
+
+
+def test_async_client_signs_plain_http_requests(monkeypatch):
+    query = _requested_query(monkeypatch, "http://shop.test")
+    assert "consumer_secret" not in query
+    assert query["oauth_consumer_key"] == "ck_test" and query["oauth_signature"]
+    assert query["after"] == "2024-01-01T00:00:00"
+
+
+def test_async_client_uses_query_string_auth_over_https(monkeypatch):
+    query = _requested_query(monkeypatch, "https://shop.test")
+    assert query["consumer_key"] == "ck_test" and query["consumer_secret"] == "cs_test"